@@ -0,0 +1,99 @@
+"""
+Async entry points for the read-only endpoints, routed in place of the
+sync views when the project is served under ASGI (see
+frookoonBackend/asgi.py).
+
+Each request is handled by the DRF view itself (authentication, replica
+routing, querysets, pagination, serializers and error responses) inside
+one sync_to_async call, and rendered there. The responses are the sync
+views' own, and a request takes one trip to a worker thread rather than
+one per query as it would through the async ORM, which wraps each query
+in its own sync_to_async.
+
+The one request that needs no database, an anonymous catalogue request
+for a page already in the cache, is answered on the event loop.
+"""
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from . import caching
+from .views import HealthCheckView, OrderDetailView, ProductListView, order_collection_view, order_list_view
+
+
+def run_view(view):
+    """Wrap a sync DRF view so it runs, and renders, in a single thread hop."""
+    def render(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    @csrf_exempt
+    async def handler(request, *args, **kwargs):
+        return await sync_to_async(render)(request, *args, **kwargs)
+    return handler
+
+
+def json_response(view_class, request, data, status=200, headers=None):
+    """Render `data` as `view_class` would for a JSON client."""
+    view = view_class()
+    view.setup(request)
+    response = HttpResponse(
+        JSONRenderer().render(data) if data is not None else b'',
+        status=status,
+        content_type='application/json',
+        headers={**view.default_response_headers, **(headers or {})},
+    )
+    if data is None:
+        # As rest_framework.response.Response does for an empty body
+        del response['Content-Type']
+    return response
+
+
+def shared_page(request):
+    """
+    True for requests whose response is the shared cached catalogue page:
+    anonymous GETs, without the per-user address filter, asking for JSON.
+    """
+    accept = request.headers.get('Accept', '*/*')
+    return (
+        request.method == 'GET'
+        and 'Authorization' not in request.headers
+        and not {'address', 'format'} & request.GET.keys()
+        and ('application/json' in accept or accept.strip() in ('', '*/*'))
+        and 'text/html' not in accept
+    )
+
+
+product_list_view = run_view(ProductListView.as_view())
+order_list = run_view(order_list_view)
+order_collection = run_view(order_collection_view)
+order_detail = run_view(OrderDetailView.as_view())
+health_check_view = run_view(HealthCheckView.as_view())
+
+
+async def product_list(request):
+    """GET /api/v1/products/ (async). Cached pages skip the worker thread."""
+    if shared_page(request):
+        key = caching.response_key(Request(request), generation=await caching.aget_generation())
+        etag = caching.etag_for(key)
+        if caching.etag_matches(request, etag):
+            return json_response(ProductListView, request, None, status=304, headers={'ETag': etag})
+        data = await cache.aget(key)
+        if data is not None:
+            return json_response(ProductListView, request, data, headers={'ETag': etag})
+    return await product_list_view(request)
+
+
+async def health_check(request):
+    """GET /api/v1/health/ (async)."""
+    if request.method != 'GET':
+        return await health_check_view(request)
+    return json_response(HealthCheckView, request, {
+        "status": "healthy",
+        "message": "API is running"
+    })
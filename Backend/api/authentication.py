@@ -0,0 +1,143 @@
+"""
+Token authentication with a token -> user cache.
+
+TokenAuthentication looks the token and its user up on every request.
+CachedTokenAuthentication keeps recent lookups in a bounded per-process
+LRU whose entries expire after TOKEN_CACHE_TTL seconds, and, when
+TOKEN_CACHE_ALIAS names a Django cache, in that shared cache as well so a
+token seen by one worker is warm in all of them.
+
+Deleting a token, and saving or deleting a user (which covers
+deactivation), evicts the affected tokens from the local and shared
+caches once the transaction commits (see api.signals). Other processes'
+local caches are not reachable from here, so they may accept a revoked
+token for at most TOKEN_CACHE_TTL seconds; keep the TTL short.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class TokenCache:
+    """
+    Thread-safe LRU of `key -> (expires_at, user)` with a fixed TTL. Users
+    are copied in and out, so a request that changes its request.user
+    (or what is cached on it) never leaks into concurrent or later ones.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return copy.copy(entry[1])
+
+    def set(self, key, user):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, copy.copy(user))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def ttl():
+    return getattr(settings, 'TOKEN_CACHE_TTL', 60)
+
+
+local = TokenCache(getattr(settings, 'TOKEN_CACHE_SIZE', 4096), ttl())
+
+
+def shared_cache():
+    alias = getattr(settings, 'TOKEN_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def shared_key(key):
+    # Never put raw credentials into an external cache
+    return 'auth:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def cached_user(key):
+    """Return the active user for token `key` if cached, else None."""
+    user = local.get(key)
+    if user is None and (shared := shared_cache()) is not None:
+        user = shared.get(shared_key(key))
+        if user is not None:
+            local.set(key, user)
+    return user
+
+
+async def acached_user(key):
+    """Async variant of cached_user()."""
+    user = local.get(key)
+    if user is None and (shared := shared_cache()) is not None:
+        user = await shared.aget(shared_key(key))
+        if user is not None:
+            local.set(key, user)
+    return user
+
+
+def remember(key, user):
+    local.set(key, user)
+    if (shared := shared_cache()) is not None:
+        shared.set(shared_key(key), user, ttl())
+
+
+async def aremember(key, user):
+    """Async variant of remember()."""
+    local.set(key, user)
+    if (shared := shared_cache()) is not None:
+        await shared.aset(shared_key(key), user, ttl())
+
+
+def forget(keys):
+    """Evict tokens from the local and shared caches."""
+    keys = list(keys)
+    for key in keys:
+        local.delete(key)
+    if keys and (shared := shared_cache()) is not None:
+        shared.delete_many([shared_key(key) for key in keys])
+
+
+def cached_token(key, user):
+    """An in-memory Token for `request.auth`, built without a query."""
+    token = Token(key=key, user_id=user.pk)
+    token.user = user
+    return token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that skips the token/user query on cache hits."""
+
+    def authenticate_credentials(self, key):
+        user = cached_user(key)
+        if user is not None:
+            return user, cached_token(key, user)
+        user, token = super().authenticate_credentials(key)
+        remember(key, user)
+        return user, token
@@ -0,0 +1,270 @@
+"""
+Helpers shared by the `bench_*` management commands.
+
+Benchmarks seed their data inside a transaction that is rolled back at the
+end, so they can be pointed at a development database without leaving rows
+behind. Those that need the rows committed, for other threads to see, run
+in a scratch_database() instead.
+"""
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .models import Address, Order, OrderItem, Product, Stock, User, Vendor
+
+PRODUCT_WORDS = [
+    'organic', 'fresh', 'green', 'apple', 'banana', 'mango', 'bread', 'milk', 'paneer', 'rice',
+    'basmati', 'atta', 'dal', 'tomato', 'onion', 'potato', 'spinach', 'curd', 'butter', 'ghee',
+    'masala', 'tea', 'coffee', 'sugar', 'salt', 'honey', 'oats', 'almond', 'cashew', 'juice',
+]
+PRODUCT_CATEGORIES = [
+    'Fruits', 'Vegetables', 'Dairy', 'Bakery', 'Staples', 'Snacks',
+    'Beverages', 'Spices', 'Dry Fruits', 'Frozen', 'Household', 'Personal Care',
+]
+ORDER_STATUSES = ['PENDING', 'CONFIRMED', 'PACKING', 'SHIPPED', 'DELIVERED', 'CANCELLED', 'FAILED']
+
+# Stock of every seeded product, enough that checkout scenarios never run out
+SEED_STOCK = 10**6
+
+# Latency differences below this are noise, whatever the tolerance
+LATENCY_SLACK_MS = 1.0
+
+
+@contextmanager
+def rolled_back():
+    """Run the block in a transaction that is always rolled back."""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+@contextmanager
+def scratch_database():
+    """
+    Run the block against a new, migrated database in place of the default
+    one, the way the test runner does, and drop it afterwards. On SQLite it
+    is a file in a temporary directory, so the connection options (WAL,
+    timeouts) apply as they do in production.
+    """
+    creation = connection.creation
+    test_settings = connection.settings_dict['TEST']
+    with tempfile.TemporaryDirectory() as directory:
+        test_name = test_settings['NAME']
+        if connection.vendor == 'sqlite':
+            test_settings['NAME'] = os.path.join(directory, 'bench.sqlite3')
+        old_name = creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            creation.destroy_test_db(old_name, verbosity=0)
+            test_settings['NAME'] = test_name
+
+
+@dataclass
+class Fixtures:
+    """Keys of the rows seed_fixtures() created, for building requests."""
+    tokens: list       # API token key per user
+    addresses: list    # address id per user, same order as tokens
+    products: list     # ids of the available products, hot product excluded
+    hot_product: str   # id of the product contended checkouts go for
+    orders: list       # (token key of the owner, order id)
+
+
+def seed_fixtures(rng, users, vendors, products, orders, batch_size=10_000):
+    """
+    Seed `users` customers with an address and API token each, `vendors`
+    vendors around Bengaluru, `products` products spread over them with
+    stock, and `orders` past orders of one to five items. `rng` decides
+    everything, so the same seed gives the same catalogue and history.
+    """
+    now = timezone.now()
+    vendor_rows = []
+    for i in range(vendors):
+        latitude = Decimal(f"{rng.uniform(12.85, 13.10):.7f}")
+        longitude = Decimal(f"{rng.uniform(77.45, 77.75):.7f}")
+        vendor_rows.append(Vendor(
+            name=f'Vendor {i}', city='Bengaluru', latitude=latitude, longitude=longitude,
+        ))
+    Vendor.objects.bulk_create(vendor_rows, batch_size=2000)
+
+    user_rows = User.objects.bulk_create([
+        User(username=f'customer-{i}', phone=f'+91{i:010d}') for i in range(users)
+    ], batch_size=2000)
+    tokens = Token.objects.bulk_create([
+        Token(user=user, key=Token.generate_key()) for user in user_rows
+    ], batch_size=2000)
+    address_rows = Address.objects.bulk_create([
+        Address(
+            user=user, latitude=Decimal(f"{rng.uniform(12.85, 13.10):.7f}"),
+            longitude=Decimal(f"{rng.uniform(77.45, 77.75):.7f}"),
+            address_line=f'{i} Main Road', city='Bengaluru', pincode='560001', is_default=True,
+        )
+        for i, user in enumerate(user_rows)
+    ], batch_size=2000)
+
+    catalogue = []
+    for start in range(0, products, batch_size):
+        rows = []
+        for i in range(start, min(start + batch_size, products)):
+            name = ' '.join(rng.sample(PRODUCT_WORDS, 3)).title() + f' {i}'
+            rows.append(Product(
+                vendor=rng.choice(vendor_rows), name=name, category=rng.choice(PRODUCT_CATEGORIES),
+                price=Decimal(rng.randrange(100, 50_000)) / 100, is_available=rng.random() < 0.95,
+            ))
+        Product.objects.bulk_create(rows, batch_size=2000)
+        Stock.objects.bulk_create([Stock(product=product, quantity=SEED_STOCK) for product in rows],
+                                  batch_size=2000)
+        catalogue += rows
+    hot = Product.objects.create(
+        vendor=vendor_rows[0], name='Hot Deal Mango Box', category='Fruits', price=Decimal('99.00')
+    )
+    Stock.objects.create(product=hot, quantity=SEED_STOCK)
+
+    by_vendor = {}
+    for product in catalogue:
+        by_vendor.setdefault(product.vendor_id, []).append(product)
+    stocked = list(by_vendor)
+    history = []
+    for start in range(0, orders, batch_size):
+        order_rows, item_rows = [], []
+        for _ in range(min(batch_size, orders - start)):
+            customer = rng.randrange(users)
+            vendor_products = by_vendor[rng.choice(stocked)]
+            basket = rng.sample(vendor_products, min(len(vendor_products), rng.randint(1, 5)))
+            order = Order(
+                user=user_rows[customer], vendor=basket[0].vendor, address=address_rows[customer],
+                status=rng.choice(ORDER_STATUSES), delivery_fee=Decimal('25.00'),
+                created_at=now - timedelta(minutes=rng.randrange(525_600)),
+            )
+            total = Decimal('0.00')
+            for product in basket:
+                quantity = rng.randint(1, 3)
+                total += product.price * quantity
+                item_rows.append(OrderItem(
+                    order=order, product=product, price_at_time=product.price, quantity=quantity,
+                    **OrderItem.snapshot(product),
+                ))
+            order.total_amount = total
+            order_rows.append(order)
+            history.append((tokens[customer].key, str(order.pk)))
+        Order.objects.bulk_create(order_rows, batch_size=2000)
+        OrderItem.objects.bulk_create(item_rows, batch_size=2000)
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return Fixtures(
+        tokens=[token.key for token in tokens],
+        addresses=[str(address.pk) for address in address_rows],
+        products=[str(product.pk) for product in catalogue if product.is_available],
+        hot_product=str(hot.pk),
+        orders=history,
+    )
+
+
+def query_plan(sql):
+    """Return the database's plan for `sql`, one line per step."""
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql)
+        return [str(row[-1]) for row in cursor.fetchall()]
+
+
+def plan_problems(plan):
+    """Plan steps that read a whole table or sort the result."""
+    return [
+        line for line in plan
+        if line.startswith('SCAN') or 'Seq Scan' in line
+        or 'TEMP B-TREE FOR ORDER BY' in line or line.lstrip().startswith('Sort')
+    ]
+
+
+def measure(func, repeat):
+    """
+    Call `func` `repeat` times and return latency statistics in milliseconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, round(fraction * len(samples)) - 1))
+    return samples[index]
+
+
+def summarize(samples):
+    """Return mean/p50/p95/p99 of latency samples in milliseconds."""
+    ordered = sorted(samples)
+    return {
+        'runs': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered), 3) if ordered else 0.0,
+        'p50_ms': round(percentile(ordered, 0.50), 3),
+        'p95_ms': round(percentile(ordered, 0.95), 3),
+        'p99_ms': round(percentile(ordered, 0.99), 3),
+    }
+
+
+# Latency percentiles compared with the baseline, unless a scenario's
+# `compared` field names others
+COMPARED_LATENCIES = ('p50_ms', 'p95_ms')
+
+
+def compare(report, baseline, tolerance):
+    """
+    Return the regressions of a bench_suite `report` against `baseline`,
+    one message each. The median query count of a scenario is the same on
+    every run and may not grow at all, nor may the number of failed or
+    N+1 flagged requests; latency and throughput may be off by `tolerance`
+    (a fraction).
+    """
+    keys = sorted(set(report['meta']) | set(baseline['meta']))
+    differing = [key for key in keys if report['meta'].get(key) != baseline['meta'].get(key)]
+    if differing:
+        return [
+            f"baseline was recorded with {key}={baseline['meta'].get(key)!r}, "
+            f"this run used {report['meta'].get(key)!r}"
+            for key in differing
+        ]
+
+    regressions = []
+    for name, before in baseline['scenarios'].items():
+        after = report['scenarios'].get(name)
+        if after is None:
+            regressions.append(f"{name}: scenario missing from this run")
+            continue
+        if after['queries_p50'] > before['queries_p50']:
+            regressions.append(
+                f"{name}: {after['queries_p50']} queries per request, was {before['queries_p50']}"
+            )
+        if after['errors'] > before['errors']:
+            regressions.append(f"{name}: {after['errors']} failed requests, was {before['errors']}")
+        if after['repeated_query_requests'] > before['repeated_query_requests']:
+            regressions.append(
+                f"{name}: {after['repeated_query_requests']} requests repeated a query (N+1), "
+                f"was {before['repeated_query_requests']}"
+            )
+        for field in before.get('compared', COMPARED_LATENCIES):
+            limit = max(before[field] * (1 + tolerance), before[field] + LATENCY_SLACK_MS)
+            if after[field] > limit:
+                regressions.append(f"{name}: {field} {after[field]:.2f}, was {before[field]:.2f}")
+        if after['requests_per_second'] < before['requests_per_second'] / (1 + tolerance):
+            regressions.append(
+                f"{name}: {after['requests_per_second']:.1f} requests/s, "
+                f"was {before['requests_per_second']:.1f}"
+            )
+    return regressions
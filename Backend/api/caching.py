@@ -0,0 +1,101 @@
+"""
+Versioned response cache for the public catalogue.
+
+Every cached catalogue response is keyed by the current catalogue
+generation plus the request's query string. Writes to Product, Vendor or
+Stock bump the generation (see `api.signals`), which orphans every older
+entry at once instead of hunting down individual keys. Checkouts and
+restocks (api.inventory) only bump it when a product sells out or comes
+back into stock; the counts on cached pages may otherwise lag by up to
+CATALOGUE_CACHE_TIMEOUT, so the cache keeps serving under write load. The key also
+doubles as the response ETag, so clients revalidating with If-None-Match
+get a 304 without the catalogue being queried or rendered.
+
+A page read from a lagging replica (api.replicas) just after a write may
+not show it yet, and would be cached under the new generation until the
+next one. Within REPLICA_PIN_SECONDS of a bump such pages are served
+without being cached or given an ETag (see cacheable_read()).
+
+The generation lives in the default cache, so with a shared backend
+(Redis, Memcached) a write in one process invalidates all of them; with
+the local-memory backend each process only sees its own writes.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import replicas
+
+GENERATION_KEY = 'catalogue:generation'
+CHANGED_KEY = 'catalogue:changed'
+
+
+def get_generation():
+    """
+    Return the current catalogue generation. A missing counter (first use
+    or evicted) restarts from the clock so it never reuses an old value.
+    """
+    cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+    return cache.get(GENERATION_KEY)
+
+
+async def aget_generation():
+    """Async variant of get_generation()."""
+    await cache.aadd(GENERATION_KEY, time.time_ns(), timeout=None)
+    return await cache.aget(GENERATION_KEY)
+
+
+def bump_generation():
+    """Invalidate every cached catalogue response."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+    cache.set(CHANGED_KEY, True, settings.REPLICA_PIN_SECONDS)
+
+
+def cacheable_read():
+    """
+    Return False for a page just read from the replica within
+    REPLICA_PIN_SECONDS of the last bump, while the replica may still lag.
+    """
+    return not replicas.in_use() or cache.get(CHANGED_KEY) is None
+
+
+async def acacheable_read():
+    """Async variant of cacheable_read()."""
+    return not replicas.in_use() or await cache.aget(CHANGED_KEY) is None
+
+
+def bump_generation_on_commit():
+    """Bump the generation once the current transaction commits."""
+    transaction.on_commit(bump_generation)
+
+
+def response_key(request, generation=None):
+    """Return the cache key for a catalogue request."""
+    if generation is None:
+        generation = get_generation()
+    query = sorted(request.query_params.lists())
+    digest = hashlib.sha1(repr((request.get_host(), query)).encode()).hexdigest()
+    return f'catalogue:{generation}:{digest}'
+
+
+def etag_for(key):
+    return '"%s"' % hashlib.sha1(key.encode()).hexdigest()
+
+
+def etag_matches(request, etag):
+    """Return True if the request's If-None-Match covers `etag`."""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or any(tag.removeprefix('W/') == etag for tag in tags)
+
+
+def timeout():
+    return getattr(settings, 'CATALOGUE_CACHE_TIMEOUT', 300)
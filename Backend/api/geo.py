@@ -0,0 +1,119 @@
+"""
+Pure-Python geospatial helpers: geohash encoding, cell coverage for a
+radius search, and great-circle distance.
+
+Vendors store the geohash of their location in an indexed column. A radius
+search picks the finest geohash precision that covers the search circle's
+bounding box with a handful of cells. Each cell becomes an index range scan,
+and the few candidates it returns are refined with the haversine distance.
+"""
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+MAX_PRECISION = 9
+MAX_CELLS = 16
+
+
+def encode(latitude, longitude, precision=MAX_PRECISION):
+    """Return the geohash of a point at the given precision."""
+    latitude = float(latitude)
+    longitude = ((float(longitude) + 180.0) % 360.0) - 180.0
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                value = (value << 1) | 1
+                lon_range[0] = mid
+            else:
+                value <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                value = (value << 1) | 1
+                lat_range[0] = mid
+            else:
+                value <<= 1
+                lat_range[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """Return the (latitude, longitude) size in degrees of a geohash cell."""
+    lat_bits = (5 * precision) // 2
+    lon_bits = 5 * precision - lat_bits
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """Return (min_lat, max_lat, min_lon, max_lon) enclosing the search circle."""
+    latitude = float(latitude)
+    longitude = float(longitude)
+    lat_delta = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(latitude))
+    lon_delta = 180.0 if cos_lat < 1e-6 else min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+    return (
+        max(latitude - lat_delta, -90.0),
+        min(latitude + lat_delta, 90.0),
+        longitude - lon_delta,
+        longitude + lon_delta,
+    )
+
+
+def covering_cells(latitude, longitude, radius_km, max_cells=MAX_CELLS):
+    """
+    Return the geohash prefixes whose cells cover the search circle.
+
+    The precision is the finest one that covers the bounding box with at
+    most `max_cells` cells, trading a few more range scans for far fewer
+    candidate rows.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+
+    precision = 1
+    for candidate in range(MAX_PRECISION, 0, -1):
+        cell_lat, cell_lon = cell_size(candidate)
+        rows = math.ceil((max_lat - min_lat) / cell_lat) + 1
+        columns = math.ceil((max_lon - min_lon) / cell_lon) + 1
+        if rows * columns <= max_cells:
+            precision = candidate
+            break
+
+    cell_lat, cell_lon = cell_size(precision)
+    cells = set()
+    lat = min_lat
+    while True:
+        lon = min_lon
+        while True:
+            cells.add(encode(min(lat, 90.0 - 1e-9), lon, precision))
+            if lon >= max_lon:
+                break
+            lon = min(lon + cell_lon, max_lon)
+        if lat >= max_lat:
+            break
+        lat = min(lat + cell_lat, max_lat)
+    return sorted(cells)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres."""
+    lat1, lon1, lat2, lon2 = map(math.radians, map(float, (lat1, lon1, lat2, lon2)))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
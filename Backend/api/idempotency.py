@@ -0,0 +1,112 @@
+"""
+Idempotency keys for order creation.
+
+A client retrying `POST /api/v1/orders/` sends the same `Idempotency-Key`
+header each time. The first request claims the key by inserting an
+IdempotencyKey row inside its checkout transaction; the unique index on
+(user, key) makes a concurrent duplicate's insert block until that
+transaction finishes, so duplicates wait instead of racing for stock. Once
+the order is placed the response is stored on the row and every later
+retry gets it back without validation or any Stock/Product query.
+
+Replays are also kept in a small per-process LRU, so a hot retry loop does
+not even reach the database. Only successful responses are stored; a
+failed attempt rolls its claim back and may be retried with the same key.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+class KeyReused(Exception):
+    """The key was already used for a request with a different body."""
+
+
+class KeyInProgress(Exception):
+    """The key is claimed by a request that has not finished yet."""
+
+
+class ReplayCache:
+    """Thread-safe LRU of `(user_id, key) -> (fingerprint, status, body)`."""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id, key):
+        with self.lock:
+            entry = self.entries.get((user_id, key))
+            if entry is not None:
+                self.entries.move_to_end((user_id, key))
+            return entry
+
+    def set(self, user_id, key, entry):
+        with self.lock:
+            self.entries[(user_id, key)] = entry
+            self.entries.move_to_end((user_id, key))
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+replays = ReplayCache(getattr(settings, 'IDEMPOTENCY_CACHE_SIZE', 1024))
+
+
+def fingerprint(data):
+    """Hash a request body so a reused key with a different body is caught."""
+    payload = json.dumps(data, cls=JSONEncoder, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _check(entry, request_fingerprint):
+    if entry[0] != request_fingerprint:
+        raise KeyReused()
+    return entry[1], entry[2]
+
+
+def cached(user_id, key, request_fingerprint):
+    """Return `(status, body)` from the in-process LRU, or None."""
+    entry = replays.get(user_id, key)
+    return None if entry is None else _check(entry, request_fingerprint)
+
+
+def claim(user, key, request_fingerprint):
+    """
+    Claim `key` for `user` inside the caller's transaction. Returns None
+    when claimed, or the stored `(status, body)` of an earlier request.
+    Blocks while another transaction holds an uncommitted claim.
+    """
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(user=user, key=key, fingerprint=request_fingerprint)
+        return None
+    except IntegrityError:
+        record = IdempotencyKey.objects.get(user=user, key=key)
+    if record.status_code is None:
+        raise KeyInProgress()
+    entry = (record.fingerprint, record.status_code, record.response_body)
+    replays.set(user.pk, key, entry)
+    return _check(entry, request_fingerprint)
+
+
+def store(user, key, request_fingerprint, status_code, data):
+    """Save the response of a claimed key; the LRU is filled after commit."""
+    body = json.loads(json.dumps(data, cls=JSONEncoder))
+    IdempotencyKey.objects.filter(user=user, key=key).update(status_code=status_code, response_body=body)
+    transaction.on_commit(
+        lambda: replays.set(user.pk, key, (request_fingerprint, status_code, body))
+    )
@@ -0,0 +1,297 @@
+"""
+Set-based stock helpers shared by the checkout paths.
+
+Every function here works on a whole basket at once so the number of
+queries stays flat no matter how many line items an order carries.
+"""
+import random
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Prefetch, Q, Sum, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import caching
+from .models import Product, Stock, StockStripe
+
+# Random stripes tried before a striped checkout falls back to rebalancing
+STRIPE_PROBES = 2
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when the locked stock rows cannot cover a basket.
+    `available` maps each short product id to the quantity actually left.
+    """
+
+    def __init__(self, available):
+        self.available = available
+        super().__init__(f"Insufficient stock for {len(available)} product(s).")
+
+
+def requested_quantities(items):
+    """Sum the requested quantity per product id across a basket."""
+    totals = {}
+    for item in items:
+        product_id = item['product_id']
+        totals[product_id] = totals.get(product_id, 0) + item['quantity']
+    return totals
+
+
+def load_products(product_ids):
+    """Fetch products joined to their vendor, its commission and stock, keyed by id."""
+    return (
+        Product.objects.select_related('vendor__commission', 'stock')
+        .prefetch_related(stripes_prefetch())
+        .in_bulk(set(product_ids))
+    )
+
+
+def _item_error(product_id, product, requested, available):
+    """Return the validation error for a single line item, or None."""
+    if product is None:
+        return f"Product with id {product_id} does not exist."
+    if not product.is_available:
+        return f"Product '{product.name}' is not available."
+
+    if product_id in available:
+        quantity = available[product_id]
+    else:
+        try:
+            quantity = product.stock.total_quantity
+        except Stock.DoesNotExist:
+            return f"No stock information for product '{product.name}'."
+
+    if quantity < requested:
+        return f"Not enough stock for '{product.name}'. Requested: {requested}, Available: {quantity}"
+    return None
+
+
+def item_errors(items, products, available=None):
+    """
+    Build one error dict per line item, in the shape DRF uses for nested
+    `many=True` serializers: `{}` for a valid item and
+    `{'product_id': [message]}` otherwise.
+
+    Stock is checked against the basket-wide total for each product, so a
+    product listed twice cannot slip past the check. `available` overrides
+    the stock quantities loaded with `products` (e.g. after locking).
+    Returns None when every item is valid.
+    """
+    available = available or {}
+    totals = requested_quantities(items)
+    errors = []
+    for item in items:
+        product_id = item['product_id']
+        message = _item_error(product_id, products.get(product_id), totals[product_id], available)
+        errors.append({'product_id': [message]} if message else {})
+    return errors if any(errors) else None
+
+
+def stripes_prefetch(prefix=''):
+    """
+    Prefetch the stripes of striped stock rows into `stock.stripe_list`,
+    so Stock.total_quantity needs no query per product.
+    """
+    return Prefetch(
+        f'{prefix}stock__stripes',
+        queryset=StockStripe.objects.order_by('index'),
+        to_attr='stripe_list',
+    )
+
+
+def lock_stock(product_ids):
+    """
+    Lock the Stock rows of `product_ids`, and their stripes, in primary-key
+    order and return `{product_id: total quantity}` for the stocked ones.
+    """
+    available = dict(
+        Stock.objects.select_for_update()
+        .filter(pk__in=product_ids)
+        .order_by('pk')
+        .values_list('pk', 'quantity')
+    )
+    stripes = (
+        StockStripe.objects.select_for_update()
+        .filter(stock_id__in=available)
+        .order_by('stock_id', 'index')
+        .values_list('stock_id', 'quantity')
+    )
+    for product_id, quantity in stripes:
+        available[product_id] += quantity
+    return available
+
+
+def decrement_stock(quantities, stocks=None):
+    """
+    Decrement stock for `{product_id: quantity}`.
+
+    Plain stock rows are locked up front in primary-key order, so
+    concurrent checkouts touching overlapping products cannot deadlock,
+    and decremented with a single conditional UPDATE built from F()
+    expressions. Striped products are handled by decrement_striped()
+    without touching their Stock row. If any product cannot cover its
+    quantity InsufficientStock is raised; this must be called inside a
+    transaction so the partial work rolls back.
+
+    Stock instances passed in `stocks` (keyed by product id) are updated
+    in place so callers can serialize them without reloading.
+    """
+    stocks = stocks or {}
+    striped = _striped_counts(quantities, stocks)
+    plain = {pid: quantity for pid, quantity in quantities.items() if pid not in striped}
+    now = timezone.now()
+
+    locked = dict(
+        Stock.objects.select_for_update()
+        .filter(pk__in=plain)
+        .order_by('pk')
+        .values_list('pk', 'quantity')
+    ) if plain else {}
+    short = {
+        product_id: locked.get(product_id, 0)
+        for product_id, quantity in plain.items()
+        if locked.get(product_id, 0) < quantity
+    }
+    if short:
+        raise InsufficientStock(short)
+
+    if plain:
+        condition = Q()
+        whens = []
+        for product_id, quantity in plain.items():
+            condition |= Q(pk=product_id, quantity__gte=quantity)
+            whens.append(When(pk=product_id, then=F('quantity') - quantity))
+
+        updated = Stock.objects.filter(condition).update(
+            quantity=Case(*whens, output_field=IntegerField()),
+            updated_at=now,
+        )
+        if updated != len(plain):
+            raise InsufficientStock({})
+
+    for product_id in sorted(striped, key=str):
+        try:
+            decrement_striped(product_id, quantities[product_id], striped[product_id])
+        except InsufficientStock as e:
+            short.update(e.available)
+    if short:
+        raise InsufficientStock(short)
+
+    # Cached catalogue pages may show a stale count, but not a product that
+    # can no longer be bought
+    sold_out = [pid for pid, quantity in plain.items() if locked[pid] == quantity]
+    if sold_out or (striped and empty_products(striped)):
+        caching.bump_generation_on_commit()
+
+    for product_id, stock in stocks.items():
+        if product_id in plain:
+            stock.quantity = locked[product_id] - plain[product_id]
+            stock.updated_at = now
+    _reload_striped([stocks[pid] for pid in striped if pid in stocks])
+
+
+def restock(quantities):
+    """
+    Return `{product_id: quantity}` units to stock with a single UPDATE.
+    Striped products get the units on their Stock row, which is counted in
+    total_quantity and spread over the stripes at the next rebalance.
+    """
+    if not quantities:
+        return
+    # Only a product coming back into stock makes cached catalogue pages wrong
+    back_in_stock = empty_products(quantities)
+    whens = [When(pk=product_id, then=F('quantity') + quantity) for product_id, quantity in quantities.items()]
+    Stock.objects.filter(pk__in=quantities).update(
+        quantity=Case(*whens, output_field=IntegerField()),
+        updated_at=timezone.now(),
+    )
+    if back_in_stock:
+        caching.bump_generation_on_commit()
+
+
+def empty_products(product_ids):
+    """Return the ids among `product_ids` with no units left, stripes included."""
+    return set(
+        Stock.objects.filter(pk__in=product_ids)
+        .annotate(total=F('quantity') + Coalesce(Sum('stripes__quantity'), 0))
+        .filter(total=0)
+        .values_list('pk', flat=True)
+    )
+
+
+def _striped_counts(quantities, stocks):
+    """Return `{product_id: stripe_count}` for the striped products in a basket."""
+    if all(product_id in stocks for product_id in quantities):
+        return {pid: stocks[pid].stripe_count for pid in quantities if stocks[pid].stripe_count}
+    return dict(
+        Stock.objects.filter(pk__in=quantities, stripe_count__gt=0).values_list('pk', 'stripe_count')
+    )
+
+
+def _reload_striped(stocks):
+    """Refresh quantity and stripe_list of striped Stock instances in two queries."""
+    if not stocks:
+        return
+    by_id = {stock.pk: stock for stock in stocks}
+    for stock in stocks:
+        stock.stripe_list = []
+    for pk, quantity in Stock.objects.filter(pk__in=by_id).values_list('pk', 'quantity'):
+        by_id[pk].quantity = quantity
+    for stripe in StockStripe.objects.filter(stock_id__in=by_id).order_by('stock_id', 'index'):
+        by_id[stripe.stock_id].stripe_list.append(stripe)
+
+
+def decrement_striped(product_id, quantity, stripe_count):
+    """
+    Take `quantity` units of a striped product.
+
+    A couple of randomly chosen stripes are tried with conditional UPDATEs,
+    which only lock the stripe that is hit. If none can cover the quantity
+    on its own, the product is rebalanced: its Stock row and all stripes are
+    locked, the quantity is taken from the pooled total and what remains is
+    spread evenly across the stripes again.
+    """
+    for index in random.sample(range(stripe_count), min(STRIPE_PROBES, stripe_count)):
+        updated = StockStripe.objects.filter(
+            stock_id=product_id, index=index, quantity__gte=quantity
+        ).update(quantity=F('quantity') - quantity)
+        if updated:
+            return
+
+    stock = Stock.objects.select_for_update().get(pk=product_id)
+    stripes = list(StockStripe.objects.select_for_update().filter(stock_id=product_id).order_by('index'))
+    total = stock.quantity + sum(stripe.quantity for stripe in stripes)
+    if total < quantity:
+        raise InsufficientStock({product_id: total})
+    spread_stripes(stock, stripes, total - quantity)
+
+
+def spread_stripes(stock, stripes, total):
+    """Spread `total` units evenly over `stripes`, leaving the Stock row empty."""
+    share, extra = divmod(total, len(stripes))
+    for position, stripe in enumerate(stripes):
+        stripe.quantity = share + (1 if position < extra else 0)
+    StockStripe.objects.bulk_update(stripes, ['quantity'])
+    Stock.objects.filter(pk=stock.pk).update(quantity=0, updated_at=timezone.now())
+
+
+@transaction.atomic
+def set_stripe_count(product_id, stripe_count):
+    """
+    Switch a product's stock between a plain counter (0) and `stripe_count`
+    stripes, moving every unit across so the available total is unchanged.
+    """
+    stock = Stock.objects.select_for_update().get(pk=product_id)
+    stripes = list(StockStripe.objects.select_for_update().filter(stock_id=product_id))
+    total = stock.quantity + sum(stripe.quantity for stripe in stripes)
+    StockStripe.objects.filter(stock_id=product_id).delete()
+
+    if stripe_count:
+        stripes = StockStripe.objects.bulk_create([
+            StockStripe(stock=stock, index=index, quantity=0) for index in range(stripe_count)
+        ])
+        spread_stripes(stock, stripes, total)
+    else:
+        Stock.objects.filter(pk=product_id).update(quantity=total, updated_at=timezone.now())
+    Stock.objects.filter(pk=product_id).update(stripe_count=stripe_count)
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import dispatch
+
+
+class Command(BaseCommand):
+    help = (
+        "Assign unassigned PACKING orders to the nearest delivery partners with "
+        "spare capacity. Runs once, or every --loop seconds when given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', type=float, help="Keep running, dispatching every N seconds")
+        parser.add_argument('--batch-size', type=int, default=dispatch.BATCH_SIZE)
+        parser.add_argument('--radius', type=float, default=dispatch.DEFAULT_RADIUS_KM,
+                            help="Maximum vendor-to-partner distance in km")
+
+    def handle(self, *args, **options):
+        while True:
+            assigned = dispatch.assign_batch(limit=options['batch_size'], radius_km=options['radius'])
+            if assigned or not options['loop']:
+                self.stdout.write(f"Assigned {len(assigned)} order(s).")
+            # A full batch means more orders may be waiting
+            if len(assigned) == options['batch_size']:
+                continue
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
@@ -0,0 +1,59 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.views import APIView
+
+from api import authentication
+from api.benchmarking import measure, rolled_back
+from api.models import Order, User, Vendor
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare queries and latency per request on the order endpoints with "
+        "plain TokenAuthentication and with CachedTokenAuthentication."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=500)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            user = User.objects.create_user(username='bench-auth', phone='+19999999999', password='x')
+            token = Token.objects.create(user=user)
+            vendor = Vendor.objects.create(
+                name='Bench Vendor', city='Bench City',
+                latitude=Decimal('12.9716000'), longitude=Decimal('77.5946000'),
+            )
+            Order.objects.bulk_create([
+                Order(user=user, vendor=vendor, delivery_fee=Decimal('5.00')) for _ in range(options['orders'])
+            ])
+            order = Order.objects.filter(user=user).first()
+            client = Client(HTTP_AUTHORIZATION=f'Token {token.key}', HTTP_HOST='localhost')
+
+            default = APIView.authentication_classes
+            try:
+                for label, classes in (
+                    ('TokenAuthentication', [TokenAuthentication]),
+                    ('CachedTokenAuthentication', [authentication.CachedTokenAuthentication]),
+                ):
+                    APIView.authentication_classes = classes
+                    authentication.local.clear()
+                    for path in ('/api/v1/orders/', f'/api/v1/orders/{order.pk}/'):
+                        client.get(path)  # warm up
+                        reset_queries()  # the query log is capped; measure() fills it
+                        with CaptureQueriesContext(connection) as queries:
+                            client.get(path)
+                        stats = measure(lambda: client.get(path), options['repeat'])
+                        self.stdout.write(
+                            f"{label:>26} {path[:24]:<24}: {len(queries)} queries, "
+                            f"p50 {stats['p50_ms']:.2f} ms / p99 {stats['p99_ms']:.2f} ms"
+                        )
+            finally:
+                APIView.authentication_classes = default
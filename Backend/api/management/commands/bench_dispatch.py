@@ -0,0 +1,76 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import dispatch, geo
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate delivery partner assignment in memory: random vendors and "
+        "partners around a city, matched with the grid-indexed greedy "
+        "matcher (and optionally an all-pairs greedy baseline)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--partners', type=int, default=2000)
+        parser.add_argument('--city-km', type=float, default=30.0, help="Side of the square city area")
+        parser.add_argument('--radius', type=float, default=dispatch.DEFAULT_RADIUS_KM)
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--all-pairs', action='store_true',
+                            help="Also run the all-pairs baseline (slow for large fleets)")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        span = options['city_km']
+        lat_span = span / geo.KM_PER_DEGREE
+
+        def point():
+            return 12.9716 + rng.uniform(0, lat_span), 77.5946 + rng.uniform(0, lat_span)
+
+        matchers = [('grid greedy', dispatch.match)]
+        if options['all_pairs']:
+            matchers.append(('all-pairs greedy', all_pairs_match))
+
+        for label, matcher in matchers:
+            timings, assigned, distances = [], [], []
+            for _ in range(options['rounds']):
+                orders = [(i, *point()) for i in range(options['orders'])]
+                partners = [(f'p{i}', *point()) for i in range(options['partners'])]
+                capacity = {key: rng.randint(1, 3) for key, _, _ in partners}
+
+                start = time.perf_counter()
+                result = matcher(orders, partners, capacity, radius_km=options['radius'])
+                timings.append(time.perf_counter() - start)
+                assigned.append(len(result))
+                distances.extend(distance for _, distance in result.values())
+
+            mean = statistics.fmean(timings)
+            self.stdout.write(
+                f"{label:>17}: {mean * 1000:.1f} ms per batch, "
+                f"{statistics.fmean(assigned) / mean:,.0f} orders/s, "
+                f"{statistics.fmean(assigned):.0f}/{options['orders']} assigned, "
+                f"mean distance {statistics.fmean(distances) if distances else 0:.2f} km"
+            )
+
+
+def all_pairs_match(orders, partners, capacity, radius_km):
+    """Greedy matching over every order/partner pair, as a baseline."""
+    pairs = []
+    for key, latitude, longitude in orders:
+        for partner, partner_lat, partner_lng in partners:
+            distance = geo.haversine_km(latitude, longitude, partner_lat, partner_lng)
+            if distance <= radius_km:
+                pairs.append((distance, key, partner))
+    pairs.sort(key=lambda pair: pair[0])
+    free = dict(capacity)
+    assignment = {}
+    for distance, key, partner in pairs:
+        if key not in assignment and free[partner] > 0:
+            assignment[key] = (partner, distance)
+            free[partner] -= 1
+    return assignment
@@ -0,0 +1,80 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+
+from api.benchmarking import summarize
+from api import rollups
+from api.inventory import InsufficientStock, decrement_stock, set_stripe_count
+from api.models import Order, OrderItem, Product, Stock, Vendor
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer one product with concurrent single-unit checkouts, each also "
+        "recording its sale for the daily rollups as checkout does, and "
+        "report orders per second for a plain and for striped stock counters. "
+        "Seeds committed rows (threads need their own connections) and "
+        "deletes them afterwards. SQLite serializes all writers, so the "
+        "difference only shows on a database with row-level locks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stripes', type=int, action='append',
+                            help="Stripe counts to compare; repeat (default: 0, 4, 16)")
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--orders', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        vendor = Vendor.objects.create(
+            name='Bench Vendor', city='Bench City',
+            latitude=Decimal('12.9716000'), longitude=Decimal('77.5946000'),
+        )
+        try:
+            product = Product.objects.create(
+                vendor=vendor, name='Bench Hot Product', category='Bench', price=Decimal('1.00')
+            )
+            stock = Stock.objects.create(product=product, quantity=0)
+            for stripes in options['stripes'] or [0, 4, 16]:
+                set_stripe_count(stock.pk, 0)
+                Stock.objects.filter(pk=stock.pk).update(quantity=options['orders'])
+                set_stripe_count(stock.pk, stripes)
+                stats = self.run(product, options)
+                remaining = Stock.objects.get(pk=product.pk).total_quantity
+                self.stdout.write(
+                    f"{stripes:>3} stripes: {stats['orders_per_second']:>8.1f} orders/s, "
+                    f"p50 {stats['p50_ms']:.2f} ms / p99 {stats['p99_ms']:.2f} ms, "
+                    f"{stats['errors']} errors, {remaining} left"
+                )
+        finally:
+            vendor.delete()
+
+    def run(self, product, options):
+        def checkout(_):
+            item = OrderItem(
+                order=Order(), product=product, vendor_id=product.vendor_id,
+                price_at_time=product.price, quantity=1,
+            )
+            start = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    decrement_stock({product.pk: 1})
+                    rollups.record_items([item])
+                ok = True
+            except (InsufficientStock, OperationalError):
+                ok = False
+            finally:
+                connection.close()
+            return (time.perf_counter() - start) * 1000, ok
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            results = list(pool.map(checkout, range(options['orders'])))
+        elapsed = time.perf_counter() - start
+
+        stats = summarize([latency for latency, _ in results])
+        stats['errors'] = sum(1 for _, ok in results if not ok)
+        stats['orders_per_second'] = round((len(results) - stats['errors']) / elapsed, 1)
+        return stats
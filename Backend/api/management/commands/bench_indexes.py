@@ -0,0 +1,140 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from api.benchmarking import measure, plan_problems, query_plan, rolled_back
+from api.models import Address, Order, Product, User, Vendor
+
+CATEGORIES = [f'Category {i:02d}' for i in range(49)] + ['Fruits']
+STATUSES = ['PENDING', 'CONFIRMED', 'PACKING', 'SHIPPED', 'DELIVERED', 'CANCELLED', 'FAILED']
+
+# Indexes behind the list endpoints, dropped for the --without-indexes baseline
+INDEXES = (
+    'order_user_created_idx',
+    'order_user_status_idx',
+    'product_avail_name_idx',
+    'product_avail_category_idx',
+    'product_vendor_category_idx',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed products and orders (1M each by default), then print the query "
+        "plan and SQL latency of the order and product list endpoints. With "
+        "--without-indexes the same queries are rerun after dropping their "
+        "indexes, for comparison. Everything is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1_000_000)
+        parser.add_argument('--orders', type=int, default=1_000_000)
+        parser.add_argument('--vendors', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--without-indexes', action='store_true')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with rolled_back():
+            client, paths = self.seed(rng, options)
+            queries = {}
+            for label, path, table in paths:
+                reset_queries()  # seeding filled the capped query log
+                with CaptureQueriesContext(connection) as captured:
+                    client.get(path)
+                queries[label] = next(
+                    q['sql'] for q in captured
+                    if q['sql'].startswith('SELECT') and f'FROM "{table}"' in q['sql']
+                )
+
+            self.report('with indexes', queries, options['repeat'])
+            if options['without_indexes']:
+                with connection.cursor() as cursor:
+                    for name in INDEXES:
+                        cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+                    cursor.execute('ANALYZE')
+                self.report('without indexes', queries, options['repeat'])
+
+    def seed(self, rng, options):
+        now = timezone.now()
+        vendors = []
+        for i in range(options['vendors']):
+            latitude = Decimal(f"{rng.uniform(12.8, 13.2):.7f}")
+            longitude = Decimal(f"{rng.uniform(77.4, 77.8):.7f}")
+            vendors.append(Vendor(
+                name=f'Bench Vendor {i}', city='Bench City', latitude=latitude, longitude=longitude,
+            ))
+        Vendor.objects.bulk_create(vendors, batch_size=2000)
+        users = User.objects.bulk_create([
+            User(username=f'bench-index-{i}', phone=f'+1999{i:08d}') for i in range(options['users'])
+        ])
+        user = users[0]
+        address = Address.objects.create(
+            user=user, latitude=Decimal('13.0000000'), longitude=Decimal('77.6000000'),
+            address_line='1 Bench St', city='Bench City', pincode='560001',
+        )
+
+        for start in range(0, options['products'], 10_000):
+            Product.objects.bulk_create([
+                Product(
+                    vendor=vendors[rng.randrange(len(vendors))], name=f'Product {start + i:07d}',
+                    category=rng.choice(CATEGORIES), price=Decimal('9.99'), is_available=rng.random() < 0.9,
+                )
+                for i in range(min(10_000, options['products'] - start))
+            ], batch_size=2000)
+        for start in range(0, options['orders'], 10_000):
+            Order.objects.bulk_create([
+                Order(
+                    user=users[rng.randrange(len(users))], vendor=vendors[rng.randrange(len(vendors))],
+                    status=rng.choice(STATUSES), delivery_fee=Decimal('5.00'),
+                    created_at=now - timedelta(minutes=rng.randrange(525_600)),
+                )
+                for _ in range(min(10_000, options['orders'] - start))
+            ], batch_size=2000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write(
+            f"Seeded {options['products']} products and {options['orders']} orders "
+            f"({Order.objects.filter(user=user).count()} for the benchmark user)"
+        )
+
+        token = Token.objects.create(user=user)
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}', HTTP_HOST='localhost')
+        paths = [
+            ('orders', '/api/v1/orders/', 'api_order'),
+            ('orders by status', '/api/v1/orders/?status=delivered', 'api_order'),
+            ('products by category', '/api/v1/products/?category=fruits', 'api_product'),
+            ('nearby by category', f'/api/v1/products/?address={address.pk}&category=fruits', 'api_product'),
+        ]
+        return client, paths
+
+    def report(self, heading, queries, repeat):
+        self.stdout.write(f"\n{heading}:")
+        for label, sql in queries.items():
+            plan = query_plan(sql)
+
+            def run():
+                with connection.cursor() as cursor:
+                    cursor.execute(sql)
+                    cursor.fetchall()
+
+            stats = measure(run, repeat)
+            problems = plan_problems(plan)
+            if any('SCAN' in line.upper().split(' USING')[0] for line in problems):
+                verdict = 'full scan'
+            else:
+                verdict = 'index scan, then sort' if problems else 'index scan'
+            self.stdout.write(
+                f"{label:>21}: p50 {stats['p50_ms']:.2f} ms, p95 {stats['p95_ms']:.2f} ms ({verdict})"
+            )
+            for line in plan:
+                self.stdout.write(f"{'':>23}{line}")
@@ -0,0 +1,63 @@
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from api import geo
+from api.benchmarking import measure, rolled_back
+from api.models import Vendor
+
+
+class Command(BaseCommand):
+    help = "Benchmark Vendor.nearby against a full-scan haversine filter."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendors', type=int, default=100_000)
+        parser.add_argument('--radius', type=float, default=5.0)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        radius = options['radius']
+
+        # Vendors spread over a country-sized box
+        def point():
+            return (
+                Decimal(f"{rng.uniform(8.0, 30.0):.7f}"),
+                Decimal(f"{rng.uniform(70.0, 90.0):.7f}"),
+            )
+
+        with rolled_back():
+            vendors = []
+            for i in range(options['vendors']):
+                latitude, longitude = point()
+                vendors.append(Vendor(
+                    name=f'Bench Vendor {i}', city='Bench City',
+                    latitude=latitude, longitude=longitude,
+                ))
+            Vendor.objects.bulk_create(vendors, batch_size=2000)
+            self.stdout.write(f"Seeded {len(vendors)} vendors")
+
+            probes = [point() for _ in range(options['repeat'])]
+
+            def indexed():
+                latitude, longitude = probes[rng.randrange(len(probes))]
+                return Vendor.nearby(latitude, longitude, radius)
+
+            def full_scan():
+                latitude, longitude = probes[rng.randrange(len(probes))]
+                return [
+                    v for v in Vendor.objects.filter(is_active=True).only('latitude', 'longitude')
+                    if geo.haversine_km(latitude, longitude, v.latitude, v.longitude) <= radius
+                ]
+
+            for label, func, repeat in (
+                ('geohash index', indexed, options['repeat']),
+                ('full scan', full_scan, max(1, options['repeat'] // 10)),
+            ):
+                stats = measure(func, repeat)
+                self.stdout.write(
+                    f"{label:>14}: mean {stats['mean_ms']:.2f} ms, "
+                    f"p50 {stats['p50_ms']:.2f} ms, p99 {stats['p99_ms']:.2f} ms ({stats['runs']} runs)"
+                )
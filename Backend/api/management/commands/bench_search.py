@@ -0,0 +1,53 @@
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import search
+from api.benchmarking import PRODUCT_WORDS, measure, rolled_back
+from api.models import Product, Vendor
+
+
+class Command(BaseCommand):
+    help = "Benchmark full-text product search against the name__icontains path."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1_000_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError("Full-text search is not available on this database.")
+        rng = random.Random(options['seed'])
+
+        with rolled_back():
+            vendor = Vendor.objects.create(
+                name='Bench Vendor', city='Bench City',
+                latitude=Decimal('12.9716000'), longitude=Decimal('77.5946000'),
+            )
+            batch = []
+            for i in range(options['products']):
+                name = ' '.join(rng.sample(PRODUCT_WORDS, 3)).title() + f' {i}'
+                batch.append(Product(vendor=vendor, name=name, category='Grocery', price=Decimal('9.99')))
+                if len(batch) == 5000:
+                    Product.objects.bulk_create(batch)
+                    batch = []
+            Product.objects.bulk_create(batch)
+            self.stdout.write(f"Seeded {options['products']} products")
+
+            for text in ('ban', 'organic man', 'pan'):
+                fts = measure(
+                    lambda: list(search.filter_products(Product.objects.filter(is_available=True), text)
+                                 .order_by('search_rank', 'id').values_list('id', flat=True)[:20]),
+                    options['repeat'],
+                )
+                icontains = measure(
+                    lambda: list(Product.objects.filter(is_available=True, name__icontains=text)
+                                 .order_by('name').values_list('id', flat=True)[:20]),
+                    options['repeat'],
+                )
+                self.stdout.write(
+                    f"{text!r:>14}: fts p50 {fts['p50_ms']:.2f} ms / p99 {fts['p99_ms']:.2f} ms, "
+                    f"icontains p50 {icontains['p50_ms']:.2f} ms / p99 {icontains['p99_ms']:.2f} ms"
+                )
@@ -0,0 +1,131 @@
+import json
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from api.benchmarking import summarize
+from api.models import Address, Product, Stock, User, Vendor
+
+
+class Command(BaseCommand):
+    help = (
+        "Place orders from several processes at once against a scratch SQLite "
+        "database, once per SQLITE_PROFILES entry, and report throughput, "
+        "latency and the error rate (\"database is locked\" among them) as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--orders', type=int, default=100, help="Orders per process")
+        parser.add_argument('--products', type=int, default=20)
+        parser.add_argument('--basket', type=int, default=3, help="Items per order")
+        parser.add_argument('--profile', action='append', choices=sorted(settings.SQLITE_PROFILES),
+                            help="Profile to run; repeat for several (default: all)")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("bench_sqlite needs the default database to be SQLite.")
+        report = {}
+        for profile in options['profile'] or sorted(settings.SQLITE_PROFILES):
+            with tempfile.TemporaryDirectory() as directory:
+                report[profile] = self.run(profile, os.path.join(directory, 'bench.sqlite3'), options)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run(self, profile, path, options):
+        use_profile(profile, path)
+        call_command('migrate', verbosity=0)
+        user = User.objects.create_user(username='bench-sqlite', phone='+19999999998', password='x')
+        token = Token.objects.create(user=user)
+        address = Address.objects.create(
+            user=user, latitude=Decimal('12.9716000'), longitude=Decimal('77.5946000'),
+            address_line='1 Bench St', city='Bench City', pincode='560001',
+        )
+        vendor = Vendor.objects.create(
+            name='Bench Vendor', city='Bench City', latitude=Decimal('12.9716000'), longitude=Decimal('77.5946000'),
+        )
+        products = Product.objects.bulk_create([
+            Product(vendor=vendor, name=f'Bench {i}', category='Bench', price=Decimal('1.00'))
+            for i in range(options['products'])
+        ])
+        Stock.objects.bulk_create([Stock(product=product, quantity=10**9) for product in products])
+        connections.close_all()
+
+        jobs = [
+            (profile, path, token.key, str(address.pk), [str(p.pk) for p in products], seed, options)
+            for seed in range(options['processes'])
+        ]
+        start = time.perf_counter()
+        with multiprocessing.get_context('fork').Pool(options['processes']) as pool:
+            results = pool.map(place_orders, jobs)
+        elapsed = time.perf_counter() - start
+
+        latencies = [latency for result in results for latency in result['latencies']]
+        errors = {}
+        for result in results:
+            for error, count in result['errors'].items():
+                errors[error] = errors.get(error, 0) + count
+        total = options['processes'] * options['orders']
+        placed = total - sum(errors.values())
+        stats = summarize(latencies)
+        stats.update(
+            orders=total,
+            placed=placed,
+            error_rate=round(1 - placed / total, 4),
+            errors=errors,
+            orders_per_second=round(placed / elapsed, 1),
+        )
+        return stats
+
+
+def use_profile(profile, path):
+    """Point the default connection at `path` with a SQLITE_PROFILES entry."""
+    connections.close_all()
+    database = connection.settings_dict
+    database.update(NAME=path, CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False, OPTIONS={})
+    database.update(settings.SQLITE_PROFILES[profile])
+
+
+def place_orders(job):
+    """Worker process: place `--orders` orders and time each request."""
+    profile, path, token, address, products, seed, options = job
+    use_profile(profile, path)
+    # Failed requests are counted below; keep their tracebacks off stderr
+    logging.disable(logging.ERROR)
+    rng = random.Random(seed)
+    client = Client(HTTP_AUTHORIZATION=f'Token {token}', HTTP_HOST='localhost')
+    latencies, errors = [], {}
+    for _ in range(options['orders']):
+        payload = {
+            'address': address,
+            'items': [
+                {'product_id': product, 'quantity': 1}
+                for product in rng.sample(products, min(options['basket'], len(products)))
+            ],
+            'delivery_fee': '5.00',
+        }
+        start = time.perf_counter()
+        try:
+            response = client.post('/api/v1/orders/', payload, content_type='application/json')
+            error = None if response.status_code == 201 else f'HTTP {response.status_code}'
+        except OperationalError as e:
+            error = str(e)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if error:
+            errors[error] = errors.get(error, 0) + 1
+        # The test client skips the end-of-request connection cleanup a server
+        # runs; without CONN_MAX_AGE every request opens a new connection
+        if settings.SQLITE_PROFILES[profile].get('CONN_MAX_AGE', 0) == 0:
+            connections.close_all()
+    connections.close_all()
+    return {'latencies': latencies, 'errors': errors}
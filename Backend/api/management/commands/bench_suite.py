@@ -0,0 +1,283 @@
+import json
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+
+from api import authentication, metrics, replicas
+from api.benchmarking import (
+    PRODUCT_CATEGORIES, PRODUCT_WORDS, compare, percentile, scratch_database, seed_fixtures, summarize,
+)
+from api.models import Stock
+
+# Fixture volumes per --scale
+SCALES = {
+    'small': {'users': 50, 'vendors': 20, 'products': 2_000, 'orders': 5_000},
+    'medium': {'users': 1_000, 'vendors': 200, 'products': 50_000, 'orders': 100_000},
+    'large': {'users': 10_000, 'vendors': 1_000, 'products': 500_000, 'orders': 1_000_000},
+}
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+# Catalogue pages a shopper reads in one category before moving on
+BROWSE_DEPTH = 3
+
+# Cache lifetime during a run (seconds); longer than any run takes
+RUN_CACHE_TTL = 24 * 60 * 60
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database with a fixed, seeded data set and run the "
+        "catalogue, checkout and order history scenarios against it through "
+        "the full request stack. Prints throughput, latency percentiles and "
+        "queries per request as JSON and compares them with the stored "
+        "baseline, failing with a list of regressions. Queries per request "
+        "may not grow; latency is machine-dependent, so record the baseline "
+        "(--save-baseline) on the machine that runs the comparison."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='medium')
+        parser.add_argument('--requests', type=int, default=500, help="Measured requests per scenario")
+        parser.add_argument('--warmup', type=int, default=20, help="Unmeasured requests per scenario")
+        parser.add_argument('--threads', type=int, default=16, help="Concurrent hot product checkouts")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+        parser.add_argument('--save-baseline', action='store_true',
+                            help="Store this run as the baseline instead of comparing")
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help="Allowed latency and throughput regression, as a fraction")
+        parser.add_argument('--output', type=Path, help="Also write the JSON report here")
+
+    def handle(self, *args, **options):
+        if replicas.enabled():
+            raise CommandError("Run bench_suite with REPLICA_READS off; it seeds the primary only.")
+        rng = random.Random(options['seed'])
+        volumes = SCALES[options['scale']]
+
+        with scratch_database():
+            start = time.perf_counter()
+            fixtures = seed_fixtures(rng, **volumes)
+            self.stderr.write(
+                f"Seeded {volumes['products']} products and {volumes['orders']} orders "
+                f"in {time.perf_counter() - start:.1f} s"
+            )
+            # Failed requests are counted in the report; keep their tracebacks off stderr
+            logging.disable(logging.ERROR)
+            try:
+                with steady_caches():
+                    scenarios = {
+                        name: self.run(request, rng, options)
+                        for name, request in self.scenarios(fixtures)
+                    }
+                    scenarios['hot_sku_checkout'] = self.run_contended(fixtures, rng, options)
+            finally:
+                logging.disable(logging.NOTSET)
+
+        report = {
+            'meta': {
+                'scale': options['scale'],
+                'seed': options['seed'],
+                'requests': options['requests'],
+                'warmup': options['warmup'],
+                'threads': options['threads'],
+                'database': connection.vendor,
+            },
+            'scenarios': scenarios,
+        }
+        text = json.dumps(report, indent=2)
+        self.stdout.write(text)
+        if options['output']:
+            options['output'].write_text(text + '\n')
+
+        if options['save_baseline']:
+            options['baseline'].parent.mkdir(parents=True, exist_ok=True)
+            options['baseline'].write_text(text + '\n')
+            self.stderr.write(f"Baseline saved to {options['baseline']}")
+            return
+        if not options['baseline'].exists():
+            self.stderr.write(f"No baseline at {options['baseline']}; run with --save-baseline to record one.")
+            return
+        regressions = compare(report, json.loads(options['baseline'].read_text()), options['tolerance'])
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} regressions against {options['baseline']}:\n  "
+                + '\n  '.join(regressions)
+            )
+        self.stderr.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
+
+    def scenarios(self, fixtures):
+        """
+        (name, request) pairs; `request(rng)` sends one request and returns
+        the response.
+        """
+        anonymous = Client(HTTP_HOST='localhost')
+        clients = {}
+
+        def client(token):
+            if token not in clients:
+                clients[token] = Client(HTTP_AUTHORIZATION=f'Token {token}', HTTP_HOST='localhost')
+            return clients[token]
+
+        # Shoppers read a few pages of one category, then pick another
+        browsing = {'next': None, 'depth': 0}
+
+        def browse(rng):
+            if browsing['next'] and browsing['depth'] < BROWSE_DEPTH:
+                path, browsing['depth'] = browsing['next'], browsing['depth'] + 1
+            else:
+                path, browsing['depth'] = f'/api/v1/products/?category={rng.choice(PRODUCT_CATEGORIES)}', 1
+            response = anonymous.get(path)
+            browsing['next'] = response.json().get('next') if response.status_code == 200 else None
+            return response
+
+        def search(rng):
+            words = rng.sample(PRODUCT_WORDS, rng.randint(1, 2))
+            text = ' '.join(word[:rng.randint(3, len(word))] for word in words)
+            return anonymous.get('/api/v1/products/', {'search': text})
+
+        def create(size):
+            def request(rng):
+                customer = rng.randrange(len(fixtures.tokens))
+                payload = {
+                    'address': fixtures.addresses[customer],
+                    'items': [
+                        {'product_id': product, 'quantity': rng.randint(1, 3)}
+                        for product in rng.sample(fixtures.products, size)
+                    ],
+                    'delivery_fee': '25.00',
+                }
+                return client(fixtures.tokens[customer]).post(
+                    '/api/v1/orders/', payload, content_type='application/json'
+                )
+            return request
+
+        def history(rng):
+            token, _ = rng.choice(fixtures.orders)
+            return client(token).get('/api/v1/orders/')
+
+        def detail(rng):
+            token, order = rng.choice(fixtures.orders)
+            return client(token).get(f'/api/v1/orders/{order}/')
+
+        return [
+            ('catalogue_browse', browse),
+            ('catalogue_search', search),
+            ('order_create_1', create(1)),
+            ('order_create_10', create(10)),
+            ('order_create_50', create(50)),
+            ('order_history', history),
+            ('order_detail', detail),
+        ]
+
+    def run(self, request, rng, options):
+        """Send warm-up and then measured requests one at a time."""
+        clear_caches()
+        for _ in range(options['warmup']):
+            request(rng)
+
+        results = []
+        start = time.perf_counter()
+        for _ in range(options['requests']):
+            results.append(measure_request(request, rng))
+        elapsed = time.perf_counter() - start
+        return scenario_stats(results, elapsed)
+
+    def run_contended(self, fixtures, rng, options):
+        """
+        Every request buys one unit of the same product from --threads
+        threads at once. Stock is checked afterwards: whatever was sold
+        must have come off it exactly once.
+        """
+        clear_caches()
+        stock_before = Stock.objects.get(pk=fixtures.hot_product).total_quantity
+        customers = [rng.randrange(len(fixtures.tokens)) for _ in range(options['requests'])]
+
+        def checkout(customer):
+            client = Client(HTTP_AUTHORIZATION=f'Token {fixtures.tokens[customer]}', HTTP_HOST='localhost')
+            payload = {
+                'address': fixtures.addresses[customer],
+                'items': [{'product_id': fixtures.hot_product, 'quantity': 1}],
+                'delivery_fee': '25.00',
+            }
+            try:
+                return measure_request(
+                    lambda _: client.post('/api/v1/orders/', payload, content_type='application/json'), None
+                )
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            results = list(pool.map(checkout, customers))
+        elapsed = time.perf_counter() - start
+
+        stats = scenario_stats(results, elapsed)
+        # Waiting writers back off in sleeps (SQLite's busy handler), so
+        # latencies depend on thread scheduling; throughput is compared
+        stats['compared'] = []
+        sold = stock_before - Stock.objects.get(pk=fixtures.hot_product).total_quantity
+        if sold != len(results) - stats['errors']:
+            raise CommandError(
+                f"hot_sku_checkout placed {len(results) - stats['errors']} orders but stock fell by {sold}."
+            )
+        return stats
+
+
+@contextmanager
+def steady_caches():
+    """
+    Keep cached catalogue pages and token lookups for the whole run. With
+    the usual expiry, how many requests miss would depend on how fast the
+    machine gets through them; this way it depends on --seed alone.
+    """
+    ttl = authentication.local.ttl
+    authentication.local.ttl = RUN_CACHE_TTL
+    try:
+        with override_settings(CATALOGUE_CACHE_TIMEOUT=RUN_CACHE_TTL, TOKEN_CACHE_TTL=RUN_CACHE_TTL):
+            yield
+    finally:
+        authentication.local.ttl = ttl
+
+
+def clear_caches():
+    """Start a scenario cold: no cached responses or token lookups."""
+    cache.clear()
+    authentication.local.clear()
+
+
+def measure_request(request, rng):
+    """Send one request; return (latency in ms, query count, ok, repeated queries)."""
+    start = time.perf_counter()
+    with metrics.recording() as record:
+        try:
+            response = request(rng)
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+    latency = (time.perf_counter() - start) * 1000
+    return latency, record.query_count, ok, bool(record.duplicates())
+
+
+def scenario_stats(results, elapsed):
+    stats = summarize([latency for latency, *_ in results])
+    queries = sorted(count for _, count, *_ in results)
+    stats.update(
+        requests_per_second=round(len(results) / elapsed, 1),
+        # The median is what a warm request costs; the maximum includes
+        # cold caches (token lookups, catalogue pages) and is for reading only
+        queries_p50=percentile(queries, 0.50),
+        queries_max=max(queries, default=0),
+        errors=sum(1 for *_, ok, _ in results if not ok),
+        repeated_query_requests=sum(1 for *_, repeated in results if repeated),
+    )
+    return stats
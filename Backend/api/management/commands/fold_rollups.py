@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold the sales deltas appended by checkouts and cancellations into "
+        "the daily vendor and product rollups. Runs once, or every --loop "
+        "seconds when given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', type=float, help="Keep running, folding every N seconds")
+        parser.add_argument('--batch-size', type=int, default=rollups.FOLD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        while True:
+            folded = total = rollups.fold(batch_size=options['batch_size'])
+            while folded:
+                folded = rollups.fold(batch_size=options['batch_size'])
+                total += folded
+            if total or not options['loop']:
+                self.stdout.write(f"Folded {total} sales delta(s).")
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
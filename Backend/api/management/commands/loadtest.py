@@ -0,0 +1,72 @@
+import json
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarking import summarize
+
+DEFAULT_PATHS = ['/api/v1/health/', '/api/v1/products/', '/api/v1/orders/']
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent GET requests at one or more running deployments and "
+        "report requests per second and latency percentiles as JSON, e.g.\n"
+        "  gunicorn frookoonBackend.wsgi -w 4 -b :8000\n"
+        "  uvicorn frookoonBackend.asgi:application --workers 4 --port 8001\n"
+        "  manage.py loadtest --target wsgi=http://127.0.0.1:8000 "
+        "--target asgi=http://127.0.0.1:8001 --token <key>"
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True,
+                            help="name=base_url of a deployment; repeat to compare")
+        parser.add_argument('--path', action='append',
+                            help="Endpoint path to hit; repeat for several (default: read endpoints)")
+        parser.add_argument('--token', help="API token sent as 'Authorization: Token <key>'")
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per path and target")
+        parser.add_argument('--timeout', type=float, default=10.0)
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['target']:
+            name, sep, base_url = target.partition('=')
+            if not sep:
+                raise CommandError(f"--target must look like name=url, got {target!r}")
+            targets.append((name, base_url.rstrip('/')))
+
+        headers = {'Authorization': f"Token {options['token']}"} if options['token'] else {}
+        report = {}
+        for name, base_url in targets:
+            report[name] = {
+                path: self.run(base_url + path, headers, options)
+                for path in options['path'] or DEFAULT_PATHS
+            }
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run(self, url, headers, options):
+        def fetch(_):
+            request = urllib.request.Request(url, headers=headers)
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=options['timeout']) as response:
+                    response.read()
+                    ok = response.status < 400
+            except (urllib.error.URLError, TimeoutError):
+                ok = False
+            return (time.perf_counter() - start) * 1000, ok
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(fetch, range(options['requests'])))
+        elapsed = time.perf_counter() - start
+
+        stats = summarize([latency for latency, _ in results])
+        stats['errors'] = sum(1 for _, ok in results if not ok)
+        stats['requests_per_second'] = round(len(results) / elapsed, 1)
+        return stats
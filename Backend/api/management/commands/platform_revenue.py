@@ -0,0 +1,29 @@
+import datetime
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api import pricing
+
+
+class Command(BaseCommand):
+    help = (
+        "Report gross order value, delivery fees, vendor commission and "
+        "platform revenue for orders placed between two dates (end exclusive)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', required=True, help="YYYY-MM-DD, inclusive")
+        parser.add_argument('--end', required=True, help="YYYY-MM-DD, exclusive")
+
+    def handle(self, *args, **options):
+        try:
+            start, end = (
+                timezone.make_aware(datetime.datetime.fromisoformat(options[name]))
+                for name in ('start', 'end')
+            )
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+        totals = pricing.platform_revenue(start, end)
+        self.stdout.write(json.dumps(totals, default=str, indent=2))
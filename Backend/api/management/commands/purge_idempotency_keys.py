@@ -0,0 +1,18 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete stored Idempotency-Key responses older than --hours (default 24)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(hours=options['hours'])
+        deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(f"Deleted {deleted} idempotency key(s).")
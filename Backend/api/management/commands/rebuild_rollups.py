@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily vendor and product sales rollups from all orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=rollups.REBUILD_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        vendor_rows, product_rows = rollups.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {vendor_rows} vendor-day and {product_rows} product-day rows."
+        ))
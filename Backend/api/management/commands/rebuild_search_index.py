@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api import search
+
+
+class Command(BaseCommand):
+    help = "Repopulate the SQLite product search table from api_product."
+
+    def handle(self, *args, **options):
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS("Product search index rebuilt."))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import reservations
+
+
+class Command(BaseCommand):
+    help = (
+        "Cancel PENDING orders whose stock holds have expired and return the "
+        "stock. Runs once, or every --loop seconds when given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', type=float, help="Keep running, sweeping every N seconds")
+        parser.add_argument('--batch-size', type=int, default=reservations.RELEASE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        while True:
+            released = reservations.release_expired(batch_size=options['batch_size'])
+            if released or not options['loop']:
+                self.stdout.write(f"Released stock for {released} expired order(s).")
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.inventory import set_stripe_count
+from api.models import Stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Split a hot product's stock counter into N stripes so concurrent "
+        "checkouts update different rows; --stripes 0 folds it back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_id')
+        parser.add_argument('--stripes', type=int, required=True)
+
+    def handle(self, *args, **options):
+        if not 0 <= options['stripes'] <= 64:
+            raise CommandError("--stripes must be between 0 and 64.")
+        try:
+            set_stripe_count(options['product_id'], options['stripes'])
+        except Stock.DoesNotExist:
+            raise CommandError(f"No stock row for product {options['product_id']}.")
+        stock = Stock.objects.get(pk=options['product_id'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Product {stock.pk}: {stock.stripe_count} stripe(s), {stock.total_quantity} in stock."
+        ))
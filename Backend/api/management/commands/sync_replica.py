@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from api import replicas
+
+
+def copy_database(source=DEFAULT_DB_ALIAS, target=replicas.REPLICA_ALIAS):
+    """Copy the whole `source` SQLite database over `target` (online backup)."""
+    for alias in (source, target):
+        if connections[alias].vendor != 'sqlite':
+            raise CommandError(f"sync_replica copies SQLite databases; {alias!r} is not one.")
+        connections[alias].ensure_connection()
+    connections[source].connection.backup(connections[target].connection)
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh the local SQLite stand-in for the read replica from the "
+        "primary database. Runs once, or every --loop seconds to simulate "
+        "replication lag. Run with REPLICA_READS=1 to serve reads from it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', type=float, help="Keep copying every N seconds")
+
+    def handle(self, *args, **options):
+        while True:
+            copy_database()
+            self.stdout.write("Replica refreshed from the primary.")
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
@@ -0,0 +1,262 @@
+"""
+Per-request query and latency metrics.
+
+RequestMetricsMiddleware samples REQUEST_METRICS_SAMPLE_RATE of requests.
+For each sampled request it records the SQL query count and database
+time, the time spent in serializers and the response size.
+The response gets a `Server-Timing` header, and the totals per route are
+kept in `registry`, which /api/v1/metrics/ renders in the Prometheus text
+format. Totals are per process, like the other in-memory caches here.
+
+A request that runs the same SQL (before parameters are bound) at least
+DUPLICATE_QUERY_THRESHOLD times is flagged as a likely N+1. It is
+counted, marked in Server-Timing and logged with the repeated statement.
+
+With the sample rate at 0 (the default) the middleware removes itself
+at startup and nothing here is installed, so requests pay nothing.
+The current request's record lives in a context variable, so concurrent
+requests under ASGI, and the worker threads the async views hand their
+work to, each count towards their own request. Queries are seen through
+a connection execute wrapper that looks the record up; serializer time
+through TimedRepresentation, which the response serializers mix in.
+"""
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the request duration histogram
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_current = ContextVar('request_metrics', default=None)
+_installed = False
+_install_lock = threading.Lock()
+
+
+class RequestRecord:
+    """What one request did: queries by SQL text and time per layer."""
+
+    def __init__(self):
+        self.queries = Counter()
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    def duplicates(self, threshold=None):
+        """`(sql, count)` for statements run at least `threshold` times."""
+        if threshold is None:
+            threshold = settings.DUPLICATE_QUERY_THRESHOLD
+        return [(sql, count) for sql, count in self.queries.most_common() if count >= threshold]
+
+
+@contextmanager
+def recording():
+    """Record the queries and serializer time of the block."""
+    install()
+    record = RequestRecord()
+    token = _current.set(record)
+    try:
+        yield record
+    finally:
+        _current.reset(token)
+
+
+def _time_query(execute, sql, params, many, context):
+    record = _current.get()
+    if record is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record.db_time += time.perf_counter() - start
+        record.queries[sql] += 1
+
+
+def _add_wrapper(connection):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _add_wrapper(connection)
+
+
+class TimedRepresentation:
+    """
+    Serializer mixin adding the time spent in to_representation() to the
+    current request's record. Nested serializers are part of the outermost
+    one's time.
+    """
+
+    def to_representation(self, instance):
+        record = _current.get()
+        if record is None or record.serializing:
+            return super().to_representation(instance)
+        record.serializing = True
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            record.serializer_time += time.perf_counter() - start
+            record.serializing = False
+
+
+def install():
+    """Hook the query wrapper into every connection, once per process."""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        connection_created.connect(_on_connection_created)
+        for connection in connections.all(initialized_only=True):
+            _add_wrapper(connection)
+        _installed = True
+
+
+class Registry:
+    """Request totals per (method, route), rendered for Prometheus."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def clear(self):
+        with self.lock:
+            self.routes.clear()
+
+    def observe(self, method, route, record, duration, size, duplicated):
+        with self.lock:
+            stats = self.routes.get((method, route))
+            if stats is None:
+                stats = self.routes[(method, route)] = {
+                    'requests': 0, 'queries': 0, 'db_seconds': 0.0, 'serializer_seconds': 0.0,
+                    'response_bytes': 0, 'duplicate_queries': 0, 'duration_seconds': 0.0,
+                    'buckets': [0] * len(DURATION_BUCKETS),
+                }
+            stats['requests'] += 1
+            stats['queries'] += record.query_count
+            stats['db_seconds'] += record.db_time
+            stats['serializer_seconds'] += record.serializer_time
+            stats['response_bytes'] += size
+            stats['duplicate_queries'] += bool(duplicated)
+            stats['duration_seconds'] += duration
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    stats['buckets'][index] += 1
+
+    def render(self):
+        with self.lock:
+            routes = {key: dict(stats, buckets=list(stats['buckets'])) for key, stats in self.routes.items()}
+        lines = []
+        counters = (
+            ('api_requests_total', 'requests', "Sampled requests."),
+            ('api_db_queries_total', 'queries', "SQL queries run by sampled requests."),
+            ('api_db_duration_seconds_total', 'db_seconds', "Database time of sampled requests."),
+            ('api_serializer_duration_seconds_total', 'serializer_seconds',
+             "Serializer time of sampled requests."),
+            ('api_response_bytes_total', 'response_bytes', "Response body bytes of sampled requests."),
+            ('api_duplicate_query_requests_total', 'duplicate_queries',
+             "Sampled requests that repeated a query (likely N+1)."),
+        )
+        for name, field, help_text in counters:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for (method, route), stats in sorted(routes.items()):
+                lines.append(f'{name}{{{_labels(method, route)}}} {_number(stats[field])}')
+
+        name = 'api_request_duration_seconds'
+        lines += [f'# HELP {name} Duration of sampled requests.', f'# TYPE {name} histogram']
+        for (method, route), stats in sorted(routes.items()):
+            labels = _labels(method, route)
+            for bound, count in zip(DURATION_BUCKETS, stats['buckets']):
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {stats["requests"]}')
+            lines.append(f'{name}_sum{{{labels}}} {_number(stats["duration_seconds"])}')
+            lines.append(f'{name}_count{{{labels}}} {stats["requests"]}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(method, route):
+    route = route.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return f'method="{method}",route="{route}"'
+
+
+def _number(value):
+    return f'{value:.6f}' if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+
+
+def server_timing(record, duration, duplicated):
+    parts = [
+        f'db;dur={record.db_time * 1000:.1f};desc="{record.query_count} queries"',
+        f'serializer;dur={record.serializer_time * 1000:.1f}',
+        f'total;dur={duration * 1000:.1f}',
+    ]
+    if duplicated:
+        parts.append(f'n-plus-one;desc="{len(duplicated)} repeated queries"')
+    return ', '.join(parts)
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.REQUEST_METRICS_SAMPLE_RATE
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+        install()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with recording() as record:
+            response = self.get_response(request)
+        return self.observe(request, response, record, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        start = time.perf_counter()
+        with recording() as record:
+            response = await self.get_response(request)
+        return self.observe(request, response, record, time.perf_counter() - start)
+
+    def observe(self, request, response, record, duration):
+        match = request.resolver_match
+        route = '/' + match.route if match is not None else 'unmatched'
+        size = 0 if response.streaming else len(response.content)
+        duplicated = record.duplicates()
+        registry.observe(request.method, route, record, duration, size, duplicated)
+        response['Server-Timing'] = server_timing(record, duration, duplicated)
+        for sql, count in duplicated:
+            logger.warning("%s %s ran the same query %d times: %s", request.method, route, count, sql)
+        return response
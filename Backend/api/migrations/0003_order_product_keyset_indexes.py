@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-18 01:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_commission_stock_remove_product_stock_non_negative_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_available', 'name', 'id'], name='product_avail_name_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 01:16
+
+from django.db import migrations, models
+
+from api import geo
+
+
+def backfill_geohash(apps, schema_editor):
+    Vendor = apps.get_model('api', 'Vendor')
+    pks = list(Vendor.objects.values_list('pk', flat=True))
+    for start in range(0, len(pks), 2000):
+        vendors = list(Vendor.objects.filter(pk__in=pks[start:start + 2000]).only('id', 'latitude', 'longitude'))
+        for vendor in vendors:
+            vendor.geohash = geo.encode(vendor.latitude, vendor.longitude)
+        Vendor.objects.bulk_update(vendors, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_order_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vendor',
+            name='geohash',
+            field=models.CharField(default='', editable=False, max_length=12),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='vendor',
+            index=models.Index(fields=['geohash'], name='vendor_geohash_idx'),
+        ),
+    ]
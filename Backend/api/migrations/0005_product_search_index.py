@@ -0,0 +1,51 @@
+# Generated by Django 6.0 on 2026-10-18 09:30
+
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE api_product_fts USING fts5("
+    "name, product_id UNINDEXED, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "INSERT INTO api_product_fts (rowid, name, product_id) SELECT rowid, name, id FROM api_product",
+    "CREATE TRIGGER api_product_fts_insert AFTER INSERT ON api_product BEGIN "
+    "INSERT INTO api_product_fts (rowid, name, product_id) VALUES (new.rowid, new.name, new.id); END",
+    "CREATE TRIGGER api_product_fts_delete AFTER DELETE ON api_product BEGIN "
+    "DELETE FROM api_product_fts WHERE rowid = old.rowid; END",
+    "CREATE TRIGGER api_product_fts_update AFTER UPDATE OF name ON api_product BEGIN "
+    "UPDATE api_product_fts SET name = new.name WHERE rowid = old.rowid; END",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS api_product_fts_update",
+    "DROP TRIGGER IF EXISTS api_product_fts_delete",
+    "DROP TRIGGER IF EXISTS api_product_fts_insert",
+    "DROP TABLE IF EXISTS api_product_fts",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE INDEX api_product_name_fts_idx ON api_product USING gin (to_tsvector('simple', name))",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS api_product_name_fts_idx",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_vendor_geohash'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 01:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='stripe_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='StockStripe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField()),
+                ('quantity', models.IntegerField()),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stripes', to='api.stock')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('stock', 'index'), name='stock_stripe_unique_index'), models.CheckConstraint(condition=models.Q(('quantity__gte', 0)), name='stock_stripe_quantity_non_negative')],
+            },
+        ),
+    ]
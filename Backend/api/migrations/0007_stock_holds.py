@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-18 01:31
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_stock_stripes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockHold',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='api.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='stock_hold_expires_idx')],
+            },
+        ),
+    ]
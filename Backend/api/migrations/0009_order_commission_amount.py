@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 01:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='commission_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+    ]
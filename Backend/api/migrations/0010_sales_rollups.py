@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-18 01:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_order_commission_amount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='commission_rate',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.CreateModel(
+            name='ProductDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'day'), name='product_daily_sales_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VendorDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('commission', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.vendor')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('vendor', 'day'), name='vendor_daily_sales_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-18 01:45
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusEvent',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('from_status', models.CharField(choices=[('PENDING', 'Pending Payment'), ('CONFIRMED', 'Confirmed (Inventory Locked)'), ('PACKING', 'Being Packed'), ('SHIPPED', 'Out for Delivery'), ('DELIVERED', 'Delivered'), ('CANCELLED', 'Cancelled'), ('FAILED', 'Payment Failed')], max_length=30)),
+                ('to_status', models.CharField(choices=[('PENDING', 'Pending Payment'), ('CONFIRMED', 'Confirmed (Inventory Locked)'), ('PACKING', 'Being Packed'), ('SHIPPED', 'Out for Delivery'), ('DELIVERED', 'Delivered'), ('CANCELLED', 'Cancelled'), ('FAILED', 'Payment Failed')], max_length=30)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='api.order')),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-18 01:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_order_status_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliverypartner',
+            name='active_orders',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='deliverypartner',
+            name='capacity',
+            field=models.PositiveSmallIntegerField(default=3),
+        ),
+        migrations.AddField(
+            model_name='deliverypartner',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=7, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='deliverypartner',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=7, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='deliverypartner',
+            name='position_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
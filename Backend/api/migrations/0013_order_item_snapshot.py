@@ -0,0 +1,52 @@
+# Generated by Django 6.0 on 2026-10-18 01:54
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+BACKFILL_CHUNK_SIZE = 2000
+
+
+def backfill_snapshots(apps, schema_editor):
+    OrderItem = apps.get_model('api', 'OrderItem')
+    Product = apps.get_model('api', 'Product')
+    product = Product.objects.filter(pk=OuterRef('product_id'))
+    last = None
+    while True:
+        chunk = OrderItem.objects.order_by('pk')
+        if last is not None:
+            chunk = chunk.filter(pk__gt=last)
+        pks = list(chunk.values_list('pk', flat=True)[:BACKFILL_CHUNK_SIZE])
+        if not pks:
+            return
+        OrderItem.objects.filter(pk__in=pks).update(
+            product_name=Subquery(product.values('name')[:1]),
+            product_category=Subquery(product.values('category')[:1]),
+            vendor_name=Subquery(product.values('vendor__name')[:1]),
+        )
+        last = pks[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_delivery_partner_dispatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_category',
+            field=models.CharField(default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(default='', max_length=150),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='vendor_name',
+            field=models.CharField(default='', max_length=100),
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 6.0 on 2026-10-18 01:59
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_order_item_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'status', 'created_at', 'id'], name='order_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['transaction_id'], name='payment_transaction_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.functions.text.Lower('category'), models.F('name'), models.F('id'), condition=models.Q(('is_available', True)), name='product_avail_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.F('vendor'), django.db.models.functions.text.Lower('category'), name='product_vendor_category_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.CheckConstraint(condition=models.Q(('delivery_fee__gte', 0)), name='order_delivery_fee_non_negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.CheckConstraint(condition=models.Q(('total_amount__gte', 0)), name='order_total_amount_non_negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='orderitem',
+            constraint=models.CheckConstraint(condition=models.Q(('quantity__gt', 0)), name='order_item_quantity_positive'),
+        ),
+    ]
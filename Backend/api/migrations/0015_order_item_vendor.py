@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-18 03:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+BACKFILL_CHUNK_SIZE = 2000
+
+
+def backfill_vendors(apps, schema_editor):
+    OrderItem = apps.get_model('api', 'OrderItem')
+    Product = apps.get_model('api', 'Product')
+    vendor = Product.objects.filter(pk=OuterRef('product_id')).values('vendor_id')[:1]
+    last = None
+    while True:
+        chunk = OrderItem.objects.order_by('pk')
+        if last is not None:
+            chunk = chunk.filter(pk__gt=last)
+        pks = list(chunk.values_list('pk', flat=True)[:BACKFILL_CHUNK_SIZE])
+        if not pks:
+            return
+        OrderItem.objects.filter(pk__in=pks).update(vendor_id=Subquery(vendor))
+        last = pks[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_production_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='vendor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.vendor'),
+        ),
+        migrations.RunPython(backfill_vendors, migrations.RunPython.noop),
+    ]
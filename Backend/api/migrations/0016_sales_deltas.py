@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-18 03:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_order_item_vendor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSalesDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'day'], name='product_sales_delta_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VendorSalesDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('commission', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.vendor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['vendor', 'day'], name='vendor_sales_delta_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 6.0 on 2026-10-18 04:05
+
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    "DROP TRIGGER IF EXISTS api_product_fts_update",
+    "DROP TRIGGER IF EXISTS api_product_fts_delete",
+    "DROP TRIGGER IF EXISTS api_product_fts_insert",
+    "CREATE TABLE api_product_search_key ("
+    "id INTEGER PRIMARY KEY, product_id char(32) NOT NULL UNIQUE)",
+    "DELETE FROM api_product_fts",
+    "INSERT INTO api_product_search_key (product_id) SELECT id FROM api_product",
+    "INSERT INTO api_product_fts (rowid, name, product_id) "
+    "SELECT k.id, p.name, p.id FROM api_product_search_key k JOIN api_product p ON p.id = k.product_id",
+    "CREATE TRIGGER api_product_fts_insert AFTER INSERT ON api_product BEGIN "
+    "INSERT INTO api_product_search_key (product_id) VALUES (new.id); "
+    "INSERT INTO api_product_fts (rowid, name, product_id) "
+    "SELECT id, new.name, new.id FROM api_product_search_key WHERE product_id = new.id; END",
+    "CREATE TRIGGER api_product_fts_delete AFTER DELETE ON api_product BEGIN "
+    "DELETE FROM api_product_fts WHERE rowid = "
+    "(SELECT id FROM api_product_search_key WHERE product_id = old.id); "
+    "DELETE FROM api_product_search_key WHERE product_id = old.id; END",
+    "CREATE TRIGGER api_product_fts_update AFTER UPDATE OF name ON api_product BEGIN "
+    "UPDATE api_product_fts SET name = new.name WHERE rowid = "
+    "(SELECT id FROM api_product_search_key WHERE product_id = old.id); END",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS api_product_fts_update",
+    "DROP TRIGGER IF EXISTS api_product_fts_delete",
+    "DROP TRIGGER IF EXISTS api_product_fts_insert",
+    "DROP TABLE IF EXISTS api_product_search_key",
+    "DELETE FROM api_product_fts",
+    "INSERT INTO api_product_fts (rowid, name, product_id) SELECT rowid, name, id FROM api_product",
+    "CREATE TRIGGER api_product_fts_insert AFTER INSERT ON api_product BEGIN "
+    "INSERT INTO api_product_fts (rowid, name, product_id) VALUES (new.rowid, new.name, new.id); END",
+    "CREATE TRIGGER api_product_fts_delete AFTER DELETE ON api_product BEGIN "
+    "DELETE FROM api_product_fts WHERE rowid = old.rowid; END",
+    "CREATE TRIGGER api_product_fts_update AFTER UPDATE OF name ON api_product BEGIN "
+    "UPDATE api_product_fts SET name = new.name WHERE rowid = old.rowid; END",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            for sql in statements:
+                schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+    """
+    Key the SQLite search table on the product id instead of api_product's
+    rowid, which is not stable for a table with a UUID primary key (a
+    VACUUM or a table rebuild by a later migration renumbers it).
+    """
+
+    dependencies = [
+        ('api', '0016_sales_deltas'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(SQLITE_FORWARD), run(SQLITE_BACKWARD)),
+    ]
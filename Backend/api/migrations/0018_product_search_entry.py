@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-18 03:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_product_search_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchEntry',
+            fields=[
+                ('product', models.OneToOneField(db_column='product_id', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='api.product')),
+                ('name', models.TextField()),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'api_product_fts',
+                'managed': False,
+            },
+        ),
+    ]
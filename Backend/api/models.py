@@ -1,9 +1,12 @@
 import uuid
-from django.db import models
-from django.db.models import CheckConstraint, Q
+from django.db import models, transaction
+from django.db.models import CheckConstraint, F, Q
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 
+from . import geo
+
 class User(AbstractUser):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     phone = models.CharField(max_length=15, unique=True)
@@ -32,6 +35,39 @@ class Commission(models.Model):
     def __str__(self):
         return self.name
 
+class VendorQuerySet(models.QuerySet):
+    """
+    Keeps Vendor.geohash in step on the bulk paths, which skip save():
+    bulk_create(), bulk_update() and update() of latitude or longitude.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for vendor in objs:
+            vendor.geohash = geo.encode(vendor.latitude, vendor.longitude)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if {'latitude', 'longitude'} & set(fields):
+            objs = list(objs)
+            for vendor in objs:
+                vendor.geohash = geo.encode(vendor.latitude, vendor.longitude)
+            fields = {*fields, 'geohash'}
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def update(self, **kwargs):
+        if not {'latitude', 'longitude'} & kwargs.keys():
+            return super().update(**kwargs)
+        # The new values may be expressions, so re-read the moved rows
+        with transaction.atomic(using=self.db):
+            moved = list(self.values_list('pk', flat=True))
+            rows = super().update(**kwargs)
+            vendors = list(self.model._base_manager.using(self.db).filter(pk__in=moved).only('latitude', 'longitude'))
+            for vendor in vendors:
+                vendor.geohash = geo.encode(vendor.latitude, vendor.longitude)
+            self.model._base_manager.using(self.db).bulk_update(vendors, ['geohash'])
+        return rows
+
 class Vendor(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=100)
@@ -40,10 +76,52 @@ class Vendor(models.Model):
     longitude = models.DecimalField(max_digits=10, decimal_places=7)
     commission = models.ForeignKey(Commission, on_delete=models.SET_NULL, null=True, blank=True)
     is_active = models.BooleanField(default=True)
+    # Derived from latitude/longitude by save() and by VendorQuerySet's bulk
+    # writes; raw SQL that moves a vendor must recompute it (geo.encode)
+    geohash = models.CharField(max_length=12, editable=False, default='')
+
+    objects = VendorQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Radius searches scan one geohash range per covering cell
+            models.Index(fields=['geohash'], name='vendor_geohash_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.geohash = geo.encode(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def nearby(cls, latitude, longitude, radius_km):
+        """
+        Return active vendors within `radius_km` of a point, nearest first.
+
+        Candidates come from index range scans over the geohash cells that
+        cover the search circle, then are refined by haversine distance.
+        Each returned vendor carries a `distance_km` attribute.
+        """
+        cells = Q()
+        for prefix in geo.covering_cells(latitude, longitude, radius_km):
+            cells |= Q(geohash__gte=prefix, geohash__lt=prefix + '~')
+        min_lat, max_lat, _, _ = geo.bounding_box(latitude, longitude, radius_km)
+
+        vendors = []
+        candidates = cls.objects.filter(cells, is_active=True, latitude__range=(min_lat, max_lat))
+        for vendor in candidates:
+            distance = geo.haversine_km(latitude, longitude, vendor.latitude, vendor.longitude)
+            if distance <= radius_km:
+                vendor.distance_km = round(distance, 3)
+                vendors.append(vendor)
+        vendors.sort(key=lambda vendor: vendor.distance_km)
+        return vendors
+
 class Product(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE)
@@ -52,13 +130,50 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     is_available = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the catalogue: WHERE is_available ORDER BY name, id
+            models.Index(fields=['is_available', 'name', 'id'], name='product_avail_name_idx'),
+            # Category listing: WHERE is_available AND LOWER(category) = LOWER(?)
+            # ORDER BY name, id, read in order without a sort
+            models.Index(
+                Lower('category'), F('name'), F('id'),
+                condition=Q(is_available=True), name='product_avail_category_idx',
+            ),
+            # Category listing near an address: WHERE vendor IN (...) AND LOWER(category) = ...
+            models.Index(F('vendor'), Lower('category'), name='product_vendor_category_idx'),
+            # Full catalogue export, including unavailable products: ORDER BY name, id
+            models.Index(fields=['name', 'id'], name='product_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+class ProductSearchEntry(models.Model):
+    """
+    A row of the SQLite full-text table that triggers keep in step with
+    Product (see api.search). Read-only, and absent on other databases.
+    """
+    product = models.OneToOneField(
+        Product, on_delete=models.DO_NOTHING, primary_key=True, db_constraint=False,
+        db_column='product_id', related_name='search_entry',
+    )
+    name = models.TextField()
+    # FTS5's hidden bm25 column; lower is a better match
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'api_product_fts'
+
 class Stock(models.Model):
     product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True)
     quantity = models.IntegerField()
     updated_at = models.DateTimeField(auto_now=True)
+    # 0 = plain counter. Otherwise most units live in `stripes` and checkouts
+    # decrement a random stripe instead of locking this row; `quantity` then
+    # only holds units not yet spread across the stripes.
+    stripe_count = models.PositiveSmallIntegerField(default=0)
 
     class Meta:
         constraints = [
@@ -68,11 +183,41 @@ class Stock(models.Model):
     def __str__(self):
         return f"Stock for {self.product.name}"
 
+    @property
+    def total_quantity(self):
+        """Units available to sell, including those held in stripes."""
+        if not self.stripe_count:
+            return self.quantity
+        stripes = getattr(self, 'stripe_list', None)
+        if stripes is None:
+            stripes = self.stripes.all()
+        return self.quantity + sum(stripe.quantity for stripe in stripes)
+
+class StockStripe(models.Model):
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='stripes')
+    index = models.PositiveSmallIntegerField()
+    quantity = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['stock', 'index'], name='stock_stripe_unique_index'),
+            CheckConstraint(condition=Q(quantity__gte=0), name='stock_stripe_quantity_non_negative'),
+        ]
+
+    def __str__(self):
+        return f"Stripe {self.index} of {self.stock}"
+
 class DeliveryPartner(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=100)
     phone = models.CharField(max_length=15)
     is_active = models.BooleanField(default=True)
+    # Last reported position and current load, maintained by api.dispatch
+    latitude = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    position_updated_at = models.DateTimeField(null=True, blank=True)
+    capacity = models.PositiveSmallIntegerField(default=3)
+    active_orders = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.name
@@ -95,8 +240,24 @@ class Order(models.Model):
     status = models.CharField(max_length=30, choices=STATUS_CHOICES, default='PENDING')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     delivery_fee = models.DecimalField(max_digits=10, decimal_places=2)
+    # Vendor commission owed to the platform, fixed when the order is placed
+    commission_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of order history: WHERE user ORDER BY created_at DESC, id DESC
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+            # The same, filtered by status
+            models.Index(fields=['user', 'status', 'created_at', 'id'], name='order_user_status_idx'),
+            # Staff export of every order: ORDER BY created_at DESC, id DESC
+            models.Index(fields=['created_at', 'id'], name='order_created_idx'),
+        ]
+        constraints = [
+            CheckConstraint(condition=Q(delivery_fee__gte=0), name='order_delivery_fee_non_negative'),
+            CheckConstraint(condition=Q(total_amount__gte=0), name='order_total_amount_non_negative'),
+        ]
+
     def __str__(self):
         return f"Order {self.id} by {self.user.username}"
 
@@ -106,9 +267,159 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     price_at_time = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.IntegerField()
+    # Vendor commission percentage charged on this line (api.pricing)
+    commission_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    # The product as sold, fixed at checkout so order history renders from
+    # this row alone and survives later renames
+    product_name = models.CharField(max_length=150, default='')
+    product_category = models.CharField(max_length=50, default='')
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    vendor_name = models.CharField(max_length=100, default='')
+
+    class Meta:
+        constraints = [
+            CheckConstraint(condition=Q(quantity__gt=0), name='order_item_quantity_positive'),
+        ]
 
     def __str__(self):
-        return f"{self.quantity} of {self.product.name} in Order {self.order.id}"
+        return f"{self.quantity} of {self.product_name} in Order {self.order_id}"
+
+    @staticmethod
+    def snapshot(product):
+        """Snapshot fields for a product loaded with its vendor."""
+        return {
+            'product_name': product.name,
+            'product_category': product.category,
+            'vendor_id': product.vendor_id,
+            'vendor_name': product.vendor.name,
+        }
+
+class OrderStatusEvent(models.Model):
+    """One status change of an order, written by api.transitions."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_events')
+    from_status = models.CharField(max_length=30, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField(max_length=30, choices=Order.STATUS_CHOICES)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Order {self.order_id}: {self.from_status} -> {self.to_status}"
+
+class StockHold(models.Model):
+    """
+    Units taken from Stock for a PENDING order. Confirming the order deletes
+    its holds; holds still present after `expires_at` are released back to
+    stock by api.reservations.release_expired().
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='holds')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Sweeper range scan: WHERE expires_at <= now ORDER BY expires_at
+            models.Index(fields=['expires_at'], name='stock_hold_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"Hold of {self.quantity} x {self.product_id} for Order {self.order_id}"
+
+class IdempotencyKey(models.Model):
+    """
+    Result of a POST made with an `Idempotency-Key` header, replayed to
+    retries of the same request (see api.idempotency).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_key_unique_per_user'),
+        ]
+
+    def __str__(self):
+        return f"Idempotency key {self.key} for {self.user_id}"
+
+class VendorDailySales(models.Model):
+    """
+    Sales of one vendor's products on one day (by order date), maintained
+    incrementally by api.rollups from VendorSalesDelta rows. Cancelled and
+    failed orders are taken back out.
+    """
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE)
+    day = models.DateField()
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    commission = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['vendor', 'day'], name='vendor_daily_sales_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.vendor_id} sales on {self.day}"
+
+class ProductDailySales(models.Model):
+    """Sales of one product on one day (by order date), see VendorDailySales."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    day = models.DateField()
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='product_daily_sales_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} sales on {self.day}"
+
+class VendorSalesDelta(models.Model):
+    """
+    A change to one VendorDailySales row, appended by checkout and
+    cancellation and folded into the row later by api.rollups.fold().
+    """
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE)
+    day = models.DateField()
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    commission = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            # Reports add the pending deltas of one vendor and date range
+            models.Index(fields=['vendor', 'day'], name='vendor_sales_delta_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.vendor_id} sales change on {self.day}"
+
+class ProductSalesDelta(models.Model):
+    """A change to one ProductDailySales row, see VendorSalesDelta."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    day = models.DateField()
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'day'], name='product_sales_delta_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} sales change on {self.day}"
 
 class Payment(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -118,5 +429,11 @@ class Payment(models.Model):
     transaction_id = models.CharField(max_length=100)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            # Payment gateway callbacks look payments up by their transaction id
+            models.Index(fields=['transaction_id'], name='payment_transaction_idx'),
+        ]
+
     def __str__(self):
         return f"Payment for Order {self.order.id}"
@@ -0,0 +1,33 @@
+"""
+Keyset (cursor) pagination for the list endpoints.
+
+Pages are fetched with `WHERE key < cursor ORDER BY key LIMIT n` instead of
+OFFSET, so page N costs the same as page 1 and no COUNT(*) is issued. The
+trailing `id` in each ordering makes the sort total; DRF resolves rows that
+share the leading key with a small in-cursor offset.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class StandardCursorPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class OrderCursorPagination(StandardCursorPagination):
+    """Newest orders first, keyed on (created_at, id)."""
+    ordering = ('-created_at', '-id')
+
+
+class ProductCursorPagination(StandardCursorPagination):
+    """
+    Alphabetical catalogue, keyed on (name, id). Search results carry a
+    `search_rank` annotation and are keyed on (search_rank, id) instead.
+    """
+    ordering = ('name', 'id')
+
+    def get_ordering(self, request, queryset, view):
+        if 'search_rank' in queryset.query.annotations:
+            return ('search_rank', 'id')
+        return super().get_ordering(request, queryset, view)
@@ -0,0 +1,100 @@
+"""
+Order pricing.
+
+All amounts are Decimal end to end: line totals are exact (a two-place
+price times an integer quantity), and the vendor commission is summed at
+full precision and rounded once per vendor in an order, half up, to the
+cent. The commission rate comes from the product's vendor
+(`Vendor.commission`), so a basket spanning several vendors is charged
+each vendor's own rate.
+
+The rate is stored on each order item and the commission on the order
+when it is placed, which keeps revenue reports to a single aggregate
+query and unaffected by later rate changes.
+"""
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models import Count, DecimalField, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Order
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+HUNDRED = Decimal('100')
+
+# Orders that never turned into a sale
+UNBILLED_STATUSES = ('CANCELLED', 'FAILED')
+
+
+@dataclass(frozen=True)
+class OrderPrice:
+    subtotal: Decimal
+    delivery_fee: Decimal
+    commission: Decimal
+
+
+def to_cents(amount):
+    return Decimal(amount).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def commission_rate(product):
+    """Commission percentage of the product's vendor, 0 if it has none."""
+    commission = product.vendor.commission
+    return commission.percentage if commission is not None else ZERO
+
+
+def vendor_commissions(lines):
+    """
+    Commission per vendor for one order's `(vendor_id, line_total, rate)`
+    lines, summed at full precision and rounded once per vendor.
+    """
+    totals = {}
+    for vendor_id, amount, rate in lines:
+        totals[vendor_id] = totals.get(vendor_id, ZERO) + amount * rate
+    return {vendor_id: to_cents(total / HUNDRED) for vendor_id, total in totals.items()}
+
+
+def price_order(items, delivery_fee):
+    """
+    Price one order from `items` carrying a loaded `product` (with
+    vendor__commission) and a `quantity`. Each item also gets the
+    `commission_rate` it was charged, to be stored on its OrderItem.
+    """
+    subtotal = ZERO
+    lines = []
+    for item in items:
+        product = item['product']
+        item['commission_rate'] = commission_rate(product)
+        line = product.price * item['quantity']
+        subtotal += line
+        lines.append((product.vendor_id, line, item['commission_rate']))
+    return OrderPrice(
+        subtotal=to_cents(subtotal),
+        delivery_fee=to_cents(delivery_fee),
+        commission=sum(vendor_commissions(lines).values(), ZERO),
+    )
+
+
+def platform_revenue(start, end):
+    """
+    Totals for orders placed in `[start, end)`, excluding cancelled and
+    failed ones, computed by the database in one aggregate query.
+    Platform revenue is the vendor commission plus delivery fees.
+    """
+    money = DecimalField(max_digits=14, decimal_places=2)
+    totals = (
+        Order.objects.filter(created_at__gte=start, created_at__lt=end)
+        .exclude(status__in=UNBILLED_STATUSES)
+        .aggregate(
+            orders=Count('id'),
+            gross=Coalesce(Sum('total_amount'), Value(ZERO), output_field=money),
+            delivery_fees=Coalesce(Sum('delivery_fee'), Value(ZERO), output_field=money),
+            commission=Coalesce(Sum('commission_amount'), Value(ZERO), output_field=money),
+        )
+    )
+    for field in ('gross', 'delivery_fees', 'commission'):
+        totals[field] = to_cents(totals[field])
+    totals['revenue'] = totals['commission'] + totals['delivery_fees']
+    return totals
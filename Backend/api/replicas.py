@@ -0,0 +1,93 @@
+"""
+Read replica routing.
+
+Catalogue and order history views (ReplicaReadsMixin in api.views, and
+their async variants) read from the `replica` database alias while
+REPLICA_READS is on; everything else, including checkout and the stock
+paths, reads and writes the primary. The choice is per request, held in a
+context variable that ReplicaRouter consults.
+
+Replicas lag behind the primary, so a user who just placed an order is
+pinned to the primary for REPLICA_PIN_SECONDS and sees it in their
+history straight away (read-your-writes). The pin lives in the default
+cache, which must be shared between workers for it to hold across them.
+Catalogue pages read from the replica within REPLICA_PIN_SECONDS of a
+catalogue change are served but not cached (see api.caching).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_ALIAS = 'replica'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def enabled():
+    return settings.REPLICA_READS and REPLICA_ALIAS in settings.DATABASES
+
+
+def _pin_key(user):
+    return f'replica-pin:{user.pk}'
+
+
+def pin(user):
+    """Send `user`'s reads to the primary for the next REPLICA_PIN_SECONDS."""
+    if user.is_authenticated:
+        cache.set(_pin_key(user), True, settings.REPLICA_PIN_SECONDS)
+
+
+def pinned(user):
+    return user.is_authenticated and cache.get(_pin_key(user)) is not None
+
+
+async def apinned(user):
+    return user.is_authenticated and await cache.aget(_pin_key(user)) is not None
+
+
+def start_reads(user):
+    """
+    Route this request's reads to the replica unless `user` is pinned.
+    Returns a token for end_reads().
+    """
+    return _use_replica.set(enabled() and not pinned(user))
+
+
+def end_reads(token):
+    _use_replica.reset(token)
+
+
+def in_use():
+    """Return True if reads are currently routed to the replica."""
+    return _use_replica.get()
+
+
+@contextmanager
+def reading(use_replica=True):
+    """Route reads in the block to the replica (when enabled)."""
+    token = _use_replica.set(use_replica and enabled())
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Reads go to the replica inside start_reads()/reading(), every write to
+    the primary. Both aliases hold the same rows, so relations between
+    objects loaded from either are allowed.
+    """
+
+    def db_for_read(self, model, **hints):
+        return REPLICA_ALIAS if _use_replica.get() else None
+
+    def db_for_write(self, model, **hints):
+        # Objects loaded from the replica would otherwise be saved back to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
@@ -0,0 +1,91 @@
+"""
+Stock reservations for orders awaiting payment.
+
+Checkout takes the ordered units out of Stock straight away and records a
+StockHold per product with an expiry time. Stock.quantity therefore
+already is the available-to-sell figure, and reading it needs no join or
+sum over open holds.
+
+A hold ends in one of two ways:
+
+- confirm() moves a PENDING order to CONFIRMED and drops its holds, so
+  the units stay sold.
+- release_expired(), run by `manage.py release_expired_holds`, cancels
+  PENDING orders whose holds have expired, walking the holds in expiry
+  order over their index; the cancellation (api.transitions) returns
+  their units to stock in bulk.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import transitions
+from .models import StockHold
+
+RELEASE_BATCH_SIZE = 500
+
+
+class HoldExpired(Exception):
+    """Raised when confirming an order that is no longer PENDING."""
+
+
+def ttl():
+    return datetime.timedelta(seconds=getattr(settings, 'STOCK_HOLD_TTL', 15 * 60))
+
+
+def hold(orders, now=None):
+    """
+    Record holds for stock just taken by new orders, given as
+    `(order, {product_id: quantity})` pairs, in one INSERT.
+    """
+    expires_at = (now or timezone.now()) + ttl()
+    return StockHold.objects.bulk_create([
+        StockHold(order=order, product_id=product_id, quantity=quantity, expires_at=expires_at)
+        for order, quantities in orders
+        for product_id, quantity in quantities.items()
+    ])
+
+
+def confirm(order):
+    """
+    Mark a PENDING order CONFIRMED and make its reserved stock permanent.
+    Raises HoldExpired if the sweeper already released it.
+    """
+    if not transitions.transition([order.pk], 'CONFIRMED', only_from=['PENDING']):
+        raise HoldExpired(f"Order {order.pk} is no longer pending.")
+    order.status = 'CONFIRMED'
+
+
+def release_expired(now=None, batch_size=RELEASE_BATCH_SIZE):
+    """
+    Cancel PENDING orders whose holds expired before `now` and put their
+    stock back. Works in batches of orders, one transaction each, and
+    returns the number of orders cancelled.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        count, more = _release_batch(now, batch_size)
+        released += count
+        if not more:
+            return released
+
+
+@transaction.atomic
+def _release_batch(now, batch_size):
+    order_ids = list(
+        StockHold.objects.filter(expires_at__lte=now)
+        .order_by('expires_at')
+        .values_list('order_id', flat=True)[:batch_size]
+    )
+    if not order_ids:
+        return 0, False
+    order_ids = set(order_ids)
+
+    # Only orders still PENDING are cancelled and restocked; confirm() may
+    # have won the race for the others, and then the holds are just dropped.
+    cancelled = transitions.transition(order_ids, 'CANCELLED', only_from=['PENDING'])
+    StockHold.objects.filter(order_id__in=order_ids).delete()
+    return len(cancelled), True
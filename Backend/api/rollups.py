@@ -0,0 +1,250 @@
+"""
+Materialized per-vendor and per-product daily sales.
+
+VendorDailySales and ProductDailySales hold one row per vendor/product
+and day (the local date the order was placed), so reports read a handful
+of rows however many orders there are.
+
+Checkouts never touch those rows: a vendor's row for today would be
+locked by every one of its checkouts until they commit, and a product's
+by every checkout of it, which striped stock exists to avoid. Instead the
+transactions that change orders append delta rows (VendorSalesDelta,
+ProductSalesDelta), which is a plain INSERT:
+
+- checkout calls record_items() with the items it just created;
+- cancelling or failing an order calls reverse_orders(), which appends
+  the negated lines of its items.
+
+fold() moves pending deltas into the rollup rows in the background
+(`manage.py fold_rollups --loop N`), locking each row once per batch in
+key order. Reports add whatever is still pending (daily()), so they are
+exact without waiting for a fold. When the worker falls behind and more
+than DAILY_FOLD_THRESHOLD deltas are pending for the report, daily()
+folds them itself first, so a report never sums an unbounded backlog. Commission uses the rate and vendor
+stored on each order item, so reversing an order removes exactly what
+was added, even if the product has since moved to another vendor. The
+rebuild_rollups command (rebuild()) recomputes everything from the
+orders, e.g. for data placed before the tables existed.
+"""
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import pricing
+from .models import (
+    Order, OrderItem, ProductDailySales, ProductSalesDelta, VendorDailySales, VendorSalesDelta,
+)
+
+REBUILD_CHUNK_SIZE = 2000
+FOLD_BATCH_SIZE = 5000
+# Pending deltas of one report above which daily() folds them before reading
+DAILY_FOLD_THRESHOLD = 200
+
+# (rollup model, delta model, key field)
+TABLES = (
+    (VendorDailySales, VendorSalesDelta, 'vendor_id'),
+    (ProductDailySales, ProductSalesDelta, 'product_id'),
+)
+
+
+def item_lines(items):
+    """
+    Sale lines `(order_id, day, vendor_id, product_id, quantity, amount, rate)`
+    for OrderItem instances with their order loaded.
+    """
+    return [
+        (
+            item.order_id, timezone.localdate(item.order.created_at), item.vendor_id,
+            item.product_id, item.quantity, item.price_at_time * item.quantity, item.commission_rate,
+        )
+        for item in items
+    ]
+
+
+def order_lines(order_ids):
+    """Sale lines for every item of `order_ids`, in one query."""
+    rows = OrderItem.objects.filter(order_id__in=order_ids).values_list(
+        'order_id', 'order__created_at', 'vendor_id', 'product_id',
+        'quantity', 'price_at_time', 'commission_rate',
+    )
+    return [
+        (order_id, timezone.localdate(created_at), vendor_id, product_id, quantity, price * quantity, rate)
+        for order_id, created_at, vendor_id, product_id, quantity, price, rate in rows
+    ]
+
+
+def deltas(lines, sign=1, vendors=None, products=None):
+    """
+    Fold sale lines into `{(vendor_id, day): {field: delta}}` and
+    `{(product_id, day): {field: delta}}`, accumulating into the given
+    dicts when passed.
+    """
+    vendors = {} if vendors is None else vendors
+    products = {} if products is None else products
+    by_order = {}
+    for line in lines:
+        by_order.setdefault(line[0], []).append(line)
+
+    for group in by_order.values():
+        day = group[0][1]
+        commissions = pricing.vendor_commissions(
+            (vendor_id, amount, rate) for _, _, vendor_id, _, _, amount, rate in group
+        )
+        seen_products = set()
+        for vendor_id, commission in commissions.items():
+            row = vendors.setdefault((vendor_id, day), _zero(commission=True))
+            row['orders'] += sign
+            row['commission'] += sign * commission
+        for _, _, vendor_id, product_id, quantity, amount, _ in group:
+            row = vendors[(vendor_id, day)]
+            row['units'] += sign * quantity
+            row['revenue'] += sign * amount
+            row = products.setdefault((product_id, day), _zero())
+            if product_id not in seen_products:
+                seen_products.add(product_id)
+                row['orders'] += sign
+            row['units'] += sign * quantity
+            row['revenue'] += sign * amount
+    return vendors, products
+
+
+def _zero(commission=False):
+    row = {'orders': 0, 'units': 0, 'revenue': pricing.ZERO}
+    if commission:
+        row['commission'] = pricing.ZERO
+    return row
+
+
+def _fields(model):
+    return [field for field in ('orders', 'units', 'revenue', 'commission') if hasattr(model, field)]
+
+
+def _apply(model, key_field, changes):
+    """Add `changes` to the rollup rows of `model`, creating missing ones."""
+    if not changes:
+        return
+    keys = sorted(changes)
+    # Created and locked in key order, so concurrent folds cannot deadlock
+    model.objects.bulk_create(
+        [model(**{key_field: key, 'day': day}) for key, day in keys],
+        ignore_conflicts=True,
+    )
+    rows = (
+        model.objects.select_for_update()
+        .filter(**{f'{key_field}__in': {key for key, _ in keys}}, day__in={day for _, day in keys})
+        .order_by(key_field, 'day')
+    )
+    updated = []
+    for row in rows:
+        change = changes.get((getattr(row, key_field), row.day))
+        if change is None:
+            continue
+        for field, delta in change.items():
+            setattr(row, field, getattr(row, field) + delta)
+        updated.append(row)
+    model.objects.bulk_update(updated, list(next(iter(changes.values()))))
+
+
+def append(vendors, products):
+    """Queue `deltas()` output for the next fold()."""
+    for (_, delta_model, key_field), changes in zip(TABLES, (vendors, products)):
+        delta_model.objects.bulk_create([
+            delta_model(**{key_field: key, 'day': day}, **change)
+            for (key, day), change in changes.items()
+        ])
+
+
+def record_items(items):
+    """Add newly created OrderItem instances to the rollups."""
+    append(*deltas(item_lines(items)))
+
+
+def reverse_orders(order_ids):
+    """Take orders that were cancelled or failed back out of the rollups."""
+    append(*deltas(order_lines(order_ids), sign=-1))
+
+
+def fold(batch_size=FOLD_BATCH_SIZE):
+    """
+    Add up to `batch_size` pending deltas per table to the rollup rows and
+    delete them. Returns the number of deltas folded.
+    """
+    return sum(_fold(model, delta_model, key_field, batch_size) for model, delta_model, key_field in TABLES)
+
+
+def _fold(model, delta_model, key_field, batch_size, **filters):
+    """Fold up to `batch_size` pending deltas of one table matching `filters`."""
+    fields = _fields(model)
+    with transaction.atomic():
+        # Concurrent folds skip each other's deltas instead of waiting
+        pending = list(
+            delta_model.objects.select_for_update(skip_locked=True)
+            .filter(**filters)
+            .order_by('pk')
+            .values_list('pk', key_field, 'day', *fields)[:batch_size]
+        )
+        changes = {}
+        for _, key, day, *values in pending:
+            change = changes.setdefault((key, day), dict.fromkeys(fields, 0))
+            for field, value in zip(fields, values):
+                change[field] += value
+        _apply(model, key_field, changes)
+        delta_model.objects.filter(pk__in=[row[0] for row in pending]).delete()
+    return len(pending)
+
+
+def daily(model, key, start, end):
+    """
+    `model` rollup rows of one vendor or product from `start` to `end`,
+    with the deltas not yet folded added in, ordered by day. Rows are
+    unsaved instances for days that have only pending deltas. More than
+    DAILY_FOLD_THRESHOLD pending deltas are folded first.
+    """
+    key_field, delta_model = next((field, delta) for rollup, delta, field in TABLES if rollup is model)
+    filters = {key_field: key, 'day__range': (start, end)}
+    if delta_model.objects.filter(**filters)[:DAILY_FOLD_THRESHOLD + 1].count() > DAILY_FOLD_THRESHOLD:
+        _fold(model, delta_model, key_field, FOLD_BATCH_SIZE, **filters)
+    rows = {row.day: row for row in model.objects.filter(**filters)}
+    fields = _fields(model)
+    pending = (
+        delta_model.objects.filter(**filters)
+        .values('day')
+        .annotate(**{f'pending_{field}': Sum(field) for field in fields})
+        .order_by()
+    )
+    for totals in pending:
+        row = rows.get(totals['day'])
+        if row is None:
+            row = rows[totals['day']] = model(**{key_field: key, 'day': totals['day']})
+        for field in fields:
+            setattr(row, field, getattr(row, field) + totals[f'pending_{field}'])
+    return [rows[day] for day in sorted(rows)]
+
+
+@transaction.atomic
+def rebuild(chunk_size=REBUILD_CHUNK_SIZE):
+    """Recompute both rollup tables from every billed order."""
+    for model, delta_model, _ in TABLES:
+        model.objects.all().delete()
+        delta_model.objects.all().delete()
+
+    vendors, products = {}, {}
+    billed = Order.objects.exclude(status__in=pricing.UNBILLED_STATUSES).order_by('pk')
+    last_pk = None
+    while True:
+        chunk = billed if last_pk is None else billed.filter(pk__gt=last_pk)
+        order_ids = list(chunk.values_list('pk', flat=True)[:chunk_size])
+        if not order_ids:
+            break
+        deltas(order_lines(order_ids), vendors=vendors, products=products)
+        last_pk = order_ids[-1]
+
+    VendorDailySales.objects.bulk_create(
+        [VendorDailySales(vendor_id=vendor_id, day=day, **row) for (vendor_id, day), row in vendors.items()],
+        batch_size=chunk_size,
+    )
+    ProductDailySales.objects.bulk_create(
+        [ProductDailySales(product_id=product_id, day=day, **row) for (product_id, day), row in products.items()],
+        batch_size=chunk_size,
+    )
+    return len(vendors), len(products)
@@ -0,0 +1,139 @@
+"""
+Full-text product search.
+
+On SQLite product names are mirrored into the `api_product_fts` FTS5 table
+(mapped read-only as ProductSearchEntry), which triggers on `api_product`
+keep in sync, so bulk_create and queryset.update() are covered too. FTS5
+rows need integer rowids, so each product gets one in
+`api_product_search_key`. A migration that rebuilds api_product (as SQLite
+does for most AlterField operations) drops the triggers; they are restored
+after every migrate, see ensure_index().
+
+On PostgreSQL a GIN index over `to_tsvector('simple', name)` is used. Both
+match every search term as a prefix, for type-ahead, and rank results by
+relevance.
+
+Other database backends fall back to `name__icontains`.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import F, FloatField, Lookup
+from django.db.models.expressions import RawSQL
+
+from .models import ProductSearchEntry
+
+FTS_TABLE = 'api_product_fts'
+KEY_TABLE = 'api_product_search_key'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+POSTGRES_VECTOR = "to_tsvector('simple', name)"
+
+# Same definitions as migration 0017_product_search_keys
+KEY_ROWID = f"(SELECT id FROM {KEY_TABLE} WHERE product_id = old.id)"
+TRIGGERS = {
+    'api_product_fts_insert': (
+        "AFTER INSERT ON api_product BEGIN "
+        f"INSERT INTO {KEY_TABLE} (product_id) VALUES (new.id); "
+        f"INSERT INTO {FTS_TABLE} (rowid, name, product_id) "
+        f"SELECT id, new.name, new.id FROM {KEY_TABLE} WHERE product_id = new.id; END"
+    ),
+    'api_product_fts_delete': (
+        "AFTER DELETE ON api_product BEGIN "
+        f"DELETE FROM {FTS_TABLE} WHERE rowid = {KEY_ROWID}; "
+        f"DELETE FROM {KEY_TABLE} WHERE product_id = old.id; END"
+    ),
+    'api_product_fts_update': (
+        "AFTER UPDATE OF name ON api_product BEGIN "
+        f"UPDATE {FTS_TABLE} SET name = new.name WHERE rowid = {KEY_ROWID}; END"
+    ),
+}
+
+
+def is_supported(using=DEFAULT_DB_ALIAS):
+    """Return True if the database has a full-text backend."""
+    return connections[using].vendor in ('sqlite', 'postgresql')
+
+
+def tokenize(text):
+    """Split user input into lowercase search terms, dropping operators."""
+    return TOKEN_RE.findall(text.lower())
+
+
+class Match(Lookup):
+    """`search_entry__name__match=query`: an FTS5 MATCH on the name column."""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+ProductSearchEntry._meta.get_field('name').register_lookup(Match)
+
+
+def filter_products(queryset, text):
+    """
+    Restrict a Product queryset to names matching every term of `text` as
+    a prefix, annotated with `search_rank` (lower is a better match). The
+    match is part of the same statement (a join to the search table on
+    SQLite), so other filters, ordering and pagination see every match.
+    """
+    terms = tokenize(text)
+    if not terms:
+        return queryset.none()
+
+    if connections[queryset.db].vendor == 'sqlite':
+        query = ' '.join(f'"{term}"*' for term in terms)
+        return queryset.filter(search_entry__name__match=query).annotate(search_rank=F('search_entry__rank'))
+
+    query = ' & '.join(f'{term}:*' for term in terms)
+    matches = RawSQL(f"SELECT id FROM api_product WHERE {POSTGRES_VECTOR} @@ to_tsquery('simple', %s)", [query])
+    rank = RawSQL(
+        "-ts_rank(to_tsvector('simple', api_product.name), to_tsquery('simple', %s))",
+        [query], output_field=FloatField(),
+    )
+    return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+
+def missing_triggers(using=DEFAULT_DB_ALIAS):
+    """Return the names of the SQLite search triggers that do not exist."""
+    if connections[using].vendor != 'sqlite':
+        return []
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'api_product'")
+        existing = {row[0] for row in cursor.fetchall()}
+    return [name for name in TRIGGERS if name not in existing]
+
+
+def ensure_index(using=DEFAULT_DB_ALIAS):
+    """
+    Recreate any missing search triggers. Writes made while they were
+    missing never reached the search table, so it is rebuilt as well.
+    Returns the names of the recreated triggers.
+    """
+    db = connections[using]
+    if db.vendor != 'sqlite' or KEY_TABLE not in db.introspection.table_names():
+        return []
+    missing = missing_triggers(using)
+    if missing:
+        with db.cursor() as cursor:
+            for name in missing:
+                cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {TRIGGERS[name]}")
+        rebuild_index(using)
+    return missing
+
+
+def rebuild_index(using=DEFAULT_DB_ALIAS):
+    """Repopulate the SQLite search table and its keys from api_product."""
+    if connections[using].vendor != 'sqlite':
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(f"DELETE FROM {KEY_TABLE}")
+        cursor.execute(f"INSERT INTO {KEY_TABLE} (product_id) SELECT id FROM api_product")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, product_id) "
+            f"SELECT k.id, p.name, p.id FROM {KEY_TABLE} k JOIN api_product p ON p.id = k.product_id"
+        )
@@ -1,8 +1,22 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from rest_framework import serializers
-from .models import User, Vendor, Product, Stock, Address, DeliveryPartner, Order, OrderItem, Payment
+from . import dispatch, metrics, pricing, reservations, rollups
+from .inventory import (
+    InsufficientStock, decrement_stock, item_errors, load_products, lock_stock, requested_quantities,
+    stripes_prefetch,
+)
+from .models import (
+    User, Vendor, Product, Stock, Address, DeliveryPartner, Order, OrderItem, Payment,
+    VendorDailySales, ProductDailySales,
+)
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(metrics.TimedRepresentation, serializers.ModelSerializer):
     """
     Serializer for User model.
     Handles user creation with password hashing.
@@ -17,7 +31,7 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-class AddressSerializer(serializers.ModelSerializer):
+class AddressSerializer(metrics.TimedRepresentation, serializers.ModelSerializer):
     """
     Serializer for Address model.
     """
@@ -27,7 +41,7 @@ class AddressSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user']
 
 
-class VendorSerializer(serializers.ModelSerializer):
+class VendorSerializer(metrics.TimedRepresentation, serializers.ModelSerializer):
     """
     Serializer for Vendor model (read-only).
     """
@@ -36,29 +50,105 @@ class VendorSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'city', 'latitude', 'longitude', 'is_active']
 
 
-class StockSerializer(serializers.ModelSerializer):
+class NearbyVendorSerializer(VendorSerializer):
+    """
+    Serializer for vendors returned by a radius search.
+    Adds the distance from the search point in kilometres.
+    """
+    distance_km = serializers.FloatField(read_only=True)
+
+    class Meta(VendorSerializer.Meta):
+        fields = VendorSerializer.Meta.fields + ['distance_km']
+
+
+class NearbyQuerySerializer(serializers.Serializer):
+    """
+    Validates the location query parameters of the nearby searches.
+    Either `address` (one of the user's addresses) or both `lat` and `lng`
+    must be given; `radius` is in kilometres.
+    """
+    lat = serializers.FloatField(min_value=-90, max_value=90, required=False)
+    lng = serializers.FloatField(min_value=-180, max_value=180, required=False)
+    address = serializers.UUIDField(required=False)
+    radius = serializers.FloatField(min_value=0.1, max_value=50, default=5)
+
+    def validate(self, attrs):
+        if 'address' in attrs:
+            user = self.context['request'].user
+            address = None
+            if user.is_authenticated:
+                address = (
+                    Address.objects.filter(id=attrs['address'], user=user)
+                    .only('latitude', 'longitude')
+                    .first()
+                )
+            if address is None:
+                raise serializers.ValidationError({
+                    'address': ["Address not found or does not belong to user."]
+                })
+            attrs['lat'], attrs['lng'] = address.latitude, address.longitude
+        elif 'lat' not in attrs or 'lng' not in attrs:
+            raise serializers.ValidationError("Provide either an address or both lat and lng.")
+        return attrs
+
+
+class StockSerializer(metrics.TimedRepresentation, serializers.ModelSerializer):
     """
     Serializer for Stock model (read-only).
+    `quantity` is the total available, summed across stripes for hot products.
     """
+    quantity = serializers.IntegerField(source='total_quantity', read_only=True)
+
     class Meta:
         model = Stock
         fields = ['quantity', 'updated_at']
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(metrics.TimedRepresentation, serializers.ModelSerializer):
     """
     Serializer for Product model (read-only).
     Includes nested vendor and stock information.
+
+    Optional `fields` and `expand` arguments trim the output: `fields`
+    keeps only the listed top-level fields, and when `expand` is given any
+    nested block not listed in it collapses to a scalar (`vendor` to its
+    id, `stock` to its quantity).
     """
     vendor = VendorSerializer(read_only=True)
     stock = StockSerializer(read_only=True)
+
+    collapsed_fields = {
+        'vendor': lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+        'stock': lambda: serializers.IntegerField(source='stock.total_quantity', read_only=True, default=None),
+    }
     
     class Meta:
         model = Product
         fields = ['id', 'name', 'category', 'price', 'stock', 'is_available', 'vendor']
 
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        if expand is not None:
+            for name, collapsed in self.collapsed_fields.items():
+                if name in self.fields and name not in expand:
+                    self.fields[name] = collapsed()
+
+    @classmethod
+    def related_for(cls, fields=None, expand=None):
+        """Return the select_related() names needed to render the given shape."""
+        related = []
+        if fields is None or 'vendor' in fields:
+            if expand is None or 'vendor' in expand:
+                related.append('vendor')
+        if fields is None or 'stock' in fields:
+            related.append('stock')
+        return related
 
-class DeliveryPartnerSerializer(serializers.ModelSerializer):
+
+class DeliveryPartnerSerializer(metrics.TimedRepresentation, serializers.ModelSerializer):
     """
     Serializer for DeliveryPartner model (read-only).
     """
@@ -67,7 +157,7 @@ class DeliveryPartnerSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'phone', 'is_active']
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(metrics.TimedRepresentation, serializers.ModelSerializer):
     """
     Serializer for OrderItem model (read-only).
     Includes nested product information.
@@ -79,10 +169,25 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'quantity', 'price_at_time']
 
 
+class OrderItemHistorySerializer(metrics.TimedRepresentation, serializers.ModelSerializer):
+    """
+    Serializer for OrderItem rendered from its checkout snapshot alone,
+    without loading the live product, vendor or stock.
+    """
+    product_id = serializers.UUIDField(read_only=True)
+    name = serializers.CharField(source='product_name', read_only=True)
+    category = serializers.CharField(source='product_category', read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'product_id', 'name', 'category', 'vendor_name', 'quantity', 'price_at_time']
+        read_only_fields = fields
+
+
 class OrderItemWriteSerializer(serializers.ModelSerializer):
     """
     Serializer for creating OrderItem (write-only).
-    Validates product existence and stock availability.
+    Product and stock checks run in bulk in OrderCreateSerializer.validate_items.
     """
     product_id = serializers.UUIDField()
     
@@ -95,41 +200,6 @@ class OrderItemWriteSerializer(serializers.ModelSerializer):
         if value < 1:
             raise serializers.ValidationError("Quantity must be at least 1.")
         return value
-    
-    def validate(self, attrs):
-        """Validate product exists and has sufficient stock."""
-        product_id = attrs.get('product_id')
-        quantity = attrs.get('quantity')
-        
-        # Check if product exists
-        try:
-            product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
-            raise serializers.ValidationError({
-                'product_id': f"Product with id {product_id} does not exist."
-            })
-        
-        # Check if product is available
-        if not product.is_available:
-            raise serializers.ValidationError({
-                'product_id': f"Product '{product.name}' is not available."
-            })
-        
-        # Check stock
-        try:
-            stock = Stock.objects.get(product=product)
-        except Stock.DoesNotExist:
-            raise serializers.ValidationError({
-                'product_id': f"No stock information for product '{product.name}'."
-            })
-        
-        if stock.quantity < quantity:
-            raise serializers.ValidationError({
-                'product_id': f"Not enough stock for '{product.name}'. Requested: {quantity}, Available: {stock.quantity}"
-            })
-        
-        attrs['product'] = product
-        return attrs
 
 
 class OrderCreateSerializer(serializers.ModelSerializer):
@@ -145,16 +215,28 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         fields = ['address', 'items', 'delivery_fee']
     
     def validate_items(self, value):
-        """Validate that at least one item is provided."""
+        """
+        Validate that at least one item is provided, then check every
+        product's existence, availability and stock in a single query.
+        """
         if not value or len(value) == 0:
             raise serializers.ValidationError("Order must contain at least one item.")
+
+        products = load_products(item['product_id'] for item in value)
+        errors = item_errors(value, products)
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        for item in value:
+            item['product'] = products[item['product_id']]
         return value
     
     def validate_address(self, value):
         """Validate that address exists and belongs to the user."""
         user = self.context['request'].user
         
-        if not Address.objects.filter(id=value, user=user).exists():
+        # The address row is already loaded by the related field
+        if value.user_id != user.pk:
             raise serializers.ValidationError(
                 "Address not found or does not belong to user."
             )
@@ -164,47 +246,51 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         """Create order with atomic transaction for stock management."""
         items_data = validated_data.pop('items')
         user = self.context['request'].user
-        address = validated_data.get('address')
+        address = validated_data.pop('address')
+        
+        price = pricing.price_order(items_data, validated_data['delivery_fee'])
         
         # Use atomic transaction
-        from django.db import transaction
         with transaction.atomic():
             # Create the order
             order = Order.objects.create(
                 user=user,
                 address=address,
+                vendor_id=dispatch.pickup_vendor(item['product'] for item in items_data),
                 status='PENDING',
-                total_amount=0,
+                total_amount=price.subtotal,
+                commission_amount=price.commission,
                 **validated_data
             )
             
-            total_amount = 0
-            order_items = []
-            
-            for item_data in items_data:
-                product = item_data['product']
-                quantity = item_data['quantity']
-                price_at_time = product.price
-                
-                # Create order item
-                order_item = OrderItem.objects.create(
+            order_items = OrderItem.objects.bulk_create([
+                OrderItem(
                     order=order,
-                    product=product,
-                    price_at_time=price_at_time,
-                    quantity=quantity
+                    product=item_data['product'],
+                    price_at_time=item_data['product'].price,
+                    quantity=item_data['quantity'],
+                    commission_rate=item_data['commission_rate'],
+                    **OrderItem.snapshot(item_data['product']),
                 )
-                order_items.append(order_item)
-                
-                total_amount += float(price_at_time) * quantity
-                
-                # Decrease stock
-                stock = Stock.objects.select_for_update().get(product=product)
-                stock.quantity -= quantity
-                stock.save()
+                for item_data in items_data
+            ])
             
-            # Update order total
-            order.total_amount = total_amount
-            order.save()
+            # Lock and decrease stock for the whole basket at once, held
+            # for the order until it is paid or the hold expires
+            products = {item['product_id']: item['product'] for item in items_data}
+            quantities = requested_quantities(items_data)
+            try:
+                decrement_stock(
+                    quantities,
+                    stocks={pk: product.stock for pk, product in products.items()},
+                )
+            except InsufficientStock as e:
+                errors = item_errors(items_data, products, available=e.available)
+                raise serializers.ValidationError(
+                    {'items': errors or ["Stock changed while placing the order."]}
+                )
+            reservations.hold([(order, quantities)])
+            rollups.record_items(order_items)
             
             # Store items for response serialization
             order._order_items = order_items
@@ -212,12 +298,137 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         return order
 
 
-class OrderListSerializer(serializers.ModelSerializer):
+class OrderEntrySerializer(serializers.Serializer):
+    """
+    One order of a bulk request. Only the shape is checked here; products,
+    addresses and stock are checked for the whole batch at once.
+    """
+    address = serializers.UUIDField()
+    items = OrderItemWriteSerializer(many=True)
+    delivery_fee = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+
+    def validate_items(self, value):
+        if not value:
+            raise serializers.ValidationError("Order must contain at least one item.")
+        return value
+
+
+class BulkOrderCreateSerializer(serializers.Serializer):
+    """
+    Serializer for placing many orders in one request.
+
+    Every order gets the same checks as OrderCreateSerializer, but the
+    products and addresses of the whole batch are loaded in one query each
+    and their stock rows locked once, in primary-key order. Orders are then
+    accepted in request order against the remaining stock, and all accepted
+    orders, items and holds are written with bulk_create. An order that
+    fails is reported in the results without affecting the others.
+    """
+    MAX_ORDERS = 500
+
+    orders = serializers.ListField(
+        child=serializers.DictField(), min_length=1, max_length=MAX_ORDERS, write_only=True
+    )
+
+    def create(self, validated_data):
+        user = self.context['request'].user
+        entries = validated_data['orders']
+        results = [None] * len(entries)
+
+        valid = {}
+        for index, entry in enumerate(entries):
+            serializer = OrderEntrySerializer(data=entry)
+            if serializer.is_valid():
+                valid[index] = serializer.validated_data
+            else:
+                results[index] = self.failure(index, serializer.errors)
+
+        products = load_products(item['product_id'] for entry in valid.values() for item in entry['items'])
+        addresses = set(
+            Address.objects.filter(user=user, pk__in={entry['address'] for entry in valid.values()})
+            .values_list('pk', flat=True)
+        )
+
+        with transaction.atomic():
+            available = lock_stock(products)
+            accepted = []
+            for index, entry in valid.items():
+                errors = {}
+                if entry['address'] not in addresses:
+                    errors['address'] = ["Address not found or does not belong to user."]
+                line_errors = item_errors(entry['items'], products, available=available)
+                if line_errors:
+                    errors['items'] = line_errors
+                if errors:
+                    results[index] = self.failure(index, errors)
+                    continue
+
+                quantities = requested_quantities(entry['items'])
+                for product_id, quantity in quantities.items():
+                    available[product_id] -= quantity
+                for item in entry['items']:
+                    item['product'] = products[item['product_id']]
+                price = pricing.price_order(entry['items'], entry['delivery_fee'])
+                order = Order(
+                    user=user,
+                    address_id=entry['address'],
+                    vendor_id=dispatch.pickup_vendor(item['product'] for item in entry['items']),
+                    status='PENDING',
+                    delivery_fee=price.delivery_fee,
+                    total_amount=price.subtotal,
+                    commission_amount=price.commission,
+                )
+                accepted.append((index, order, entry['items'], quantities))
+
+            if accepted:
+                Order.objects.bulk_create([order for _, order, _, _ in accepted])
+                order_items = OrderItem.objects.bulk_create([
+                    OrderItem(
+                        order=order,
+                        product=item['product'],
+                        price_at_time=item['product'].price,
+                        quantity=item['quantity'],
+                        commission_rate=item['commission_rate'],
+                        **OrderItem.snapshot(item['product']),
+                    )
+                    for _, order, items, _ in accepted
+                    for item in items
+                ])
+                totals = {}
+                for _, _, _, quantities in accepted:
+                    for product_id, quantity in quantities.items():
+                        totals[product_id] = totals.get(product_id, 0) + quantity
+                # lock_stock() holds the rows on PostgreSQL and in SQLite's
+                # IMMEDIATE transactions; in deferred ones (the plain
+                # profile) a concurrent checkout can still commit in between
+                try:
+                    decrement_stock(totals)
+                except InsufficientStock:
+                    raise serializers.ValidationError(
+                        {'orders': ["Stock changed while placing the orders; none were placed."]}
+                    )
+                reservations.hold([(order, quantities) for _, order, _, quantities in accepted])
+                rollups.record_items(order_items)
+
+        for index, order, _, _ in accepted:
+            results[index] = {
+                'index': index,
+                'status': 'created',
+                'order': {'id': order.id, 'status': order.status, 'total_amount': order.total_amount},
+            }
+        return results
+
+    @staticmethod
+    def failure(index, errors):
+        return {'index': index, 'status': 'failed', 'errors': errors}
+
+
+class OrderListSerializer(metrics.TimedRepresentation, serializers.ModelSerializer):
     """
     Serializer for listing orders (minimal information).
     """
     items_count = serializers.SerializerMethodField()
-    vendor_name = serializers.CharField(source='vendor.name', read_only=True, default=None)
+    vendor_name = serializers.SerializerMethodField()
     
     class Meta:
         model = Order
@@ -227,18 +438,42 @@ class OrderListSerializer(serializers.ModelSerializer):
             'created_at', 'items_count'
         ]
         read_only_fields = fields
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Annotate item counts and vendor names onto the list query itself.
+        The count is a correlated subquery rather than a GROUP BY, so rows
+        are read in index order and only the ones returned are counted.
+        """
+        items_count = (
+            OrderItem.objects.filter(order=OuterRef('pk')).order_by()
+            .values('order').annotate(count=Count('pk')).values('count')
+        )
+        return queryset.annotate(
+            items_count=Coalesce(Subquery(items_count), 0),
+            vendor_name=F('vendor__name'),
+        )
     
     def get_items_count(self, obj):
-        """Get the number of items in the order."""
+        """Get the number of items in the order, preferring the queryset annotation."""
+        if hasattr(obj, 'items_count'):
+            return obj.items_count
         return obj.items.count()
 
+    def get_vendor_name(self, obj):
+        """Get the vendor name, preferring the queryset annotation."""
+        if hasattr(obj, 'vendor_name'):
+            return obj.vendor_name
+        return obj.vendor.name if obj.vendor_id else None
 
-class OrderDetailSerializer(serializers.ModelSerializer):
+
+class OrderDetailSerializer(metrics.TimedRepresentation, serializers.ModelSerializer):
     """
     Serializer for order details (full information).
     Includes nested items, vendor, address, and delivery partner.
     """
-    items = OrderItemSerializer(many=True, read_only=True)
+    items = serializers.SerializerMethodField()
     vendor = VendorSerializer(read_only=True)
     address = AddressSerializer(read_only=True)
     delivery_partner = DeliveryPartnerSerializer(read_only=True)
@@ -252,14 +487,113 @@ class OrderDetailSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = fields
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Load the whole order -> item -> product -> vendor/stock tree in
+        three queries (the last for stock stripes), whatever the number
+        of items.
+        """
+        return queryset.select_related('vendor', 'address', 'delivery_partner').prefetch_related(
+            Prefetch(
+                'items',
+                queryset=OrderItem.objects.select_related('product__vendor', 'product__stock')
+                .prefetch_related(stripes_prefetch('product__')),
+            )
+        )
 
-class PaymentSerializer(serializers.ModelSerializer):
+    def get_items(self, obj):
+        """Serialize the order's items, reusing the ones built in memory at checkout."""
+        items = getattr(obj, '_order_items', None)
+        if items is None:
+            items = obj.items.all()
+        return OrderItemSerializer(items, many=True, context=self.context).data
+
+
+class OrderHistorySerializer(metrics.TimedRepresentation, serializers.ModelSerializer):
+    """
+    Serializer for order details in history mode: related objects as ids
+    and items from their checkout snapshot, so reading an order touches
+    only the order and order item tables.
+    """
+    items = OrderItemHistorySerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'user', 'vendor', 'address', 'delivery_partner',
+            'status', 'total_amount', 'delivery_fee',
+            'created_at', 'items'
+        ]
+        read_only_fields = fields
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Load the order and its items in two queries, without joins."""
+        return queryset.prefetch_related('items')
+
+
+class PaymentSerializer(metrics.TimedRepresentation, serializers.ModelSerializer):
     """
     Serializer for Payment model.
     """
-    order = OrderSerializer(read_only=True)
+    order = OrderListSerializer(read_only=True)
     
     class Meta:
         model = Payment
         fields = ['id', 'order', 'method', 'status', 'transaction_id', 'amount']
 
+
+class DayRangeSerializer(serializers.Serializer):
+    """
+    Validate the `start`/`end` query parameters of the sales reports.
+    Both are inclusive; the default is the 30 days up to today.
+    """
+    MAX_DAYS = 366
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        end = attrs.get('end') or timezone.localdate()
+        start = attrs.get('start') or end - datetime.timedelta(days=29)
+        if start > end:
+            raise serializers.ValidationError("start must not be after end.")
+        if (end - start).days >= self.MAX_DAYS:
+            raise serializers.ValidationError(f"The range may span at most {self.MAX_DAYS} days.")
+        return {'start': start, 'end': end}
+
+
+class VendorDailySalesSerializer(metrics.TimedRepresentation, serializers.ModelSerializer):
+    class Meta:
+        model = VendorDailySales
+        fields = ['day', 'orders', 'units', 'revenue', 'commission']
+
+
+class ProductDailySalesSerializer(metrics.TimedRepresentation, serializers.ModelSerializer):
+    class Meta:
+        model = ProductDailySales
+        fields = ['day', 'orders', 'units', 'revenue']
+
+
+class OrderTransitionSerializer(serializers.Serializer):
+    """Validate a bulk status change request."""
+    MAX_ORDERS = 5000
+
+    order_ids = serializers.ListField(
+        child=serializers.UUIDField(), min_length=1, max_length=MAX_ORDERS
+    )
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+
+class PartnerPositionSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    lat = serializers.DecimalField(max_digits=10, decimal_places=7, min_value=-90, max_value=90)
+    lng = serializers.DecimalField(max_digits=10, decimal_places=7, min_value=-180, max_value=180)
+
+
+class PartnerPositionsSerializer(serializers.Serializer):
+    """Validate a batch of delivery partner position reports."""
+    MAX_POSITIONS = 5000
+
+    positions = PartnerPositionSerializer(many=True, max_length=MAX_POSITIONS)
@@ -0,0 +1,44 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import authentication, caching, search
+from .models import Product, Stock, User, Vendor
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Vendor)
+@receiver([post_save, post_delete], sender=Stock)
+def invalidate_catalogue(sender, **kwargs):
+    """Catalogue rows changed; drop every cached catalogue response."""
+    caching.bump_generation_on_commit()
+
+
+def forget_tokens(keys):
+    """
+    Evict now, and again on commit in case a concurrent request re-cached
+    the old row before this transaction became visible.
+    """
+    authentication.forget(keys)
+    transaction.on_commit(lambda: authentication.forget(keys))
+
+
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance, **kwargs):
+    """A revoked token must stop authenticating."""
+    forget_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, created, **kwargs):
+    """Cached tokens carry a copy of the user; drop them when it changes (e.g. deactivation)."""
+    if not created:
+        forget_tokens(list(Token.objects.filter(user=instance).values_list('key', flat=True)))
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    """Table rebuilds during migrate drop the search triggers; put them back."""
+    if sender.name == 'api':
+        search.ensure_index(using)
@@ -1,3 +1,1639 @@
-from django.test import TestCase
+import copy
+import importlib
+import json
+import random
+import re
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections, models
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from . import (
+    async_views, authentication, caching, dispatch, geo, idempotency, inventory, metrics, pricing,
+    replicas, reservations, rollups, search, transitions,
+)
+from .models import (
+    User, Commission, Vendor, Product, Stock, StockHold, Address, Order, OrderItem, IdempotencyKey,
+    VendorDailySales, ProductDailySales, VendorSalesDelta, ProductSalesDelta, OrderStatusEvent,
+    DeliveryPartner, Payment,
+)
+from .benchmarking import compare, plan_problems, query_plan, rolled_back, seed_fixtures
+from .management.commands.sync_replica import copy_database
+from .serializers import OrderCreateSerializer, ProductSerializer
+
+
+class CatalogueFixtureMixin:
+    """
+    Small helpers for seeding users, vendors and stocked products, and for
+    placing orders through the API. Test classes share these rather than
+    defining their own checkout helpers.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        authentication.local.clear()
+
+    def make_user(self, username='shopper', phone='+10000000000'):
+        user = User.objects.create_user(username=username, phone=phone, password='pass12345')
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        # Warm the token cache so query counts do not depend on request order
+        authentication.remember(token.key, user)
+        return user, client
+
+    def make_vendor(self, name='Fresh Farms', latitude='34.0522000', longitude='-118.2437000', **kwargs):
+        return Vendor.objects.create(
+            name=name, city='Green Valley',
+            latitude=Decimal(latitude), longitude=Decimal(longitude), **kwargs
+        )
+
+    def make_products(self, vendor, count, quantity=100, price='2.50', category='Fruits'):
+        products = Product.objects.bulk_create([
+            Product(vendor=vendor, name=f'Product {i:05d}', category=category, price=Decimal(price))
+            for i in range(count)
+        ])
+        Stock.objects.bulk_create([Stock(product=product, quantity=quantity) for product in products])
+        # bulk_create sends no signals
+        caching.bump_generation()
+        return products
+
+    def make_address(self, user):
+        return Address.objects.create(
+            user=user, latitude=Decimal('34.0500000'), longitude=Decimal('-118.2400000'),
+            address_line='1 Main St', city='Green Valley', pincode='90001',
+        )
+
+    def basket(self, products, quantity=1):
+        """Order line items for `quantity` of each of `products`."""
+        return [{'product_id': str(p.id), 'quantity': quantity} for p in products]
+
+    def place_order(self, items=None, quantity=1, key=None, delivery_fee='5.00', client=None, address=None):
+        """
+        POST an order to self.address from self.client. `items` defaults to
+        `quantity` of each of self.products; `key` is sent as the
+        Idempotency-Key.
+        """
+        headers = {} if key is None else {'Idempotency-Key': key}
+        return (client or self.client).post('/api/v1/orders/', {
+            'address': str((address or self.address).id),
+            'items': self.basket(self.products, quantity) if items is None else items,
+            'delivery_fee': delivery_fee,
+        }, format='json', headers=headers)
+
+    def placed_order(self, **kwargs):
+        """place_order() that must succeed; returns the Order."""
+        response = self.place_order(**kwargs)
+        self.assertEqual(response.status_code, 201, response.data)
+        return Order.objects.get(pk=response.data['id'])
+
+
+class OrderCreateTests(CatalogueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.client = self.make_user()
+        self.vendor = self.make_vendor()
+        self.address = self.make_address(self.user)
+
+    def test_creates_items_and_decrements_stock(self):
+        products = self.make_products(self.vendor, 3, quantity=10)
+        response = self.place_order(self.basket(products, quantity=4))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(OrderItem.objects.filter(order_id=response.data['id']).count(), 3)
+        self.assertEqual(Decimal(response.data['total_amount']), Decimal('30.00'))
+        self.assertEqual(
+            sorted(Stock.objects.values_list('quantity', flat=True)), [6, 6, 6]
+        )
+
+    def test_query_count_is_flat_in_basket_size(self):
+        products = self.make_products(self.vendor, 41)
+
+        # Only the write path is measured; the response body is serialized separately.
+        def count_queries(items):
+            serializer = OrderCreateSerializer(
+                data={'address': str(self.address.id), 'items': items, 'delivery_fee': '5.00'},
+                context={'request': SimpleNamespace(user=self.user)},
+            )
+            with CaptureQueriesContext(connection) as queries:
+                self.assertTrue(serializer.is_valid(), serializer.errors)
+                serializer.save()
+            return len(queries)
+
+        small = count_queries(self.basket(products[:1]))
+        large = count_queries(self.basket(products[1:]))
+        self.assertEqual(small, large)
+
+    def test_checkout_response_reuses_items_built_in_memory(self):
+        products = self.make_products(self.vendor, 41, quantity=10)
+
+        with CaptureQueriesContext(connection) as small:
+            self.place_order(self.basket(products[:1]))
+        with CaptureQueriesContext(connection) as large:
+            response = self.place_order(self.basket(products[1:], quantity=3))
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(response.data['items']), 40)
+        item = response.data['items'][0]
+        self.assertEqual(item['product']['stock']['quantity'], 7)
+        self.assertEqual(item['product']['vendor']['name'], 'Fresh Farms')
+
+    def test_order_detail_query_count_is_flat_in_item_count(self):
+        products = self.make_products(self.vendor, 31)
+        small = self.place_order(self.basket(products[:1])).data['id']
+        large = self.place_order(self.basket(products[1:])).data['id']
+
+        def count_queries(order_id):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(f'/api/v1/orders/{order_id}/')
+            self.assertEqual(response.status_code, 200)
+            return len(queries), response.data
+
+        small_count, _ = count_queries(small)
+        large_count, data = count_queries(large)
+        self.assertEqual(small_count, large_count)
+        self.assertEqual(len(data['items']), 30)
+        self.assertEqual(data['address']['city'], 'Green Valley')
+
+    def test_reports_per_item_shortfall(self):
+        products = self.make_products(self.vendor, 2, quantity=3)
+        response = self.place_order([
+            {'product_id': str(products[0].id), 'quantity': 1},
+            {'product_id': str(products[1].id), 'quantity': 5},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'validation_error')
+        items = response.data['details']['items']
+        self.assertEqual(items[0], {})
+        self.assertIn('Requested: 5, Available: 3', str(items[1]['product_id'][0]))
+        self.assertFalse(Order.objects.exists())
+
+    def test_duplicate_lines_are_checked_against_combined_quantity(self):
+        product = self.make_products(self.vendor, 1, quantity=5)[0]
+        response = self.place_order([
+            {'product_id': str(product.id), 'quantity': 3},
+            {'product_id': str(product.id), 'quantity': 3},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Stock.objects.get(pk=product.pk).quantity, 5)
+
+    def test_unknown_and_unavailable_products(self):
+        product = self.make_products(self.vendor, 1)[0]
+        Product.objects.filter(pk=product.pk).update(is_available=False)
+        response = self.place_order([
+            {'product_id': str(product.id), 'quantity': 1},
+            {'product_id': '00000000-0000-0000-0000-000000000000', 'quantity': 1},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        items = response.data['details']['items']
+        self.assertIn('is not available', str(items[0]['product_id'][0]))
+        self.assertIn('does not exist', str(items[1]['product_id'][0]))
+
+
+class ProductListTests(CatalogueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.vendor = self.make_vendor()
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_catalogue(self):
+        self.make_products(self.vendor, 10)
+        small = self.count_queries('/api/v1/products/')
+
+        self.make_products(self.make_vendor('Happy Bakers'), 9990)
+        large = self.count_queries('/api/v1/products/')
+        self.assertEqual(small, large)
+
+    def test_fields_and_expand_trim_the_payload(self):
+        product = self.make_products(self.vendor, 1, quantity=7)[0]
+
+        response = self.client.get('/api/v1/products/?fields=id,name,stock,vendor&expand=stock')
+        item = response.data['results'][0]
+        self.assertEqual(set(item), {'id', 'name', 'stock', 'vendor'})
+        self.assertEqual(item['vendor'], self.vendor.pk)
+        self.assertEqual(item['stock']['quantity'], 7)
+
+        response = self.client.get('/api/v1/products/?expand=')
+        item = response.data['results'][0]
+        self.assertEqual(item['stock'], 7)
+        self.assertEqual(str(item['id']), str(product.id))
+
+    def test_pages_follow_name_order_without_count(self):
+        self.make_products(self.vendor, 25)
+
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get('/api/v1/products/?page_size=10&expand=')
+        self.assertNotIn('count', first.data)
+        self.assertFalse(any('COUNT(' in q['sql'].upper() for q in queries))
+
+        second = self.client.get(first.data['next'])
+        names = [p['name'] for p in first.data['results'] + second.data['results']]
+        self.assertEqual(names, [f'Product {i:05d}' for i in range(20)])
+
+
+class OrderListTests(CatalogueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.client = self.make_user()
+        self.vendor = self.make_vendor()
+
+    def make_orders(self, count, user=None, **kwargs):
+        return Order.objects.bulk_create([
+            Order(user=user or self.user, vendor=self.vendor, delivery_fee=Decimal('5.00'), **kwargs)
+            for _ in range(count)
+        ])
+
+    def test_pages_are_newest_first_and_only_own_orders(self):
+        self.make_orders(25)
+        other, _ = self.make_user('other', '+10000000001')
+        self.make_orders(3, user=other)
+
+        first = self.client.get('/api/v1/orders/')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(len(first.data['results']), 20)
+        second = self.client.get(first.data['next'])
+        self.assertEqual(len(second.data['results']), 5)
+        self.assertIsNone(second.data['next'])
+
+        expected = list(
+            Order.objects.filter(user=self.user)
+            .order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        seen = [o['id'] for o in first.data['results'] + second.data['results']]
+        self.assertEqual([str(i) for i in seen], [str(i) for i in expected])
+
+    def test_items_count_and_vendor_name_do_not_add_queries(self):
+        product = self.make_products(self.vendor, 1)[0]
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/v1/orders/?page_size=100')
+            return len(queries), response.data['results']
+
+        def add_orders(count):
+            orders = self.make_orders(count)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, price_at_time=product.price, quantity=1)
+                for order in orders for _ in range(2)
+            ])
+
+        add_orders(2)
+        small, _ = count_queries()
+        add_orders(48)
+        large, results = count_queries()
+
+        self.assertEqual(small, large)
+        self.assertEqual({o['items_count'] for o in results}, {2})
+        self.assertEqual({o['vendor_name'] for o in results}, {'Fresh Farms'})
+
+
+class NearbyVendorTests(CatalogueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.client = self.make_user()
+        self.address = self.make_address(self.user)  # 34.05, -118.24
+        self.near = self.make_vendor('Near', '34.0600000', '-118.2500000')
+        self.closer = self.make_vendor('Closer', '34.0510000', '-118.2410000')
+        self.far = self.make_vendor('Far', '34.4000000', '-118.2400000')
+        self.closed = self.make_vendor('Closed', '34.0500000', '-118.2400000', is_active=False)
+
+    def test_geohash_encoding(self):
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(self.near.geohash, geo.encode(self.near.latitude, self.near.longitude))
+
+    def test_bulk_writes_keep_the_geohash(self):
+        def names():
+            return [vendor.name for vendor in Vendor.nearby(34.05, -118.24, 1)]
+
+        Vendor.objects.bulk_create([
+            Vendor(name='Bulk', city='LA', latitude=Decimal('34.0520000'), longitude=Decimal('-118.2420000'))
+        ])
+        self.assertIn('Bulk', names())
+
+        Vendor.objects.filter(name='Bulk').update(latitude=models.F('latitude') + 1)
+        self.assertNotIn('Bulk', names())
+
+        self.far.latitude = Decimal('34.0500000')
+        Vendor.objects.bulk_update([self.far], ['latitude'])
+        self.assertIn('Far', names())
+        for vendor in Vendor.objects.all():
+            self.assertEqual(vendor.geohash, geo.encode(vendor.latitude, vendor.longitude))
+
+    def test_covering_cells_contain_points_in_radius(self):
+        cells = geo.covering_cells(34.05, -118.24, 5)
+        self.assertLessEqual(len(cells), geo.MAX_CELLS)
+        for latitude, longitude in [(34.05, -118.24), (34.094, -118.24), (34.05, -118.294)]:
+            self.assertTrue(any(geo.encode(latitude, longitude).startswith(cell) for cell in cells))
+
+    def test_nearby_vendors_by_point_nearest_first(self):
+        response = self.client.get('/api/v1/vendors/nearby/?lat=34.05&lng=-118.24&radius=5')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([v['name'] for v in response.data], ['Closer', 'Near'])
+        self.assertLess(response.data[0]['distance_km'], response.data[1]['distance_km'])
+
+    def test_nearby_vendors_by_address(self):
+        response = self.client.get(f'/api/v1/vendors/nearby/?address={self.address.id}&radius=50')
+        self.assertEqual([v['name'] for v in response.data], ['Closer', 'Near', 'Far'])
+
+        other, other_client = self.make_user('other', '+10000000001')
+        response = other_client.get(f'/api/v1/vendors/nearby/?address={self.address.id}')
+        self.assertEqual(response.status_code, 400)
+
+    def test_requires_a_location(self):
+        response = self.client.get('/api/v1/vendors/nearby/?lat=34.05')
+        self.assertEqual(response.status_code, 400)
+
+    def test_location_errors_use_the_validation_error_body(self):
+        other, other_client = self.make_user('other', '+10000000001')
+        cases = [
+            (other_client, f'/api/v1/products/?address={self.address.id}', 'address'),
+            (APIClient(), f'/api/v1/products/?address={self.address.id}', 'address'),
+            (self.client, '/api/v1/products/?address=not-a-uuid', 'address'),
+            (self.client, f'/api/v1/products/?address={self.address.id}&radius=500', 'radius'),
+            (self.client, '/api/v1/vendors/nearby/?lat=34.05&lng=-118.24&radius=0', 'radius'),
+            (other_client, f'/api/v1/vendors/nearby/?address={self.address.id}', 'address'),
+            (self.client, '/api/v1/vendors/nearby/?lat=34.05', 'non_field_errors'),
+        ]
+        for client, path, field in cases:
+            response = client.get(path)
+            self.assertEqual(response.status_code, 400, path)
+            self.assertEqual(response.data['error'], 'validation_error', path)
+            self.assertEqual(response.data['message'], 'Invalid input data', path)
+            self.assertEqual(list(response.data['details']), [field], path)
+
+    def test_product_list_address_filter(self):
+        self.make_products(self.near, 1)
+        self.make_products(self.far, 1)
+
+        response = self.client.get(f'/api/v1/products/?address={self.address.id}&expand=vendor')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['vendor']['name'] for p in response.data['results']], ['Near'])
+
+
+class ProductSearchTests(CatalogueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.vendor = self.make_vendor()
+        names = ['Apple Juice', 'Green Apples', 'Pineapple', 'Apple', 'Banana Bread']
+        self.products = {
+            p.name: p for p in Product.objects.bulk_create([
+                Product(vendor=self.vendor, name=name, category='Grocery', price=Decimal('1.00'))
+                for name in names
+            ])
+        }
+
+    def search(self, text):
+        response = self.client.get('/api/v1/products/', {'search': text, 'expand': ''})
+        self.assertEqual(response.status_code, 200)
+        return [p['name'] for p in response.data['results']]
+
+    def test_prefix_match_on_every_term(self):
+        self.assertEqual(set(self.search('app')), {'Apple Juice', 'Green Apples', 'Apple'})
+        self.assertEqual(self.search('gre app'), ['Green Apples'])
+        self.assertEqual(self.search('"*'), [])
+
+    def test_results_are_ranked_by_relevance(self):
+        self.assertEqual(self.search('apple')[0], 'Apple')
+
+    def test_index_follows_renames_deletes_and_availability(self):
+        Product.objects.filter(pk=self.products['Pineapple'].pk).update(name='Apple Pie')
+        self.products['Apple'].delete()
+        Product.objects.filter(pk=self.products['Apple Juice'].pk).update(is_available=False)
+
+        self.assertEqual(set(self.search('apple')), {'Green Apples', 'Apple Pie'})
+
+    def test_search_results_paginate_by_rank(self):
+        Product.objects.bulk_create([
+            Product(vendor=self.vendor, name=f'Apple Variety {i}', category='Grocery', price=Decimal('1.00'))
+            for i in range(30)
+        ])
+        first = self.client.get('/api/v1/products/', {'search': 'apple', 'page_size': 20})
+        second = self.client.get(first.data['next'])
+
+        ids = [p['id'] for p in first.data['results'] + second.data['results']]
+        self.assertEqual(len(ids), 33)
+        self.assertEqual(len(set(ids)), 33)
+
+    def test_filters_apply_to_every_match(self):
+        Product.objects.bulk_create([
+            Product(vendor=self.vendor, name=f'Milk Carton {i}', category='Bakery', price=Decimal('1.00'))
+            for i in range(250)
+        ] + [
+            Product(vendor=self.vendor, name=f'Dairy Milk {i}', category='Dairy', price=Decimal('1.00'))
+            for i in range(5)
+        ])
+        response = self.client.get('/api/v1/products/', {'search': 'milk', 'category': 'dairy'})
+        self.assertEqual(len(response.data['results']), 5)
+
+        ids, url = [], '/api/v1/products/?search=milk&page_size=100'
+        while url:
+            response = self.client.get(url)
+            ids += [p['id'] for p in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(len(set(ids)), 255)
+
+
+class SearchIndexTests(CatalogueFixtureMixin, TransactionTestCase):
+    """Schema changes run outside a test transaction, as they do under migrate."""
+
+    def alter_name(self, max_length):
+        old = Product._meta.get_field('name')
+        new = models.CharField(max_length=max_length)
+        new.set_attributes_from_name('name')
+        with connection.schema_editor() as editor:
+            editor.alter_field(Product, old, new)
+        return old, new
+
+    def test_triggers_are_restored_after_a_table_rebuild(self):
+        self.assertEqual(search.missing_triggers(), [])
+        basil, thyme = self.make_products(self.make_vendor(), 2)
+
+        old, new = self.alter_name(200)
+        self.addCleanup(self.restore_name, old, new)
+        self.assertEqual(len(search.missing_triggers()), 3)
+        Product.objects.filter(pk=basil.pk).update(name='Sweet Basil')
+
+        self.assertEqual(len(search.ensure_index()), 3)
+        self.assertEqual(search.missing_triggers(), [])
+        self.assertEqual(self.matches('basil'), [basil.pk])
+        thyme.delete()
+        self.assertEqual(self.matches('product'), [])
+
+    def matches(self, text):
+        return list(search.filter_products(Product.objects.all(), text).values_list('id', flat=True))
+
+    def restore_name(self, old, new):
+        with connection.schema_editor() as editor:
+            editor.alter_field(Product, new, old)
+        search.ensure_index()
+
+
+class CatalogueCacheTests(CatalogueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.vendor = self.make_vendor()
+        self.product = self.make_products(self.vendor, 1, quantity=10)[0]
+
+    def test_repeat_requests_are_served_from_cache(self):
+        first = self.client.get('/api/v1/products/?category=fruits')
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get('/api/v1/products/?category=fruits')
+
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get('/api/v1/products/')['ETag']
+        response = self.client.get('/api/v1/products/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        other = self.client.get('/api/v1/products/?search=product', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(other.status_code, 200)
+
+    def test_writes_invalidate_cached_pages(self):
+        etag = self.client.get('/api/v1/products/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Renamed'
+            self.product.save()
+
+        response = self.client.get('/api/v1/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['name'], 'Renamed')
+
+    def test_only_availability_changes_invalidate_cached_pages(self):
+        user, client = self.make_user()
+        address = self.make_address(user)
+        etag = self.client.get('/api/v1/products/')['ETag']
+
+        def stock_shown():
+            response = self.client.get('/api/v1/products/', HTTP_IF_NONE_MATCH=etag)
+            return response.status_code, response.data and response.data['results'][0]['stock']['quantity']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.place_order(self.basket([self.product], 4), client=client, address=address)
+        self.assertEqual(stock_shown(), (304, None))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order = self.placed_order(items=self.basket([self.product], 6), client=client, address=address)
+        self.assertEqual(stock_shown(), (200, 0))
+
+        etag = self.client.get('/api/v1/products/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            transitions.transition([order.pk], 'CANCELLED')
+        self.assertEqual(stock_shown(), (200, 6))
+
+
+class AsyncViewTests(CatalogueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.client = self.make_user()
+        self.token = Token.objects.get(user=self.user).key
+        self.vendor = self.make_vendor()
+        self.products = self.make_products(self.vendor, 3)
+        self.factory = AsyncRequestFactory()
+
+    def get(self, path, **extra):
+        return self.factory.get(path, headers={'Authorization': f'Token {self.token}'}, **extra)
+
+    async def test_product_list_matches_sync_view(self):
+        response = await async_views.product_list(self.factory.get('/api/v1/products/'))
+        sync = await sync_to_async(self.client.get)('/api/v1/products/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), json.loads(sync.content))
+        cached = await async_views.product_list(
+            self.factory.get('/api/v1/products/', headers={'If-None-Match': response['ETag']})
+        )
+        self.assertEqual(cached.status_code, 304)
+
+    async def test_order_list_and_detail(self):
+        order = await Order.objects.acreate(user=self.user, vendor=self.vendor, delivery_fee=Decimal('5.00'))
+        await OrderItem.objects.acreate(order=order, product=self.products[0], price_at_time=Decimal('2.50'), quantity=2)
+
+        listing = json.loads((await async_views.order_list(self.get('/api/v1/orders/'))).content)
+        self.assertEqual([o['items_count'] for o in listing['results']], [1])
+
+        detail = await async_views.order_detail(self.get(f'/api/v1/orders/{order.pk}/'), pk=order.pk)
+        data = json.loads(detail.content)
+        self.assertEqual(data['items'][0]['product']['vendor']['name'], 'Fresh Farms')
+
+    async def test_order_detail_history_view(self):
+        order = await Order.objects.acreate(user=self.user, vendor=self.vendor, delivery_fee=Decimal('5.00'))
+        await OrderItem.objects.acreate(
+            order=order, product=self.products[0], price_at_time=Decimal('2.50'), quantity=2,
+            product_name='Product 00000', product_category='Fruits', vendor_name='Fresh Farms',
+        )
+
+        response = await async_views.order_detail(
+            self.get(f'/api/v1/orders/{order.pk}/', QUERY_STRING='view=history'), pk=order.pk
+        )
+        data = json.loads(response.content)
+        self.assertEqual(data['vendor'], str(self.vendor.pk))
+        item = data['items'][0]
+        self.assertEqual((item['product_id'], item['name']), (str(self.products[0].pk), 'Product 00000'))
+        self.assertNotIn('product', item)
+
+    async def test_authentication_errors(self):
+        anonymous = await async_views.order_list(self.factory.get('/api/v1/orders/'))
+        self.assertEqual(anonymous.status_code, 401)
+        bad = await async_views.order_list(
+            self.factory.get('/api/v1/orders/', headers={'Authorization': 'Token nope'})
+        )
+        self.assertEqual(json.loads(bad.content), {'detail': 'Invalid token.'})
+
+    async def test_health_check(self):
+        response = await async_views.health_check(self.factory.get('/api/v1/health/'))
+        self.assertEqual(json.loads(response.content)['status'], 'healthy')
+
+    async def assertSameResponse(self, handler, path, headers=None, async_first=False, **kwargs):
+        """Request `path` from the sync stack and from `handler` and compare the responses."""
+        def sync_get():
+            return APIClient().get(path, headers=headers)
+
+        if async_first:
+            response = await handler(self.factory.get(path, headers=headers), **kwargs)
+            sync = await sync_to_async(sync_get)()
+        else:
+            sync = await sync_to_async(sync_get)()
+            response = await handler(self.factory.get(path, headers=headers), **kwargs)
+        self.assertEqual(response.status_code, sync.status_code, path)
+        self.assertEqual(response.content, sync.content, path)
+        for header in ('Content-Type', 'ETag', 'WWW-Authenticate', 'Allow', 'Vary'):
+            self.assertEqual(response.get(header), sync.get(header), f'{path} {header}')
+        return response
+
+    async def test_product_list_parity(self):
+        auth = {'Authorization': f'Token {self.token}'}
+        await self.assertSameResponse(async_views.product_list, '/api/v1/products/', async_first=True)
+        page = await self.assertSameResponse(async_views.product_list, '/api/v1/products/?page_size=1')
+        await self.assertSameResponse(
+            async_views.product_list, '/api/v1/products/?page_size=1', headers={'If-None-Match': page['ETag']}
+        )
+        await self.assertSameResponse(async_views.product_list, '/api/v1/products/', headers=auth)
+        await self.assertSameResponse(
+            async_views.product_list, '/api/v1/products/', headers={'Authorization': f'token {self.token}'}
+        )
+        await self.assertSameResponse(
+            async_views.product_list, '/api/v1/products/', headers={'Authorization': 'Token nope'}
+        )
+        await self.assertSameResponse(async_views.product_list, '/api/v1/products/?page_size=0')
+
+    async def test_order_parity(self):
+        auth = {'Authorization': f'Token {self.token}'}
+        order = await Order.objects.acreate(user=self.user, vendor=self.vendor, delivery_fee=Decimal('5.00'))
+        await OrderItem.objects.acreate(
+            order=order, product=self.products[0], price_at_time=Decimal('2.50'), quantity=2,
+            product_name='Product 00000', product_category='Fruits', vendor_name='Fresh Farms',
+        )
+
+        await self.assertSameResponse(async_views.order_list, '/api/v1/orders/', headers=auth)
+        await self.assertSameResponse(async_views.order_list, '/api/v1/orders/')
+        await self.assertSameResponse(async_views.order_list, '/api/v1/orders/', headers={'Authorization': 'Token'})
+        await self.assertSameResponse(async_views.order_list, '/api/v1/orders/', headers={'Authorization': 'Token nope'})
+        for query in ('', '?view=history'):
+            await self.assertSameResponse(
+                async_views.order_detail, f'/api/v1/orders/{order.pk}/{query}', headers=auth, pk=order.pk
+            )
+        missing = uuid.uuid4()
+        response = await self.assertSameResponse(
+            async_views.order_detail, f'/api/v1/orders/{missing}/', headers=auth, pk=missing
+        )
+        self.assertEqual(response.status_code, 404)
+        await self.assertSameResponse(async_views.order_detail, f'/api/v1/orders/{order.pk}/', pk=order.pk)
+
+
+class ExportTests(CatalogueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.client = self.make_user()
+        self.vendor = self.make_vendor()
+
+    def read_lines(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_order_export_streams_own_orders(self):
+        other, _ = self.make_user('other', '+10000000001')
+        for user in (self.user, self.user, other):
+            Order.objects.create(user=user, vendor=self.vendor, delivery_fee=Decimal('5.00'))
+
+        rows = self.read_lines(self.client.get('/api/v1/orders/export/'))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual({row['vendor_name'] for row in rows}, {'Fresh Farms'})
+
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(len(self.read_lines(self.client.get('/api/v1/orders/export/'))), 3)
+
+    def test_product_export_is_staff_only(self):
+        self.make_products(self.vendor, 5)
+        self.assertEqual(self.client.get('/api/v1/products/export/').status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        with CaptureQueriesContext(connection) as queries:
+            rows = self.read_lines(self.client.get('/api/v1/products/export/'))
+        self.assertEqual([row['name'] for row in rows], [f'Product {i:05d}' for i in range(5)])
+        self.assertEqual(rows[0]['vendor']['name'], 'Fresh Farms')
+        self.assertLessEqual(len(queries), 3)
+
+
+class StripedStockTests(CatalogueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.client = self.make_user()
+        self.address = self.make_address(self.user)
+        self.products = self.make_products(self.make_vendor(), 1, quantity=40)
+        self.product = self.products[0]
+        inventory.set_stripe_count(self.product.pk, 4)
+
+    def stock(self):
+        return Stock.objects.get(pk=self.product.pk)
+
+    def test_stripes_hold_the_whole_quantity(self):
+        stock = self.stock()
+        self.assertEqual(stock.quantity, 0)
+        self.assertEqual(sorted(stock.stripes.values_list('quantity', flat=True)), [10, 10, 10, 10])
+        self.assertEqual(stock.total_quantity, 40)
+
+        inventory.set_stripe_count(self.product.pk, 0)
+        stock = self.stock()
+        self.assertEqual((stock.stripe_count, stock.quantity, stock.stripes.count()), (0, 40, 0))
+
+    def test_checkout_decrements_a_single_stripe(self):
+        response = self.place_order(quantity=3)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted(self.stock().stripes.values_list('quantity', flat=True)), [7, 10, 10, 10])
+        self.assertEqual(response.data['items'][0]['product']['stock']['quantity'], 37)
+
+    def test_large_order_rebalances_across_stripes(self):
+        response = self.place_order(quantity=25)
+
+        self.assertEqual(response.status_code, 201)
+        stock = self.stock()
+        self.assertEqual(stock.total_quantity, 15)
+        self.assertEqual(sorted(stock.stripes.values_list('quantity', flat=True)), [3, 4, 4, 4])
+
+    def test_shortfall_reports_pooled_total(self):
+        self.place_order(quantity=25)
+        response = self.place_order(quantity=20)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stock().total_quantity, 15)
+        self.assertIn('Available: 15', str(response.data))
+
+    def test_only_selling_out_invalidates_the_catalogue(self):
+        generation = caching.get_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.place_order(quantity=30)
+        self.assertEqual(caching.get_generation(), generation)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.place_order(quantity=10)
+        self.assertNotEqual(caching.get_generation(), generation)
+
+    def test_catalogue_shows_total_across_stripes(self):
+        self.place_order(quantity=3)
+        response = self.client.get('/api/v1/products/')
+        self.assertEqual(response.data['results'][0]['stock']['quantity'], 37)
+
+        response = self.client.get('/api/v1/products/', {'expand': 'vendor'})
+        self.assertEqual(response.data['results'][0]['stock'], 37)
+
+
+class ReservationTests(CatalogueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.client = self.make_user()
+        self.address = self.make_address(self.user)
+        self.products = self.make_products(self.make_vendor(), 2, quantity=10)
+
+    def quantities(self):
+        return sorted(Stock.objects.values_list('quantity', flat=True))
+
+    def test_checkout_holds_stock_until_expiry(self):
+        order = self.placed_order(quantity=3)
+
+        holds = list(order.holds.all())
+        self.assertEqual(len(holds), 2)
+        self.assertTrue(all(h.expires_at > timezone.now() for h in holds))
+        self.assertEqual(self.quantities(), [7, 7])
+        self.assertEqual(reservations.release_expired(), 0)
+
+    def test_expired_holds_are_released_in_bulk(self):
+        orders = [self.placed_order(quantity=2) for _ in range(3)]
+        later = timezone.now() + reservations.ttl() + timedelta(seconds=1)
+
+        self.assertEqual(reservations.release_expired(now=later, batch_size=2), 3)
+        self.assertEqual(self.quantities(), [10, 10])
+        self.assertEqual(
+            set(Order.objects.filter(pk__in=[o.pk for o in orders]).values_list('status', flat=True)),
+            {'CANCELLED'},
+        )
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_confirmed_orders_keep_their_stock(self):
+        order = self.placed_order(quantity=3)
+        reservations.confirm(order)
+        later = timezone.now() + reservations.ttl() + timedelta(seconds=1)
+
+        self.assertEqual(reservations.release_expired(now=later), 0)
+        self.assertEqual(self.quantities(), [7, 7])
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'CONFIRMED')
+
+    def test_confirming_a_released_order_fails(self):
+        order = self.placed_order(quantity=3)
+        reservations.release_expired(now=timezone.now() + reservations.ttl() + timedelta(seconds=1))
+
+        with self.assertRaises(reservations.HoldExpired):
+            reservations.confirm(order)
+
+
+class IdempotencyTests(CatalogueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        idempotency.replays.clear()
+        self.user, self.client = self.make_user()
+        self.address = self.make_address(self.user)
+        self.products = self.make_products(self.make_vendor(), 2, quantity=10)
+
+    def test_retry_replays_without_touching_stock(self):
+        first = self.place_order(quantity=2, key='retry-1')
+        self.assertEqual(first.status_code, 201)
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.place_order(quantity=2, key='retry-1')
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json(), first.json())
+        self.assertFalse(any('api_stock' in q['sql'] or 'api_product' in q['sql'] for q in queries))
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(sorted(Stock.objects.values_list('quantity', flat=True)), [8, 8])
+
+    def test_replay_from_database_when_not_cached(self):
+        first = self.place_order(quantity=2, key='retry-2')
+        idempotency.replays.clear()
+
+        second = self.place_order(quantity=2, key='retry-2')
+        self.assertEqual(second.json()['id'], first.json()['id'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_reused_key_with_different_body_is_rejected(self):
+        self.place_order(quantity=2, key='retry-3')
+        response = self.place_order(quantity=1, key='retry-3')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.data['error'], 'idempotency_key_reused')
+
+    def test_failed_attempt_can_be_retried_with_same_key(self):
+        response = self.place_order(quantity=11, key='retry-4')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        Stock.objects.update(quantity=20)
+        self.assertEqual(self.place_order(quantity=11, key='retry-4').status_code, 201)
+
+    def test_keys_are_scoped_per_user(self):
+        self.place_order(quantity=2, key='shared')
+        _, other = self.make_user('other', '+10000000001')
+        self.client = other
+        self.address = self.make_address(User.objects.get(username='other'))
+
+        self.assertNotIn('Idempotent-Replayed', self.place_order(quantity=2, key='shared'))
+        self.assertEqual(Order.objects.count(), 2)
+
+
+class BulkOrderCreateTests(CatalogueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.client = self.make_user()
+        self.address = self.make_address(self.user)
+        self.products = self.make_products(self.make_vendor(), 3, quantity=10)
+
+    def entry(self, quantity=2, products=None, address=None):
+        return {
+            'address': str(address or self.address.id),
+            'items': [{'product_id': str(p.id), 'quantity': quantity} for p in products or self.products],
+            'delivery_fee': '5.00',
+        }
+
+    def place(self, entries):
+        return self.client.post('/api/v1/orders/bulk/', {'orders': entries}, format='json')
+
+    def test_places_every_order(self):
+        response = self.place([self.entry() for _ in range(4)])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (4, 0))
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(OrderItem.objects.count(), 12)
+        self.assertEqual(StockHold.objects.count(), 12)
+        self.assertEqual(set(Stock.objects.values_list('quantity', flat=True)), {2})
+        self.assertEqual(Decimal(response.data['results'][0]['order']['total_amount']), Decimal('15.00'))
+
+    def test_stock_sold_after_the_check_fails_the_whole_batch(self):
+        def lock_then_sell_out(product_ids):
+            available = inventory.lock_stock(product_ids)
+            # A checkout committed between the check and the decrement
+            Stock.objects.filter(pk=self.products[0].pk).update(quantity=1)
+            return available
+
+        with mock.patch('api.serializers.lock_stock', lock_then_sell_out):
+            response = self.place([self.entry(), self.entry()])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('orders', response.data['details'])
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_orders_are_accepted_in_request_order_against_remaining_stock(self):
+        _, other = self.make_user('other', '+10000000001')
+        foreign = self.make_address(User.objects.get(username='other'))
+        response = self.place([
+            self.entry(quantity=6),
+            self.entry(quantity=6),
+            self.entry(quantity=4, products=self.products[:1]),
+            self.entry(address=foreign.id),
+            {'items': []},
+        ])
+
+        self.assertEqual(response.status_code, 207)
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ['created', 'failed', 'created', 'failed', 'failed'])
+        self.assertIn('Available: 4', str(response.data['results'][1]['errors']['items']))
+        self.assertIn('address', response.data['results'][3]['errors'])
+        self.assertEqual(sorted(Stock.objects.values_list('quantity', flat=True)), [0, 4, 4])
+
+    def test_query_count_is_flat_in_order_count(self):
+        def count_queries(orders):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.place([self.entry(quantity=1) for _ in range(orders)]).status_code, 201)
+            return len(queries)
+
+        self.assertEqual(count_queries(1), count_queries(8))
+
+    def test_rejects_bad_envelope(self):
+        self.assertEqual(self.place([]).status_code, 400)
+        self.assertEqual(self.client.post('/api/v1/orders/bulk/', {}, format='json').status_code, 400)
+
+
+class PricingTests(CatalogueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.client = self.make_user()
+        self.address = self.make_address(self.user)
+        ten = Commission.objects.create(name='Standard', percentage=Decimal('10.00'))
+        odd = Commission.objects.create(name='Promo', percentage=Decimal('7.25'))
+        self.products = (
+            self.make_products(self.make_vendor('Ten', commission=ten), 1, price='0.10')
+            + self.make_products(self.make_vendor('Odd', commission=odd), 1, price='3.33')
+            + self.make_products(self.make_vendor('None'), 1, price='1.99')
+        )
+
+    def test_totals_are_exact_and_commission_uses_each_vendors_rate(self):
+        order = self.placed_order(quantity=3, delivery_fee='4.50')
+
+        # 0.30 + 9.99 + 5.97; commission 0.03 + 0.7242750 rounded once
+        self.assertEqual(order.total_amount, Decimal('16.26'))
+        self.assertEqual(order.commission_amount, Decimal('0.75'))
+
+        price = pricing.price_order(
+            [{'product': p, 'quantity': 3} for p in inventory.load_products(p.pk for p in self.products).values()],
+            Decimal('4.5'),
+        )
+        self.assertEqual((price.subtotal, price.delivery_fee), (Decimal('16.26'), Decimal('4.50')))
+
+    def test_platform_revenue_is_one_aggregate_query(self):
+        orders = [self.placed_order(quantity=3, delivery_fee='4.50') for _ in range(3)]
+        Order.objects.filter(pk=orders[0].pk).update(status='CANCELLED')
+        start = timezone.now() - timedelta(days=1)
+
+        with self.assertNumQueries(1):
+            totals = pricing.platform_revenue(start, timezone.now() + timedelta(days=1))
+        self.assertEqual(totals['orders'], 2)
+        self.assertEqual(totals['gross'], Decimal('32.52'))
+        self.assertEqual(totals['commission'], Decimal('1.50'))
+        self.assertEqual(totals['revenue'], Decimal('10.50'))
+
+
+class TokenCacheTests(CatalogueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.client = self.make_user()
+        authentication.local.clear()
+
+    def auth_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/orders/')
+        return response, sum('authtoken_token' in q['sql'] for q in queries)
+
+    def test_repeat_requests_skip_the_token_query(self):
+        self.assertEqual(self.auth_queries()[1], 1)
+        response, token_queries = self.auth_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(token_queries, 0)
+
+    def test_deleted_token_stops_authenticating(self):
+        self.auth_queries()
+        with self.captureOnCommitCallbacks(execute=True):
+            Token.objects.filter(user=self.user).delete()
+        self.assertEqual(self.auth_queries()[0].status_code, 401)
+
+    def test_deactivated_user_stops_authenticating(self):
+        self.auth_queries()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.auth_queries()[0].status_code, 401)
+
+    def test_requests_get_their_own_user_instance(self):
+        cache = authentication.TokenCache(size=2, ttl=60)
+        cache.set('key', self.user)
+        first = cache.get('key')
+        first.first_name = 'Changed'
+        first._cached_addresses = []
+
+        second = cache.get('key')
+        self.assertIsNot(second, first)
+        self.assertEqual(second.first_name, '')
+        self.assertFalse(hasattr(second, '_cached_addresses'))
+        self.user.last_name = 'Changed'
+        self.assertEqual(cache.get('key').last_name, '')
+
+    def test_entries_expire(self):
+        cache = authentication.TokenCache(size=2, ttl=0)
+        cache.set('key', self.user)
+        self.assertIsNone(cache.get('key'))
+
+        cache = authentication.TokenCache(size=2, ttl=60)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, self.user)
+        self.assertEqual(list(cache.entries), ['b', 'c'])
+
+
+class SalesRollupTests(CatalogueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.client = self.make_user()
+        self.address = self.make_address(self.user)
+        rate = Commission.objects.create(name='Standard', percentage=Decimal('10.00'))
+        self.vendor = self.make_vendor('Ten', commission=rate)
+        self.other = self.make_vendor('Other')
+        self.products = self.make_products(self.vendor, 2, price='1.25') + self.make_products(self.other, 1)
+
+    def rows(self):
+        rollups.fold()
+        vendors = {
+            row.vendor_id: (row.orders, row.units, row.revenue, row.commission)
+            for row in VendorDailySales.objects.all()
+        }
+        products = {row.product_id: (row.orders, row.units, row.revenue) for row in ProductDailySales.objects.all()}
+        return vendors, products
+
+    def test_checkout_and_cancellation_update_rollups(self):
+        self.placed_order(quantity=2)
+        self.placed_order(quantity=1)
+        vendors, products = self.rows()
+        self.assertEqual(vendors[self.vendor.pk], (2, 6, Decimal('7.50'), Decimal('0.75')))
+        self.assertEqual(vendors[self.other.pk], (2, 3, Decimal('7.50'), Decimal('0.00')))
+        self.assertEqual(products[self.products[0].pk], (2, 3, Decimal('3.75')))
+
+        reservations.release_expired(now=timezone.now() + reservations.ttl() + timedelta(seconds=1))
+        vendors, _ = self.rows()
+        self.assertEqual(vendors[self.vendor.pk], (0, 0, Decimal('0.00'), Decimal('0.00')))
+
+    def test_checkout_appends_deltas_without_locking_rollup_rows(self):
+        self.placed_order(quantity=2)
+        with CaptureQueriesContext(connection) as queries:
+            self.placed_order(quantity=1)
+        self.assertFalse(any('dailysales' in q['sql'] for q in queries))
+        self.assertEqual(VendorSalesDelta.objects.count(), 4)
+        self.assertFalse(VendorDailySales.objects.exists())
+
+        self.assertEqual(rollups.fold(batch_size=3), 3 + 3)
+        self.assertEqual(rollups.fold(), 1 + 3)
+        self.assertFalse(VendorSalesDelta.objects.exists() or ProductSalesDelta.objects.exists())
+        vendors, _ = self.rows()
+        self.assertEqual(vendors[self.vendor.pk], (2, 6, Decimal('7.50'), Decimal('0.75')))
+
+    def test_reversal_uses_the_vendor_the_item_was_sold_by(self):
+        order = self.placed_order(quantity=2)
+        Product.objects.filter(pk=self.products[0].pk).update(vendor=self.other)
+        rollups.reverse_orders([order.pk])
+        vendors, _ = self.rows()
+        self.assertEqual(vendors[self.vendor.pk], (0, 0, Decimal('0.00'), Decimal('0.00')))
+        self.assertEqual(vendors[self.other.pk], (0, 0, Decimal('0.00'), Decimal('0.00')))
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.placed_order(quantity=2)
+        self.client.post('/api/v1/orders/bulk/', {'orders': [{
+            'address': str(self.address.id),
+            'items': [{'product_id': str(self.products[0].id), 'quantity': 4}],
+            'delivery_fee': '5.00',
+        }]}, format='json')
+        incremental = self.rows()
+
+        rollups.rebuild(chunk_size=1)
+        self.assertEqual(self.rows(), incremental)
+        self.assertEqual(incremental[1][self.products[0].pk], (2, 6, Decimal('7.50')))
+
+    def test_daily_folds_a_large_backlog_before_reading(self):
+        today = timezone.localdate()
+        count = rollups.DAILY_FOLD_THRESHOLD * 3
+        VendorSalesDelta.objects.bulk_create([
+            VendorSalesDelta(vendor=self.vendor, day=today - timedelta(days=i % 3), orders=1, units=2)
+            for i in range(count)
+        ])
+        VendorSalesDelta.objects.create(vendor=self.other, day=today, orders=1)
+
+        def report():
+            with CaptureQueriesContext(connection) as queries:
+                days = rollups.daily(VendorDailySales, self.vendor.pk, today - timedelta(days=7), today)
+            return [(row.day, row.orders, row.units) for row in days], len(queries)
+
+        folded, queries = report()
+        self.assertLessEqual(queries, 12)
+        self.assertEqual(sum(orders for _, orders, _ in folded), count)
+        self.assertFalse(VendorSalesDelta.objects.filter(vendor=self.vendor).exists())
+        self.assertEqual(VendorSalesDelta.objects.filter(vendor=self.other).count(), 1)
+        self.assertEqual(report(), (folded, 3))
+
+    def test_report_endpoint_reads_rollup_rows(self):
+        for _ in range(3):
+            self.placed_order(quantity=2)
+        url = f'/api/v1/reports/vendors/{self.vendor.pk}/daily/'
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        authentication.local.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['orders'], 3)
+        rollups.fold()
+        self.assertEqual(self.client.get(url).data, response.data)
+        self.assertEqual(response.data[0]['day'], str(timezone.localdate()))
+        self.assertFalse(any('api_order' in q['sql'] for q in queries))
+
+        self.assertEqual(self.client.get(url, {'start': '2026-02-01', 'end': '2026-01-01'}).status_code, 400)
+
+
+class OrderTransitionTests(CatalogueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.client = self.make_user()
+        self.address = self.make_address(self.user)
+        self.products = self.make_products(self.make_vendor(), 2, quantity=20)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        authentication.local.clear()
+
+    def move(self, order_ids, target):
+        return self.client.post('/api/v1/orders/transitions/', {
+            'order_ids': [str(pk) for pk in order_ids], 'status': target,
+        }, format='json')
+
+    def test_moves_only_orders_allowed_to_transition(self):
+        orders = [self.place_order(quantity=2).data['id'] for _ in range(3)]
+        self.move(orders[:2], 'CONFIRMED')
+
+        response = self.move(orders, 'PACKING')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(map(str, response.data['updated'])), sorted(orders[:2]))
+        skipped = response.data['skipped']
+        self.assertEqual([(str(s['id']), s['status']) for s in skipped], [(orders[2], 'PENDING')])
+        self.assertEqual(OrderStatusEvent.objects.filter(to_status='PACKING').count(), 2)
+        self.assertFalse(StockHold.objects.filter(order_id__in=orders[:2]).exists())
+
+    def test_cancel_restocks_in_one_statement_and_emits_event(self):
+        orders = [self.place_order(quantity=quantity).data['id'] for quantity in (2, 3)]
+        received = []
+
+        def receiver(sender, status, changes, **kwargs):
+            received.append((status, sorted(str(pk) for pk, _ in changes)))
+
+        transitions.order_status_changed.connect(receiver)
+        self.addCleanup(transitions.order_status_changed.disconnect, receiver)
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.move(orders + ['00000000-0000-0000-0000-000000000000'], 'CANCELLED')
+
+        self.assertEqual(len(response.data['updated']), 2)
+        self.assertEqual(response.data['skipped'][0]['detail'], 'Order not found.')
+        self.assertEqual(set(Stock.objects.values_list('quantity', flat=True)), {20})
+        self.assertEqual(sum('UPDATE "api_stock"' in q['sql'] for q in queries), 1)
+        self.assertEqual(received, [('CANCELLED', sorted(orders))])
+        rollups.fold()
+        self.assertEqual(VendorDailySales.objects.get().orders, 0)
+
+        # Terminal states cannot be left
+        self.assertEqual(self.move(orders, 'CONFIRMED').data['updated'], [])
+
+    def test_requires_staff_and_valid_status(self):
+        order = self.place_order(quantity=2).data['id']
+        self.assertEqual(self.move([order], 'LOST').status_code, 400)
+        User.objects.filter(pk=self.user.pk).update(is_staff=False)
+        authentication.local.clear()
+        self.assertEqual(self.move([order], 'CONFIRMED').status_code, 403)
+
+
+class DispatchTests(CatalogueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.client = self.make_user()
+        self.vendor = self.make_vendor()
+        # Roughly 1 km and 5 km north of the vendor
+        self.near = DeliveryPartner.objects.create(
+            name='Near', phone='1', capacity=1, latitude=Decimal('34.0612000'), longitude=Decimal('-118.2437000'),
+        )
+        self.far = DeliveryPartner.objects.create(
+            name='Far', phone='2', capacity=2, latitude=Decimal('34.0972000'), longitude=Decimal('-118.2437000'),
+        )
+
+    def make_orders(self, count, status='PACKING'):
+        return [
+            Order.objects.create(user=self.user, vendor=self.vendor, status=status, delivery_fee=Decimal('5.00'))
+            for _ in range(count)
+        ]
+
+    def test_orders_placed_through_the_api_get_a_partner(self):
+        self.address = self.make_address(self.user)
+        other = self.make_vendor('Other', latitude='34.0530000')
+        self.products = self.make_products(self.vendor, 2)
+        single = self.placed_order()
+        mixed = self.placed_order(items=self.basket(self.products[:1] + self.make_products(other, 1)))
+        self.assertEqual(single.vendor_id, self.vendor.pk)
+        self.assertIsNone(mixed.vendor_id)
+
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        authentication.local.clear()
+        for target in ('CONFIRMED', 'PACKING'):
+            response = self.client.post('/api/v1/orders/transitions/', {
+                'order_ids': [str(single.pk), str(mixed.pk)], 'status': target,
+            }, format='json')
+            self.assertEqual(len(response.data['updated']), 2)
+
+        assignment = dispatch.assign_batch()
+        self.assertEqual(set(assignment), {single.pk, mixed.pk})
+        self.assertEqual(
+            set(Order.objects.values_list('delivery_partner', flat=True)), {self.near.pk, self.far.pk}
+        )
+
+    def test_match_prefers_nearest_partner_within_capacity(self):
+        orders = [('a', 0.0, 0.0), ('b', 0.0, 0.001)]
+        partners = [('near', 0.0, 0.002), ('far', 0.0, 0.05), ('out', 1.0, 1.0)]
+        assignment = dispatch.match(orders, partners, {'near': 1, 'far': 1, 'out': 5}, radius_km=20)
+
+        self.assertEqual(assignment['b'][0], 'near')
+        self.assertEqual(assignment['a'][0], 'far')
+        self.assertAlmostEqual(assignment['a'][1], geo.haversine_km(0, 0, 0, 0.05))
+
+    def test_match_agrees_with_all_pairs_greedy(self):
+        orders = [(i, 0.01 * (i % 7), 0.013 * (i % 11)) for i in range(60)]
+        partners = [(f'p{i}', 0.009 * (i % 9), 0.011 * (i % 13)) for i in range(40)]
+        capacity = {key: 1 + i % 2 for i, (key, _, _) in enumerate(partners)}
+        assignment = dispatch.match(orders, partners, capacity, radius_km=3, candidates=len(partners))
+
+        pairs = sorted(
+            (geo.haversine_km(lat, lng, p_lat, p_lng), key, partner)
+            for key, lat, lng in orders for partner, p_lat, p_lng in partners
+        )
+        free, expected = dict(capacity), {}
+        for distance, key, partner in pairs:
+            if distance <= 3 and key not in expected and free[partner]:
+                expected[key] = partner
+                free[partner] -= 1
+        self.assertEqual({key: partner for key, (partner, _) in assignment.items()}, expected)
+
+    def test_assign_batch_assigns_packing_orders_and_tracks_load(self):
+        orders = self.make_orders(3)
+        pending = self.make_orders(1, status='PENDING')[0]
+
+        assignment = dispatch.assign_batch()
+        self.assertEqual(len(assignment), 3)
+        partners = [order.delivery_partner_id for order in Order.objects.filter(pk__in=[o.pk for o in orders])]
+        self.assertEqual(partners.count(self.near.pk), 1)
+        self.assertEqual(partners.count(self.far.pk), 2)
+        self.assertIsNone(Order.objects.get(pk=pending.pk).delivery_partner_id)
+        self.near.refresh_from_db()
+        self.far.refresh_from_db()
+        self.assertEqual((self.near.active_orders, self.far.active_orders), (1, 2))
+
+        # Everyone is at capacity now
+        self.make_orders(1)
+        self.assertEqual(dispatch.assign_batch(), {})
+
+        near_order = Order.objects.get(delivery_partner=self.near)
+        transitions.transition([near_order.pk], 'SHIPPED')
+        transitions.transition([near_order.pk], 'DELIVERED')
+        self.near.refresh_from_db()
+        self.assertEqual(self.near.active_orders, 0)
+        self.assertEqual(len(dispatch.assign_batch()), 1)
+
+    def test_positions_endpoint_is_staff_only(self):
+        payload = {'positions': [{'id': str(self.near.pk), 'lat': '34.0000000', 'lng': '-118.0000000'}]}
+        response = self.client.post('/api/v1/delivery-partners/positions/', payload, format='json')
+        self.assertEqual(response.status_code, 403)
+
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        authentication.local.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/v1/delivery-partners/positions/', payload, format='json')
+        self.assertEqual(response.data, {'updated': 1})
+        self.assertEqual(sum(q['sql'].startswith('UPDATE') for q in queries), 1)
+        self.near.refresh_from_db()
+        self.assertEqual(self.near.latitude, Decimal('34.0000000'))
+        self.assertIsNotNone(self.near.position_updated_at)
+
+
+class OrderHistoryTests(CatalogueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.client = self.make_user()
+        self.address = self.make_address(self.user)
+        self.products = self.make_products(self.make_vendor(), 3)
+        self.order_id = self.place_order().data['id']
+
+    def test_history_view_renders_snapshot_from_order_tables_only(self):
+        Product.objects.filter(pk=self.products[0].pk).update(name='Renamed')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/v1/orders/{self.order_id}/?view=history')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 2)
+        for query in queries:
+            self.assertNotIn('JOIN', query['sql'])
+        self.assertEqual(response.data['address'], self.address.pk)
+        item = next(i for i in response.data['items'] if i['product_id'] == str(self.products[0].pk))
+        self.assertEqual(
+            (item['name'], item['category'], item['vendor_name']), ('Product 00000', 'Fruits', 'Fresh Farms')
+        )
+
+        # The default view still shows the live product
+        response = self.client.get(f'/api/v1/orders/{self.order_id}/')
+        self.assertIn('Renamed', [i['product']['name'] for i in response.data['items']])
+
+    def test_backfill_fills_snapshots_in_chunks(self):
+        migration = importlib.import_module('api.migrations.0013_order_item_snapshot')
+        OrderItem.objects.update(product_name='', product_category='', vendor_name='')
+        with mock.patch.object(migration, 'BACKFILL_CHUNK_SIZE', 2):
+            migration.backfill_snapshots(apps, None)
+        self.assertEqual(
+            set(OrderItem.objects.values_list('product_name', 'product_category', 'vendor_name')),
+            {(p.name, 'Fruits', 'Fresh Farms') for p in self.products},
+        )
+
+
+class QueryPlanTests(CatalogueFixtureMixin, TestCase):
+    """The list endpoints' queries are served by an index, in page order."""
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.client = self.make_user()
+        vendor = self.make_vendor()
+        self.make_products(vendor, 5, category='Fruits')
+        self.make_products(vendor, 5, category='Bakery')
+        order = Order.objects.create(user=self.user, vendor=vendor, status='DELIVERED', delivery_fee=Decimal('5.00'))
+        Payment.objects.create(order=order, method='CARD', status='PAID', transaction_id='txn_1', amount=Decimal('5'))
+
+    def view_plan(self, path, table):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        sql = next(q['sql'] for q in queries if q['sql'].startswith('SELECT') and f'FROM "{table}"' in q['sql'])
+        return response, query_plan(sql)
+
+    def assertUsesIndex(self, plan, index):
+        self.assertTrue(any(index in line for line in plan), plan)
+        self.assertEqual(plan_problems(plan), [])
+
+    def test_order_list_uses_user_indexes(self):
+        _, plan = self.view_plan('/api/v1/orders/', 'api_order')
+        self.assertUsesIndex(plan, 'order_user_created_idx')
+        response, plan = self.view_plan('/api/v1/orders/?status=delivered', 'api_order')
+        self.assertUsesIndex(plan, 'order_user_status_idx')
+        self.assertEqual(response.data['results'][0]['items_count'], 0)
+
+    def test_category_listing_is_case_insensitive_and_indexed(self):
+        response, plan = self.view_plan('/api/v1/products/?category=fRUITS', 'api_product')
+        self.assertUsesIndex(plan, 'product_avail_category_idx')
+        self.assertEqual({p['category'] for p in response.data['results']}, {'Fruits'})
+        self.assertEqual(len(response.data['results']), 5)
+
+    def export_plan(self, path, table):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+            b''.join(response.streaming_content)
+        sql = next(q['sql'] for q in queries if q['sql'].startswith('SELECT') and f'FROM "{table}"' in q['sql'])
+        return query_plan(sql)
+
+    def assertStreamsInIndexOrder(self, plan, index):
+        # An export reads every row, but must not group or sort them first
+        self.assertTrue(any(index in line for line in plan), plan)
+        self.assertEqual([line for line in plan if 'TEMP B-TREE' in line], [], plan)
+
+    def test_exports_stream_in_index_order(self):
+        self.assertStreamsInIndexOrder(self.export_plan('/api/v1/orders/export/', 'api_order'), 'order_user_created_idx')
+        self.user.is_staff = True
+        self.user.save()
+        self.assertStreamsInIndexOrder(self.export_plan('/api/v1/orders/export/', 'api_order'), 'order_created_idx')
+        self.assertStreamsInIndexOrder(
+            self.export_plan('/api/v1/orders/export/?status=delivered', 'api_order'), 'order_created_idx'
+        )
+        self.assertStreamsInIndexOrder(self.export_plan('/api/v1/products/export/', 'api_product'), 'product_name_idx')
+
+    def test_payment_lookup_by_transaction_id(self):
+        with CaptureQueriesContext(connection) as queries:
+            Payment.objects.get(transaction_id='txn_1')
+        self.assertUsesIndex(query_plan(queries[0]['sql']), 'payment_transaction_idx')
+
+
+class DatabaseProfileTests(TestCase):
+
+    def test_tuned_profile_sets_pragmas_and_immediate_transactions(self):
+        if settings.SQLITE_PROFILE != 'tuned' or connection.vendor != 'sqlite':
+            self.skipTest("The tuned SQLite profile is not in use")
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -64000)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+        self.assertEqual(connection.settings_dict['CONN_MAX_AGE'], settings.SQLITE_CONN_MAX_AGE)
+
+
+@override_settings(REPLICA_READS=True)
+class ReplicaRoutingTests(CatalogueFixtureMixin, TransactionTestCase):
+    """The primary and the replica are separate test databases here."""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.client = self.make_user()
+        self.address = self.make_address(self.user)
+        self.products = self.make_products(self.make_vendor(), 2)
+
+    def test_catalogue_reads_come_from_the_replica(self):
+        # Just written: pages from the lagging replica are served, but not cached
+        for _ in range(2):
+            with CaptureQueriesContext(connections['replica']) as replica_queries:
+                response = self.client.get('/api/v1/products/')
+            self.assertEqual(response.data['results'], [])
+            self.assertTrue(replica_queries)
+            self.assertNotIn('ETag', response)
+
+        copy_database()
+        cache.delete(caching.CHANGED_KEY)
+        response = self.client.get('/api/v1/products/')
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIn('ETag', response)
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            self.assertEqual(self.client.get('/api/v1/products/').data, response.data)
+        self.assertFalse(replica_queries)
+
+        # Search runs on the replica too
+        with CaptureQueriesContext(connections['default']) as primary_queries:
+            response = self.client.get('/api/v1/products/', {'search': 'product'})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertFalse(primary_queries)
+
+    def test_catalogue_stays_on_the_replica_after_a_checkout(self):
+        copy_database()
+        self.placed_order(items=self.basket(self.products[:1], 100))
+        self.assertIsNotNone(cache.get(caching.CHANGED_KEY))
+
+        # The buyer is pinned to the primary; other shoppers are not
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = APIClient().get('/api/v1/products/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(replica_queries)
+
+    def test_user_is_pinned_to_the_primary_after_ordering(self):
+        copy_database()
+        response = self.place_order(self.basket(self.products[:1]))
+        self.assertEqual(response.status_code, 201)
+        order_id = response.data['id']
+        self.assertFalse(Order.objects.using('replica').exists())
+
+        # Read-your-writes while pinned
+        self.assertEqual(len(self.client.get('/api/v1/orders/').data['results']), 1)
+        self.assertEqual(self.client.get(f'/api/v1/orders/{order_id}/').status_code, 200)
+
+        # Once the pin expires, history comes from the lagging replica
+        cache.delete(f'replica-pin:{self.user.pk}')
+        self.assertEqual(self.client.get('/api/v1/orders/').data['results'], [])
+        self.assertEqual(self.client.get(f'/api/v1/orders/{order_id}/').status_code, 404)
+
+    def test_router_sends_writes_to_the_primary(self):
+        router = replicas.ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Product))
+        with replicas.reading():
+            self.assertEqual(router.db_for_read(Product), 'replica')
+            self.assertEqual(router.db_for_write(Product), 'default')
+            Product.objects.filter(pk=self.products[0].pk).update(name='Renamed')
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).name, 'Renamed')
+
+
+@override_settings(REQUEST_METRICS_SAMPLE_RATE=1.0)
+class RequestMetricsTests(CatalogueFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        metrics.registry.clear()
+        self.user, self.client = self.make_user()
+        self.address = self.make_address(self.user)
+        self.products = self.make_products(self.make_vendor(), 12)
+
+    def test_server_timing_and_prometheus_totals(self):
+        response = self.client.get('/api/v1/products/')
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries", serializer;dur=[\d.]+, total;dur=[\d.]+')
+        self.assertNotIn('n-plus-one', timing)
+
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        authentication.local.clear()
+        text = self.client.get('/api/v1/metrics/').content.decode()
+        labels = 'method="GET",route="/api/v1/products/"'
+        self.assertIn(f'api_requests_total{{{labels}}} 1', text)
+        self.assertIn(f'api_request_duration_seconds_count{{{labels}}} 1', text)
+        self.assertIn(f'api_response_bytes_total{{{labels}}} {len(response.content)}', text)
+        self.assertIn('# TYPE api_db_queries_total counter', text)
+
+    def test_list_and_detail_endpoints_repeat_no_queries(self):
+        response = self.place_order()
+        for path in ('/api/v1/products/', '/api/v1/orders/', f'/api/v1/orders/{response.data["id"]}/'):
+            self.assertNotIn('n-plus-one', self.client.get(path)['Server-Timing'], path)
+
+    def test_repeated_queries_are_flagged(self):
+        with metrics.recording() as record:
+            for product in self.products[:6]:
+                Product.objects.get(pk=product.pk)
+        self.assertEqual([count for _, count in record.duplicates(threshold=5)], [6])
+        self.assertEqual(record.query_count, 6)
+        self.assertGreater(record.db_time, 0)
+
+    def test_serializer_time_is_recorded_per_request(self):
+        with metrics.recording() as record:
+            ProductSerializer(self.products, many=True).data
+        self.assertGreater(record.serializer_time, 0)
+        self.assertIsNone(metrics._current.get())
+
+    async def test_async_requests_are_recorded(self):
+        await sync_to_async(self.place_order)()
+        middleware = metrics.RequestMetricsMiddleware(async_views.order_list)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        token = await Token.objects.aget(user=self.user)
+        response = await middleware(
+            AsyncRequestFactory().get('/api/v1/orders/', headers={'Authorization': f'Token {token.key}'})
+        )
+        self.assertEqual(response.status_code, 200)
+        db, serializer = re.match(
+            r'db;dur=([\d.]+);desc="\d+ queries", serializer;dur=([\d.]+)', response['Server-Timing']
+        ).groups()
+        self.assertGreater(float(db), 0)
+        self.assertGreater(float(serializer), 0)
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0)
+    def test_disabled_middleware_adds_nothing(self):
+        response = APIClient().get('/api/v1/products/')
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class BenchmarkSuiteTests(TestCase):
+
+    def seed(self, seed):
+        return seed_fixtures(random.Random(seed), users=5, vendors=3, products=40, orders=30)
+
+    def test_fixtures_are_reproducible(self):
+        runs = []
+        for _ in range(2):
+            with rolled_back():
+                fixtures = self.seed(7)
+                runs.append((
+                    list(Product.objects.order_by('name').values_list('name', 'category', 'price')),
+                    list(OrderItem.objects.order_by('product_name', 'quantity')
+                         .values_list('product_name', 'vendor_name', 'quantity')),
+                    len(fixtures.products),
+                ))
+        self.assertEqual(runs[0], runs[1])
+
+    def test_fixtures_are_stocked_and_linked(self):
+        fixtures = self.seed(7)
+        self.assertEqual(User.objects.count(), len(fixtures.tokens))
+        self.assertEqual(Order.objects.count(), len(fixtures.orders))
+        self.assertEqual(Stock.objects.count(), Product.objects.count())
+        self.assertNotIn(fixtures.hot_product, fixtures.products)
+        self.assertFalse(OrderItem.objects.filter(product_name='').exists())
+        token, order_id = fixtures.orders[0]
+        self.assertEqual(str(Order.objects.get(pk=order_id).user.auth_token.key), token)
+
+    def test_compare_flags_regressions(self):
+        stats = {
+            'p50_ms': 10.0, 'p95_ms': 20.0, 'requests_per_second': 100.0,
+            'queries_p50': 3, 'errors': 0, 'repeated_query_requests': 0,
+        }
+        baseline = {'meta': {'scale': 'small'}, 'scenarios': {'order_detail': stats}}
+        report = copy.deepcopy(baseline)
+        report['scenarios']['order_detail'].update(p50_ms=14.0, requests_per_second=70.0)
+        self.assertEqual(compare(report, baseline, tolerance=0.5), [])
+
+        report['scenarios']['order_detail'].update(queries_p50=4, p95_ms=31.0, requests_per_second=60.0)
+        self.assertEqual(compare(report, baseline, tolerance=0.5), [
+            "order_detail: 4 queries per request, was 3",
+            "order_detail: p95_ms 31.00, was 20.00",
+            "order_detail: 60.0 requests/s, was 100.0",
+        ])
+
+        report['meta']['scale'] = 'medium'
+        self.assertEqual(compare(report, baseline, tolerance=0.5), [
+            "baseline was recorded with scale='small', this run used 'medium'",
+        ])
@@ -0,0 +1,110 @@
+"""
+Order status state machine.
+
+    PENDING -> CONFIRMED -> PACKING -> SHIPPED -> DELIVERED
+       |           |           |
+       +-> FAILED  +-----------+-> CANCELLED
+       +-> CANCELLED
+
+transition() moves any number of orders to a new status with one
+conditional `UPDATE ... WHERE id IN (...) AND status IN (<allowed sources>)`,
+so an order that moved on concurrently is skipped rather than overwritten.
+Side effects run set-based for the whole batch:
+
+- leaving PENDING drops the order's stock holds (api.reservations);
+- CANCELLED/FAILED return the ordered units to stock with a single
+  UPDATE and take the orders out of the sales rollups;
+- DELIVERED/CANCELLED free the assigned delivery partners' slots
+  (api.dispatch);
+- one OrderStatusEvent row per moved order is bulk-inserted, and the
+  `order_status_changed` signal is sent once per batch after commit.
+"""
+from django.db import transaction
+from django.db.models import Sum
+from django.dispatch import Signal
+
+from . import dispatch, inventory, rollups
+from .models import Order, OrderItem, OrderStatusEvent, StockHold
+
+TRANSITIONS = {
+    'PENDING': {'CONFIRMED', 'CANCELLED', 'FAILED'},
+    'CONFIRMED': {'PACKING', 'CANCELLED'},
+    'PACKING': {'SHIPPED', 'CANCELLED'},
+    'SHIPPED': {'DELIVERED'},
+    'DELIVERED': set(),
+    'CANCELLED': set(),
+    'FAILED': set(),
+}
+
+# Statuses whose stock goes back on the shelf
+RESTOCK_STATUSES = ('CANCELLED', 'FAILED')
+
+# Statuses that end a delivery partner's job
+RELEASE_PARTNER_STATUSES = ('DELIVERED', 'CANCELLED')
+
+# Sent after commit with `status` (the target) and `changes`, a list of
+# (order_id, previous_status) pairs
+order_status_changed = Signal()
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def sources(target):
+    """Statuses an order may move to `target` from."""
+    if target not in TRANSITIONS:
+        raise InvalidTransition(f"Unknown status {target!r}.")
+    return sorted(status for status, targets in TRANSITIONS.items() if target in targets)
+
+
+def can_transition(current, target):
+    return target in TRANSITIONS.get(current, ())
+
+
+@transaction.atomic
+def transition(order_ids, target, only_from=None):
+    """
+    Move the orders in `order_ids` that are allowed to reach `target`
+    (and, if given, are in one of `only_from`). Returns a list of
+    `(order_id, previous_status)` for the orders that moved.
+    """
+    allowed = sources(target)
+    if only_from is not None:
+        allowed = [status for status in allowed if status in only_from]
+    if not order_ids or not allowed:
+        return []
+
+    changes = list(
+        Order.objects.select_for_update()
+        .filter(pk__in=order_ids, status__in=allowed)
+        .order_by('pk')
+        .values_list('pk', 'status')
+    )
+    if not changes:
+        return []
+    moved = [pk for pk, _ in changes]
+    Order.objects.filter(pk__in=moved, status__in=allowed).update(status=target)
+
+    if any(previous == 'PENDING' for _, previous in changes):
+        StockHold.objects.filter(order_id__in=moved).delete()
+    if target in RELEASE_PARTNER_STATUSES:
+        dispatch.release(moved)
+    if target in RESTOCK_STATUSES:
+        quantities = dict(
+            OrderItem.objects.filter(order_id__in=moved)
+            .values('product_id')
+            .annotate(total=Sum('quantity'))
+            .values_list('product_id', 'total')
+        )
+        inventory.restock(quantities)
+        rollups.reverse_orders(moved)
+
+    OrderStatusEvent.objects.bulk_create([
+        OrderStatusEvent(order_id=pk, from_status=previous, to_status=target)
+        for pk, previous in changes
+    ])
+    transaction.on_commit(
+        lambda: order_status_changed.send(sender=Order, status=target, changes=changes)
+    )
+    return changes
@@ -1,28 +1,65 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework.authtoken.views import obtain_auth_token
 from .views import (
     UserSignupView, 
     ProductListView, 
-    OrderCreateView,
-    OrderListView,
+    VendorNearbyView,
+    order_collection_view,
+    BulkOrderCreateView,
+    OrderTransitionView,
+    PartnerPositionsView,
     OrderDetailView,
+    OrderExportView,
+    ProductExportView,
+    VendorDailySalesView,
+    ProductDailySalesView,
+    MetricsView,
     HealthCheckView
 )
 
+product_list_view = ProductListView.as_view()
+order_detail_view = OrderDetailView.as_view()
+health_check_view = HealthCheckView.as_view()
+
+# Under ASGI the read-only endpoints are served by their async variants
+if settings.API_ASYNC_VIEWS:
+    from . import async_views
+    product_list_view = async_views.product_list
+    order_collection_view = async_views.order_collection
+    order_detail_view = async_views.order_detail
+    health_check_view = async_views.health_check
+
 urlpatterns = [
     # Authentication endpoints
     path('auth/signup/', UserSignupView.as_view(), name='signup'),
     path('auth/token/', obtain_auth_token, name='api_token_auth'),
     
     # Product endpoints
-    path('products/', ProductListView.as_view(), name='product-list'),
+    path('products/', product_list_view, name='product-list'),
+    path('products/export/', ProductExportView.as_view(), name='product-export'),
+    
+    # Vendor endpoints
+    path('vendors/nearby/', VendorNearbyView.as_view(), name='vendor-nearby'),
     
     # Order endpoints
-    path('orders/', OrderCreateView.as_view(), name='order-create'),       # POST - Create order
-    path('orders/', OrderListView.as_view(), name='order-list'),           # GET - List user orders
-    path('orders/<uuid:pk>/', OrderDetailView.as_view(), name='order-detail'),  # GET - Order details
+    path('orders/', order_collection_view, name='order-list'),            # GET - List user orders, POST - Create order
+    path('orders/bulk/', BulkOrderCreateView.as_view(), name='order-bulk-create'),  # POST - Place many orders
+    path('orders/transitions/', OrderTransitionView.as_view(), name='order-transitions'),  # POST - Bulk status change (staff)
+    path('orders/export/', OrderExportView.as_view(), name='order-export'),  # GET - NDJSON export
+    path('orders/<uuid:pk>/', order_detail_view, name='order-detail'),  # GET - Order details
+    
+    # Delivery partners (staff)
+    path('delivery-partners/positions/', PartnerPositionsView.as_view(), name='partner-positions'),
+    
+    # Sales reports (staff)
+    path('reports/vendors/<uuid:pk>/daily/', VendorDailySalesView.as_view(), name='vendor-daily-sales'),
+    path('reports/products/<uuid:pk>/daily/', ProductDailySalesView.as_view(), name='product-daily-sales'),
     
     # Health check
-    path('health/', HealthCheckView.as_view(), name='health-check'),
+    path('health/', health_check_view, name='health-check'),
+    
+    # Request metrics, Prometheus text format (staff)
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
 
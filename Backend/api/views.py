@@ -1,16 +1,58 @@
-from rest_framework import generics, permissions, status
+from rest_framework import generics, permissions, serializers, status
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.views import APIView
+from django.core.cache import cache
 from django.db import transaction
-from .models import User, Product, Order, OrderItem, Stock, Address
+from django.db.models import Value
+from django.db.models.functions import Lower
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from . import caching, dispatch, idempotency, metrics, replicas, rollups, search as product_search, transitions
+from .inventory import stripes_prefetch
+from .models import User, Vendor, Product, Order, Stock, Address
+from .pagination import OrderCursorPagination, ProductCursorPagination
 from .serializers import (
-    UserSerializer, ProductSerializer, OrderSerializer, 
-    OrderListSerializer, OrderCreateSerializer, OrderDetailSerializer,
-    StandardErrorSerializer
+    UserSerializer, ProductSerializer, NearbyVendorSerializer, NearbyQuerySerializer,
+    OrderListSerializer, OrderCreateSerializer, OrderDetailSerializer, OrderHistorySerializer,
+    BulkOrderCreateSerializer,
+    DayRangeSerializer, VendorDailySalesSerializer, ProductDailySalesSerializer, OrderTransitionSerializer,
+    PartnerPositionsSerializer,
 )
 from django.shortcuts import get_object_or_404
 
 
+def validation_error_response(details):
+    return Response(
+        {
+            "error": "validation_error",
+            "message": "Invalid input data",
+            "details": details
+        },
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+
+class ReplicaReadsMixin:
+    """
+    Serve a view's GET requests from the read replica (api.replicas),
+    unless the user was pinned to the primary by a recent order. The
+    request is authenticated against the primary first.
+    """
+    replica_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in permissions.SAFE_METHODS:
+            self.replica_token = replicas.start_reads(request.user)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self.replica_token is not None:
+            replicas.end_reads(self.replica_token)
+            self.replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
 class UserSignupView(generics.CreateAPIView):
     """
     POST /api/v1/auth/signup/
@@ -36,38 +78,151 @@ class UserSignupView(generics.CreateAPIView):
     permission_classes = [permissions.AllowAny]
 
 
-class ProductListView(generics.ListAPIView):
+class NearbyQueryMixin:
+    """
+    Validates the location query parameters of the nearby searches
+    (NearbyQuerySerializer) into `self.location`. Invalid ones are answered
+    with the same validation_error body as the other endpoints.
+    """
+    location = None
+
+    def validate_location(self, request):
+        """Return the error response for invalid parameters, else None."""
+        location = NearbyQuerySerializer(data=request.query_params, context=self.get_serializer_context())
+        if not location.is_valid():
+            return validation_error_response(location.errors)
+        self.location = location.validated_data
+        return None
+
+
+class ProductListView(NearbyQueryMixin, ReplicaReadsMixin, generics.ListAPIView):
     """
     GET /api/v1/products/
     
     Retrieves a list of all available products with filtering support.
     
     Query Parameters:
-    - category: Filter by exact category match
-    - search: Search in product name
+    - category: Filter by category, ignoring case
+    - search: Full-text prefix search in product name; results are
+      ordered by relevance instead of name
+    - fields: Comma-separated list of fields to return (e.g. id,name,price)
+    - expand: Comma-separated nested blocks to render in full (vendor, stock);
+      blocks left out collapse to the vendor id / stock quantity
+    - address: Only products from active vendors near one of the user's
+      addresses (requires authentication)
+    - radius: Delivery radius in km for the address filter (default 5, max 50)
+    - cursor: Opaque cursor taken from the previous page's next/previous link
+    - page_size: Results per page (default 20, max 100)
     
     Response (200 OK):
     {
-        "count": 2,
+        "next": "http://.../api/v1/products/?cursor=cD1...",
+        "previous": null,
         "results": [...]
     }
     """
     queryset = Product.objects.filter(is_available=True)
     serializer_class = ProductSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = ProductCursorPagination
+
+    def list(self, request, *args, **kwargs):
+        # Address filtering is per user, so only the shared catalogue is cached
+        if 'address' in request.query_params:
+            return self.validate_location(request) or super().list(request, *args, **kwargs)
+
+        key = caching.response_key(request)
+        etag = caching.etag_for(key)
+        if caching.etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        data = cache.get(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            if not caching.cacheable_read():
+                return Response(data)
+            cache.set(key, data, caching.timeout())
+        return Response(data, headers={'ETag': etag})
+
+    def get_list_param(self, name):
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+        return [part.strip() for part in value.split(',') if part.strip()]
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_list_param('fields'))
+        kwargs.setdefault('expand', self.get_list_param('expand'))
+        return super().get_serializer(*args, **kwargs)
 
     def get_queryset(self):
-        queryset = Product.objects.filter(is_available=True)
+        related = ProductSerializer.related_for(
+            fields=self.get_list_param('fields'),
+            expand=self.get_list_param('expand'),
+        )
+        queryset = Product.objects.filter(is_available=True).select_related(*related)
+        if 'stock' in related:
+            queryset = queryset.prefetch_related(stripes_prefetch())
         category = self.request.query_params.get('category')
         search = self.request.query_params.get('search')
         if category:
-            queryset = queryset.filter(category__iexact=category)
+            # Same match as category__iexact, in the form product_avail_category_idx serves
+            queryset = queryset.alias(category_lower=Lower('category')).filter(
+                category_lower=Lower(Value(category))
+            )
         if search:
-            queryset = queryset.filter(name__icontains=search)
+            queryset = self.filter_search(queryset, search)
+        if self.location is not None:
+            point = self.location
+            vendors = Vendor.nearby(point['lat'], point['lng'], point['radius'])
+            queryset = queryset.filter(vendor__in=[vendor.pk for vendor in vendors])
         return queryset
 
 
-class OrderListView(generics.ListAPIView):
+    def filter_search(self, queryset, text):
+        """
+        Restrict to full-text matches and order them by relevance through a
+        `search_rank` annotation, which the cursor pagination then keys on.
+        """
+        if not product_search.is_supported(queryset.db):
+            return queryset.filter(name__icontains=text)
+        return product_search.filter_products(queryset, text)
+
+
+class VendorNearbyView(NearbyQueryMixin, generics.ListAPIView):
+    """
+    GET /api/v1/vendors/nearby/
+    
+    Retrieves active vendors that can deliver to a location, nearest first.
+    
+    Query Parameters:
+    - lat, lng: Search point in degrees
+    - address: Use one of the user's addresses as the search point
+      instead (requires authentication)
+    - radius: Search radius in km (default 5, max 50)
+    
+    Response (200 OK):
+    [
+        {
+            "id": "v1a2b3c4-...",
+            "name": "Fresh Farms",
+            ...
+            "distance_km": 1.284
+        }
+    ]
+    """
+    serializer_class = NearbyVendorSerializer
+    permission_classes = [permissions.AllowAny]
+
+    def list(self, request, *args, **kwargs):
+        return self.validate_location(request) or super().list(request, *args, **kwargs)
+
+    def get_queryset(self):
+        point = self.location
+        return Vendor.nearby(point['lat'], point['lng'], point['radius'])
+
+
+class OrderListView(ReplicaReadsMixin, generics.ListAPIView):
     """
     GET /api/v1/orders/
     
@@ -75,19 +230,23 @@ class OrderListView(generics.ListAPIView):
     
     Query Parameters:
     - status: Filter by order status
+    - cursor: Opaque cursor taken from the previous page's next/previous link
+    - page_size: Results per page (default 20, max 100)
     
     Response (200 OK):
     {
-        "count": 2,
+        "next": "http://.../api/v1/orders/?cursor=cD0y...",
+        "previous": null,
         "results": [...]
     }
     """
     serializer_class = OrderListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OrderCursorPagination
 
     def get_queryset(self):
         user = self.request.user
-        queryset = Order.objects.filter(user=user).order_by('-created_at')
+        queryset = OrderListSerializer.setup_eager_loading(Order.objects.filter(user=user))
         
         # Filter by status if provided
         status_filter = self.request.query_params.get('status')
@@ -102,6 +261,11 @@ class OrderCreateView(generics.CreateAPIView):
     POST /api/v1/orders/
     
     Creates a new order. Requires authentication.
+
+    Clients should send an `Idempotency-Key` header (any unique string up
+    to 255 characters) and reuse it when retrying: a repeat of a request
+    that already succeeded returns the original response, marked with
+    `Idempotent-Replayed: true`, instead of placing a second order.
     
     Request Body:
     {
@@ -124,6 +288,47 @@ class OrderCreateView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def create(self, request, *args, **kwargs):
+        """
+        Place the order, or replay the stored response when the request
+        carries an Idempotency-Key that was already used (see api.idempotency).
+        """
+        key = request.headers.get(idempotency.HEADER)
+        if key is None:
+            return self.place_order(request)
+        if not key.strip() or len(key) > idempotency.MAX_KEY_LENGTH:
+            return self.idempotency_error_response(
+                status.HTTP_400_BAD_REQUEST, "invalid_idempotency_key",
+                f"Idempotency-Key must be 1 to {idempotency.MAX_KEY_LENGTH} characters.",
+            )
+
+        fingerprint = idempotency.fingerprint(request.data)
+        try:
+            stored = idempotency.cached(request.user.pk, key, fingerprint)
+            if stored is not None:
+                return self.replay_response(*stored)
+            with transaction.atomic():
+                stored = idempotency.claim(request.user, key, fingerprint)
+                if stored is not None:
+                    return self.replay_response(*stored)
+                response = self.place_order(request)
+                if response.status_code == status.HTTP_201_CREATED:
+                    idempotency.store(request.user, key, fingerprint, response.status_code, response.data)
+                else:
+                    # Release the claim so the client can retry with the same key
+                    transaction.set_rollback(True)
+                return response
+        except idempotency.KeyReused:
+            return self.idempotency_error_response(
+                status.HTTP_422_UNPROCESSABLE_ENTITY, "idempotency_key_reused",
+                "This Idempotency-Key was already used with a different request body.",
+            )
+        except idempotency.KeyInProgress:
+            return self.idempotency_error_response(
+                status.HTTP_409_CONFLICT, "idempotency_key_in_progress",
+                "A request with this Idempotency-Key is still being processed.",
+            )
+
+    def place_order(self, request):
         serializer = self.get_serializer(data=request.data)
         
         # Custom validation with structured error response
@@ -134,16 +339,13 @@ class OrderCreateView(generics.CreateAPIView):
             if hasattr(serializer, 'errors'):
                 error_details = serializer.errors
             
-            return Response(
-                {
-                    "error": "validation_error",
-                    "message": "Invalid input data",
-                    "details": error_details
-                },
-                status=status.HTTP_400_BAD_REQUEST
-            )
+            return self.validation_error_response(error_details)
         
-        order = serializer.save()
+        # Stock is re-checked under lock, so it can still fail here
+        try:
+            order = serializer.save()
+        except serializers.ValidationError as e:
+            return self.validation_error_response(e.detail)
         
         # Return created order with success message
         response_serializer = OrderDetailSerializer(order)
@@ -155,13 +357,197 @@ class OrderCreateView(generics.CreateAPIView):
             status=status.HTTP_201_CREATED
         )
 
+    def finalize_response(self, request, response, *args, **kwargs):
+        # The replica may not have the new order yet; read it back from the primary
+        if response.status_code < 400:
+            replicas.pin(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def replay_response(self, status_code, data):
+        return Response(data, status=status_code, headers={'Idempotent-Replayed': 'true'})
+
+    def idempotency_error_response(self, status_code, error, message):
+        return Response({"error": error, "message": message}, status=status_code)
+
+    def validation_error_response(self, details):
+        return validation_error_response(details)
+
+
+class BulkOrderCreateView(OrderCreateView):
+    """
+    POST /api/v1/orders/bulk/
+    
+    Places up to 500 orders in one request, for wholesale partners.
+    Each order takes the same fields as POST /api/v1/orders/ and is
+    accepted or rejected on its own, in request order.
+    
+    Request Body:
+    {
+        "orders": [
+            {"address": "a1b2...", "items": [...], "delivery_fee": "5.00"},
+            ...
+        ]
+    }
+    
+    Response (201 Created if every order was placed, else 207 Multi-Status):
+    {
+        "created": 1,
+        "failed": 1,
+        "results": [
+            {"index": 0, "status": "created", "order": {"id": "o1a2...", ...}},
+            {"index": 1, "status": "failed", "errors": {"items": [...]}}
+        ]
+    }
+    """
+    serializer_class = BulkOrderCreateSerializer
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return self.validation_error_response(serializer.errors)
+
+        # Stock is re-checked under lock, so the whole batch can still fail here
+        try:
+            results = serializer.save()
+        except serializers.ValidationError as e:
+            return self.validation_error_response(e.detail)
+        created = sum(1 for result in results if result['status'] == 'created')
+        return Response(
+            {
+                "created": created,
+                "failed": len(results) - created,
+                "results": results,
+            },
+            status=status.HTTP_201_CREATED if created == len(results) else status.HTTP_207_MULTI_STATUS
+        )
+
+
+class OrderTransitionView(generics.GenericAPIView):
+    """
+    POST /api/v1/orders/transitions/
+    
+    Moves up to 5000 orders to a new status in one statement. Orders that
+    cannot make the transition from their current status are skipped and
+    reported. Cancelled and failed orders are restocked. Staff only.
+    
+    Request Body:
+    {
+        "order_ids": ["o1a2b3c4-...", "o2b3c4d5-..."],
+        "status": "SHIPPED"
+    }
+    
+    Response (200 OK):
+    {
+        "status": "SHIPPED",
+        "updated": ["o1a2b3c4-..."],
+        "skipped": [
+            {"id": "o2b3c4d5-...", "status": "DELIVERED", "detail": "Cannot move from DELIVERED to SHIPPED."}
+        ]
+    }
+    """
+    serializer_class = OrderTransitionSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return validation_error_response(serializer.errors)
+        target = serializer.validated_data['status']
+        order_ids = set(serializer.validated_data['order_ids'])
+
+        changes = transitions.transition(order_ids, target)
+        updated = [pk for pk, _ in changes]
+        current = dict(
+            Order.objects.filter(pk__in=order_ids - set(updated)).values_list('pk', 'status')
+        )
+        skipped = []
+        for pk in sorted(order_ids - set(updated), key=str):
+            if pk not in current:
+                skipped.append({"id": pk, "status": None, "detail": "Order not found."})
+            else:
+                skipped.append({
+                    "id": pk,
+                    "status": current[pk],
+                    "detail": f"Cannot move from {current[pk]} to {target}.",
+                })
+        return Response({"status": target, "updated": updated, "skipped": skipped})
+
+
+class PartnerPositionsView(generics.GenericAPIView):
+    """
+    POST /api/v1/delivery-partners/positions/
+    
+    Records the latest positions of up to 5000 delivery partners in one
+    statement, e.g. from the fleet tracking gateway. Staff only.
+    
+    Request Body:
+    {
+        "positions": [
+            {"id": "d1a2b3c4-...", "lat": "12.9716000", "lng": "77.5946000"}
+        ]
+    }
+    
+    Response (200 OK):
+    {"updated": 1}
+    """
+    serializer_class = PartnerPositionsSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return validation_error_response(serializer.errors)
+        updated = dispatch.update_positions({
+            position['id']: (position['lat'], position['lng'])
+            for position in serializer.validated_data['positions']
+        })
+        return Response({"updated": updated})
+
+
+class MetricsView(APIView):
+    """
+    GET /api/v1/metrics/
+    
+    Request counts, query counts, database and serializer time, response
+    sizes and a duration histogram per route, for the requests sampled by
+    api.metrics.RequestMetricsMiddleware in this process, in the
+    Prometheus text format. Staff only.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(
+            metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
+
+
+order_list_view = OrderListView.as_view()
+order_create_view = OrderCreateView.as_view()
+
 
-class OrderDetailView(generics.RetrieveAPIView):
+@csrf_exempt
+def order_collection_view(request, *args, **kwargs):
+    """
+    /api/v1/orders/
+
+    GET lists the user's orders and POST creates one; both share a URL,
+    so requests are dispatched to the matching view by method.
+    """
+    if request.method == 'POST':
+        return order_create_view(request, *args, **kwargs)
+    return order_list_view(request, *args, **kwargs)
+
+
+class OrderDetailView(ReplicaReadsMixin, generics.RetrieveAPIView):
     """
     GET /api/v1/orders/{order_id}/
     
     Retrieves detailed information about a specific order.
     
+    Query Parameters:
+    - view: "history" renders related objects as ids and items from the
+      product snapshot taken at checkout, reading only the order tables
+    
     Response (200 OK):
     {
         "id": "o1a2b3c4-...",
@@ -177,8 +563,15 @@ class OrderDetailView(generics.RetrieveAPIView):
     serializer_class = OrderDetailSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_serializer_class(self):
+        if self.request.query_params.get('view') == 'history':
+            return OrderHistorySerializer
+        return OrderDetailSerializer
+
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return self.get_serializer_class().setup_eager_loading(
+            Order.objects.filter(user=self.request.user)
+        )
 
     def retrieve(self, request, *args, **kwargs):
         try:
@@ -198,6 +591,122 @@ class OrderDetailView(generics.RetrieveAPIView):
             )
 
 
+class NDJSONExportView(generics.GenericAPIView):
+    """
+    Base class for streaming exports.
+
+    Rows are read with `queryset.iterator(chunk_size=...)` and serialized one
+    at a time into newline-delimited JSON, so memory stays flat whatever the
+    export size and the first row is sent as soon as the first chunk is read.
+    """
+    chunk_size = 2000
+
+    def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        serializer = self.get_serializer()
+        response = StreamingHttpResponse(
+            self.stream(queryset, serializer), content_type='application/x-ndjson'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{self.export_name}.ndjson"'
+        return response
+
+    def stream(self, queryset, serializer):
+        encoder = JSONEncoder()
+        for obj in queryset.iterator(chunk_size=self.chunk_size):
+            yield encoder.encode(serializer.to_representation(obj)) + '\n'
+
+
+class OrderExportView(NDJSONExportView):
+    """
+    GET /api/v1/orders/export/
+    
+    Streams orders as newline-delimited JSON, newest first, one
+    OrderListSerializer object per line. Staff users export every order;
+    other users export their own.
+    
+    Query Parameters:
+    - status: Filter by order status
+    """
+    serializer_class = OrderListSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    export_name = 'orders'
+
+    def get_queryset(self):
+        queryset = Order.objects.all()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(user=self.request.user)
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter.upper())
+        # Streamed in index order (order_created_idx, or the per-user
+        # indexes), so the first rows go out before the table is read
+        return OrderListSerializer.setup_eager_loading(queryset).order_by('-created_at', '-id')
+
+
+class ProductExportView(NDJSONExportView):
+    """
+    GET /api/v1/products/export/
+    
+    Streams the full catalogue, including unavailable products, as
+    newline-delimited JSON ordered by name. Staff only.
+    """
+    serializer_class = ProductSerializer
+    permission_classes = [permissions.IsAdminUser]
+    export_name = 'products'
+
+    def get_queryset(self):
+        return (
+            Product.objects.select_related('vendor', 'stock')
+            .prefetch_related(stripes_prefetch())
+            .order_by('name', 'id')
+        )
+
+
+class DailySalesView(generics.ListAPIView):
+    """
+    Base for the per-day sales reports. Reads the materialized rollup rows
+    for one vendor or product plus their pending deltas (api.rollups), so
+    the cost depends on the number of days requested, not on the number
+    of orders.
+    
+    Query Parameters:
+    - start, end: Inclusive YYYY-MM-DD range (default: last 30 days, max 366)
+    """
+    permission_classes = [permissions.IsAdminUser]
+    pagination_class = None
+
+    def get_queryset(self):
+        days = DayRangeSerializer(data=self.request.query_params)
+        days.is_valid(raise_exception=True)
+        return rollups.daily(
+            self.serializer_class.Meta.model, self.kwargs['pk'],
+            days.validated_data['start'], days.validated_data['end'],
+        )
+
+
+class VendorDailySalesView(DailySalesView):
+    """
+    GET /api/v1/reports/vendors/{vendor_id}/daily/
+    
+    Orders, units, revenue and commission per day for one vendor. Staff only.
+    
+    Response (200 OK):
+    [
+        {"day": "2026-01-05", "orders": 12, "units": 31, "revenue": "84.50", "commission": "8.45"}
+    ]
+    """
+    serializer_class = VendorDailySalesSerializer
+
+
+class ProductDailySalesView(DailySalesView):
+    """
+    GET /api/v1/reports/products/{product_id}/daily/
+    
+    Orders, units and revenue per day for one product. Staff only.
+    """
+    serializer_class = ProductDailySalesSerializer
+
+
 class HealthCheckView(APIView):
     """
     GET /api/v1/health/
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,11 +46,12 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 }
 
 MIDDLEWARE = [
+    'api.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,13 +84,109 @@ WSGI_APPLICATION = 'frookoonBackend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLITE_PROFILE picks how SQLite connections are set up:
+# - 'tuned': WAL journaling (readers no longer block the writer),
+#   synchronous=NORMAL (safe with WAL, fsync only at checkpoints), a 20 s
+#   busy timeout, 256 MB mmap and a 64 MB page cache. Connections are kept
+#   for SQLITE_CONN_MAX_AGE seconds, and transactions start with BEGIN
+#   IMMEDIATE. A checkout's atomic block then waits for the write lock up
+#   front. Under DEFERRED it would fail with "database is locked" when
+#   upgrading from read to write. Read endpoints run in autocommit and are
+#   unaffected.
+# - 'plain': Django's defaults.
+# `manage.py bench_sqlite` compares the two under concurrent checkouts.
+#
+# SQLITE_CONN_MAX_AGE keeps a connection open between requests. It is 0 (a
+# connection per request) unless set: under ASGI a request's sync code runs
+# on whichever worker thread is free, and every thread would keep a
+# connection of its own open, so they pile up. wsgi.py sets it to 600, as a
+# WSGI worker thread serves one request after another.
+SQLITE_CONN_MAX_AGE = int(os.environ.get('SQLITE_CONN_MAX_AGE', 0))
+SQLITE_PROFILES = {
+    'plain': {},
+    'tuned': {
+        'CONN_MAX_AGE': SQLITE_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=268435456;'
+                'PRAGMA cache_size=-64000;'
+            ),
+            # Seconds a connection waits for a lock (busy timeout)
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+}
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'tuned')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        **SQLITE_PROFILES[SQLITE_PROFILE],
+    },
+    # Catalogue and order history reads when REPLICA_READS is on
+    # (api.replicas). Locally a second SQLite file stands in for it,
+    # refreshed from the primary by `manage.py sync_replica`.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('SQLITE_REPLICA', BASE_DIR / 'db.replica.sqlite3'),
+        **SQLITE_PROFILES[SQLITE_PROFILE],
+    },
+}
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+
+REPLICA_READS = os.environ.get('REPLICA_READS') == '1'
+# Seconds the replica may lag: a user reads their own orders from the
+# primary this long after ordering, and catalogue pages read from the
+# replica this long after a catalogue change are not cached.
+REPLICA_PIN_SECONDS = 5
+
+
+# Serve the read-only API endpoints with their async views (api.async_views).
+# asgi.py turns this on; WSGI deployments keep the sync DRF views.
+API_ASYNC_VIEWS = os.environ.get('API_ASYNC_VIEWS') == '1'
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory is per process; point this at a shared backend (Redis,
+# Memcached) in production so catalogue invalidations reach every worker.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# Seconds a cached catalogue response may be served (api.caching)
+CATALOGUE_CACHE_TIMEOUT = 300
+
+# Seconds a PENDING order keeps its stock before the sweeper releases it
+# (api.reservations, `manage.py release_expired_holds`)
+STOCK_HOLD_TTL = 15 * 60
+
+# Order responses replayed per process for retried Idempotency-Keys
+# (api.idempotency); the database table is the source of truth.
+IDEMPOTENCY_CACHE_SIZE = 1024
+
+# Token -> user lookups cached by api.authentication.CachedTokenAuthentication.
+# The TTL bounds how long another process may accept a revoked token;
+# TOKEN_CACHE_ALIAS can name a shared cache from CACHES to warm all workers.
+TOKEN_CACHE_SIZE = 4096
+TOKEN_CACHE_TTL = 60
+TOKEN_CACHE_ALIAS = None
+
+# Share of requests whose queries, database and serializer time and
+# response size are recorded (api.metrics): exposed in a Server-Timing
+# header and aggregated at /api/v1/metrics/. 0 disables the middleware.
+REQUEST_METRICS_SAMPLE_RATE = float(os.environ.get('REQUEST_METRICS_SAMPLE_RATE', '0'))
+# Runs of one SQL statement within a request that flag it as a likely N+1
+DUPLICATE_QUERY_THRESHOLD = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -12,5 +12,6 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'frookoonBackend.settings')
+os.environ.setdefault('SQLITE_CONN_MAX_AGE', '600')
 
 application = get_wsgi_application()